@@ -7,6 +7,7 @@ import sys
 from dotenv import load_dotenv
 from supabase import create_client, Client
 import requests
+from pompv1.metrics import metrics
 
 logging.basicConfig(level=logging.INFO)
 
@@ -17,6 +18,11 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 NODE_SERVER_URL = os.getenv("NODE_SERVER_URL", "http://localhost:3000")
 WATERMILL_FLASK_URL = os.getenv("WATERMILL_FLASK_URL", "http://localhost:5000")
 
+# 1 = take the Lens and Twitter screenshots and judge both in one LLM call
+# (sysprompt_combined_openai.py). 0 = Lens check first and stop early on "copy", which
+# skips the Twitter screenshot and the second call for copies.
+COMBINED_EVAL = os.getenv("COMBINED_EVAL", "0") == "1"
+
 if not SUPABASE_URL or not SUPABASE_KEY:
     logging.error("Missing Supabase credentials.")
     sys.exit(1)
@@ -33,7 +39,8 @@ def main_loop():
                 coin_to_process = find_unprocessed_coin()
                 if coin_to_process:
                     currently_processing_coin = True
-                    process_goodcoin(coin_to_process)
+                    with metrics.timer("goodcoin_process"):
+                        process_goodcoin(coin_to_process)
                     currently_processing_coin = False
                 else:
                     # nothing to do
@@ -79,6 +86,7 @@ def process_goodcoin(goodcoin_row):
         start_investigation(image_url)
 
     text_coin_id = coin_data.get('coin_id', '???')
+    bundle_id = coin_data.get('bundle_id')
 
     # 2) Google Lens screenshot
     meta_image_url = coin_data.get('metadata_image_official')
@@ -89,7 +97,12 @@ def process_goodcoin(goodcoin_row):
         stop_investigation()
         return
 
-    lens_screenshot_url = do_google_lens_screenshot(meta_image_url)
+    if COMBINED_EVAL:
+        process_goodcoin_combined(goodcoin_uuid, coin_data, meta_image_url)
+        return
+
+    with metrics.timer("lens_screenshot", bundle_id):
+        lens_screenshot_url = do_google_lens_screenshot(meta_image_url)
     if not lens_screenshot_url:
         logging.warning("Google Lens screenshot failed. Disqualifying coin.")
         mark_goodcoin_processed(goodcoin_uuid, "bad")
@@ -98,7 +111,8 @@ def process_goodcoin(goodcoin_row):
         return
 
     # 3) run GPT check for "copy"|"unique"
-    lens_judgment = call_sysprompt_lens_openai(lens_screenshot_url)
+    with metrics.timer("lens_llm", bundle_id):
+        lens_judgment = call_sysprompt_lens_openai(lens_screenshot_url)
     if not lens_judgment:
         lens_judgment = "copy"
 
@@ -118,7 +132,8 @@ def process_goodcoin(goodcoin_row):
             stop_investigation()
             return
 
-        tw_screenshot_url = do_twitter_screenshot(twitter_url)
+        with metrics.timer("twitter_screenshot", bundle_id):
+            tw_screenshot_url = do_twitter_screenshot(twitter_url)
         if not tw_screenshot_url:
             logging.warning("Twitter screenshot failed. Disqualifying coin.")
             mark_goodcoin_processed(goodcoin_uuid, "bad")
@@ -126,7 +141,8 @@ def process_goodcoin(goodcoin_row):
             stop_investigation()
             return
 
-        final_judgment = call_sysprompt_finaldecision_openai(tw_screenshot_url)
+        with metrics.timer("final_llm", bundle_id):
+            final_judgment = call_sysprompt_finaldecision_openai(tw_screenshot_url)
         if not final_judgment:
             final_judgment = "pass"
 
@@ -138,7 +154,8 @@ def process_goodcoin(goodcoin_row):
             return
         elif final_judgment == "buy":
             logging.info(f"Coin {text_coin_id} => final buy => calling buy script.")
-            do_buy_coin(coin_data)
+            with metrics.timer("buy", bundle_id):
+                do_buy_coin(coin_data)
             mark_goodcoin_processed(goodcoin_uuid, "buy")
             # Emit "bought_coin" to front end
             emit_bought_event(text_coin_id)
@@ -156,6 +173,58 @@ def process_goodcoin(goodcoin_row):
         emit_disqualified_event(text_coin_id)
         stop_investigation()
 
+def process_goodcoin_combined(goodcoin_uuid, coin_data, meta_image_url):
+    """
+    COMBINED_EVAL path: both screenshots, one LLM call for both verdicts.
+    The screenshots are taken one after the other: the puppeteer server drives a
+    single browser (shared page, system clipboard) and handles one request at a time.
+    """
+    text_coin_id = coin_data.get('coin_id', '???')
+    bundle_id = coin_data.get('bundle_id')
+
+    def disqualify():
+        mark_goodcoin_processed(goodcoin_uuid, "bad")
+        emit_disqualified_event(text_coin_id)
+        stop_investigation()
+
+    twitter_url = coin_data.get('twitter')
+    if not twitter_url:
+        # Without Twitter the coin cannot be bought whatever Lens says
+        logging.warning(f"No twitter URL for coin_uuid={coin_data.get('id')}, disqualifying.")
+        disqualify()
+        return
+
+    with metrics.timer("lens_screenshot", bundle_id):
+        lens_screenshot_url = do_google_lens_screenshot(meta_image_url)
+    if not lens_screenshot_url:
+        logging.warning("Google Lens screenshot failed. Disqualifying coin.")
+        disqualify()
+        return
+
+    with metrics.timer("twitter_screenshot", bundle_id):
+        tw_screenshot_url = do_twitter_screenshot(twitter_url)
+    if not tw_screenshot_url:
+        logging.warning("Twitter screenshot failed. Disqualifying coin.")
+        disqualify()
+        return
+
+    with metrics.timer("combined_llm", bundle_id):
+        verdict = call_sysprompt_combined_openai(lens_screenshot_url, tw_screenshot_url)
+    if not verdict:
+        verdict = {"lens": "copy", "final": "pass"}
+
+    if verdict["lens"] != "unique" or verdict["final"] != "buy":
+        logging.info(f"Coin {text_coin_id} => lens {verdict['lens']}, final {verdict['final']} => disqualified.")
+        disqualify()
+        return
+
+    logging.info(f"Coin {text_coin_id} => unique + buy => calling buy script.")
+    with metrics.timer("buy", bundle_id):
+        do_buy_coin(coin_data)
+    mark_goodcoin_processed(goodcoin_uuid, "buy")
+    emit_bought_event(text_coin_id)
+    stop_investigation()
+
 def get_coin_data_by_uuid(coin_uuid):
     try:
         resp = supabase.table('coins').select("*").eq('id', coin_uuid).execute()
@@ -205,6 +274,14 @@ def call_sysprompt_finaldecision_openai(screenshot_url):
         logging.error(f"Error calling sysprompt_finaldecision_openai: {e}", exc_info=True)
     return None
 
+def call_sysprompt_combined_openai(lens_screenshot_url, twitter_screenshot_url):
+    try:
+        from sysprompt_combined_openai import run_combined_check
+        return run_combined_check(lens_screenshot_url, twitter_screenshot_url)
+    except Exception as e:
+        logging.error(f"Error calling sysprompt_combined_openai: {e}", exc_info=True)
+    return None
+
 def do_buy_coin(coin_data):
     import subprocess
     mint = coin_data.get("mint", "")
@@ -214,6 +291,7 @@ def do_buy_coin(coin_data):
         logging.error(f"Error calling buy_placeholder script: {e}", exc_info=True)
 
 def mark_goodcoin_processed(goodcoin_id, quality_value):
+    metrics.inc(f"goodcoins_{quality_value}")
     try:
         supabase.table('goodcoins').update({
             "processed": True,
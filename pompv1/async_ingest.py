@@ -0,0 +1,126 @@
+# File: /pompv1/async_ingest.py
+
+"""
+Asyncio ingestion mode for the PumpPortal token stream.
+
+Raw websocket frames are handed to a bounded queue, metadata is resolved
+concurrently through one pooled aiohttp session (limited by a semaphore),
+and enriched coins are handed back to the listener strictly in arrival order.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import websockets
+
+from metrics import metrics
+
+
+class AsyncIngestPipeline:
+    def __init__(self, api_url, parse_event, apply_metadata, clear_metadata, on_coin,
+                 concurrency=16, queue_size=256, request_timeout=5, reconnect_delay=5):
+        """
+        Args:
+            api_url (str): Websocket URL of the token stream.
+            parse_event (callable): message (str) -> event dict. May raise json.JSONDecodeError.
+            apply_metadata (callable): (event, metadata_json) -> None, fills metadata fields.
+            clear_metadata (callable): (event) -> None, fills empty metadata fields.
+            on_coin (callable): (event) -> None, called in arrival order on a worker thread.
+            concurrency (int): Max number of metadata requests in flight.
+            queue_size (int): Max number of raw frames / pending coins buffered.
+        """
+        self.api_url = api_url
+        self.parse_event = parse_event
+        self.apply_metadata = apply_metadata
+        self.clear_metadata = clear_metadata
+        self.on_coin = on_coin
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.request_timeout = request_timeout
+        self.reconnect_delay = reconnect_delay
+        # Single worker so bundle formation sees coins in the same order they arrived
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bundle")
+
+    def run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        raw_queue = asyncio.Queue(maxsize=self.queue_size)
+        ordered_queue = asyncio.Queue(maxsize=self.queue_size)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            dispatcher = asyncio.create_task(self._dispatch(raw_queue, ordered_queue, session, semaphore))
+            emitter = asyncio.create_task(self._emit(ordered_queue))
+            try:
+                while True:
+                    await self._read_stream(raw_queue)
+                    logging.warning(f"WebSocket Closed. Reconnecting in {self.reconnect_delay} seconds...")
+                    await asyncio.sleep(self.reconnect_delay)
+            finally:
+                dispatcher.cancel()
+                emitter.cancel()
+                self._executor.shutdown(wait=False)
+
+    async def _read_stream(self, raw_queue):
+        logging.info("Connecting to WebSocket (async ingest)...")
+        try:
+            async with websockets.connect(self.api_url, max_queue=self.queue_size) as ws:
+                logging.info("WebSocket Opened. Subscribing to 'subscribeNewToken' events...")
+                await ws.send(json.dumps({"method": "subscribeNewToken"}))
+                logging.info("Subscribed to 'subscribeNewToken' events.")
+                async for message in ws:
+                    # Blocks the reader when the pipeline is saturated (backpressure)
+                    await raw_queue.put(message)
+        except Exception as e:
+            logging.error(f"WebSocket Error: {e}", exc_info=True)
+
+    async def _dispatch(self, raw_queue, ordered_queue, session, semaphore):
+        while True:
+            message = await raw_queue.get()
+            try:
+                data = self.parse_event(message)
+            except json.JSONDecodeError:
+                logging.error(f"Invalid JSON received: {message}")
+                continue
+            except Exception as e:
+                logging.error(f"Error processing message: {e}", exc_info=True)
+                continue
+            task = asyncio.create_task(self._enrich(session, semaphore, data))
+            await ordered_queue.put(task)
+
+    async def _enrich(self, session, semaphore, data):
+        metadata_url = data.get("uri")
+        if not metadata_url:
+            return data
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with session.get(metadata_url) as response:
+                    if response.status == 200:
+                        metadata = await response.json(content_type=None)
+                        self.apply_metadata(data, metadata)
+                    else:
+                        logging.warning(f"Failed to fetch metadata from {metadata_url}: Status {response.status}")
+                        self.clear_metadata(data)
+            except Exception as e:
+                logging.error(f"Error fetching metadata from {metadata_url}: {e}", exc_info=True)
+                self.clear_metadata(data)
+            metrics.observe("metadata_fetch", time.perf_counter() - started)
+        return data
+
+    async def _emit(self, ordered_queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            task = await ordered_queue.get()
+            try:
+                data = await task
+                await loop.run_in_executor(self._executor, self.on_coin, data)
+            except Exception as e:
+                logging.error(f"Error processing message: {e}", exc_info=True)
@@ -0,0 +1,309 @@
+# File: /pompv1/bench_render.py
+
+"""
+Benchmarks the bundle grid pipeline stages on synthetic and recorded coin sets.
+
+Stages (per bundle):
+    icon_decode  - decode + downscale every icon into the icon cache
+    render       - render_bundle_image (layout + drawing)
+    encode       - PNG encode of the grid
+    tile_crop    - crop_tiles + PNG encode of each tile (what image_processor does)
+
+Reports p50/p95/max per stage, peak traced (Python-level, tracemalloc) allocations
+per stage and peak RSS.
+With --baseline it exits non-zero when a set's p95 render time regresses by more
+than --max-regression (fraction) against the saved baseline.
+
+Usage:
+    python bench_render.py --iterations 30 --save-baseline bench_baseline.json
+    python bench_render.py --baseline bench_baseline.json --max-regression 0.2
+    python bench_render.py --recording recording.jsonl.gz --sets recorded
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from PIL import Image
+
+# bundle_renderer logs at import and the benchmark renders coins without icons on
+# purpose; keep those warnings out of the result tables
+logging.getLogger().setLevel(logging.ERROR)
+
+import bundle_renderer
+from grid_spec import TOTAL_COINS
+from bundle_renderer import icon_cache, render_bundle_image, encode_png, crop_tiles
+
+STAGES = ["icon_decode", "render", "encode", "tile_crop"]
+
+CJK_EMOJI = "日本語のミームコイン 月へ行く 🚀🐸🔥💎🙌 狗狗币 도지코인 中文描述 😂🤣🌕"
+WORDS = ["moon", "pepe", "doge", "cat", "based", "wif", "hat", "frog", "ai", "agent", "sol", "pump",
+         "community", "token", "the", "first", "real", "meme", "on", "solana"]
+
+
+def _png_bytes(size, seed):
+    rnd = random.Random(seed)
+    img = Image.new("RGB", size, (rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(0, 255)))
+    for _ in range(20):
+        x, y = rnd.randint(0, size[0] - 1), rnd.randint(0, size[1] - 1)
+        img.paste((rnd.randint(0, 255), 0, 0), (x, y, min(size[0], x + size[0] // 4), min(size[1], y + size[1] // 4)))
+    buf = BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _gif_bytes(size, frames, seed):
+    rnd = random.Random(seed)
+    images = [Image.new("P", size, rnd.randint(0, 255)) for _ in range(frames)]
+    buf = BytesIO()
+    images[0].save(buf, "GIF", save_all=True, append_images=images[1:], duration=50, loop=0)
+    return buf.getvalue()
+
+
+def _words(rnd, n):
+    return " ".join(rnd.choice(WORDS) for _ in range(n))
+
+
+def synthetic_coin_set(kind, bundles, seed=0):
+    """
+    Returns a list of bundles; each bundle is a list of (coin_dict, icon_bytes or None).
+    """
+    rnd = random.Random(f"{kind}-{seed}")
+    result = []
+    for b in range(bundles):
+        bundle = []
+        for c in range(TOTAL_COINS):
+            url = f"https://bench.local/ipfs/{kind}{b}x{c}"
+            coin = {
+                "metadata_name": _words(rnd, 2).title(),
+                "metadata_symbol": rnd.choice(WORDS).upper(),
+                "metadata_description": _words(rnd, rnd.randint(3, 15)),
+                "metadata_image_official": url,
+            }
+            icon = _png_bytes((rnd.choice([256, 512]),) * 2, f"{kind}{b}{c}")
+            if kind == "long_names":
+                coin["metadata_name"] = "".join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(rnd.randint(40, 120)))
+                coin["metadata_symbol"] = "$" + "W" * rnd.randint(10, 30)
+                coin["metadata_description"] = "supercalifragilistic" * 4 + " " + _words(rnd, 5)
+            elif kind == "cjk_emoji":
+                coin["metadata_name"] = "".join(rnd.sample(CJK_EMOJI, 10))
+                coin["metadata_description"] = "".join(rnd.choice(CJK_EMOJI) for _ in range(rnd.randint(20, 80)))
+            elif kind == "missing_icons":
+                coin["metadata_image_official"] = ""
+                icon = None
+            elif kind == "huge_gif":
+                icon = _gif_bytes((2000, 2000), 10, f"{kind}{b}{c}")
+            bundle.append((coin, icon))
+        result.append(bundle)
+    return result
+
+
+def recorded_coin_set(path, bundles):
+    from stream_recorder import load_recording
+    from icon_cache import icon_key
+
+    frames, metadata, icons = load_recording(path)
+    coins = []
+    for _, raw in frames:
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            continue
+        status, body = metadata.get(data.get("uri"), (None, None))
+        if not isinstance(body, dict):
+            continue
+        image = body.get("image") or ""
+        icon = icons.get(icon_key(image))[1] if image and icon_key(image) in icons else None
+        coins.append(({
+            "metadata_name": body.get("name", ""),
+            "metadata_symbol": body.get("symbol", ""),
+            "metadata_description": body.get("description", ""),
+            "metadata_image_official": image if icon else "",
+        }, icon))
+    grouped = [coins[i:i + TOTAL_COINS] for i in range(0, len(coins) - TOTAL_COINS + 1, TOTAL_COINS)]
+    return grouped[:bundles]
+
+
+def run_bundle(bundle, timings=None):
+    """
+    Runs all stages once. Records per-stage seconds into `timings` (dict of lists).
+    """
+    def timed(stage, fn):
+        t0 = time.perf_counter()
+        out = fn()
+        if timings is not None:
+            timings[stage].append(time.perf_counter() - t0)
+        return out
+
+    def decode_icons():
+        for coin, icon in bundle:
+            if icon:
+                icon_cache.put(coin["metadata_image_official"], Image.open(BytesIO(icon)))
+
+    def crop_and_encode(img):
+        return [encode_png(tile) for tile in crop_tiles(img, len(bundle))]
+
+    coins = [coin for coin, _ in bundle]
+    timed("icon_decode", decode_icons)
+    grid = timed("render", lambda: render_bundle_image(coins))
+    timed("encode", lambda: encode_png(grid))
+    timed("tile_crop", lambda: crop_and_encode(grid))
+
+
+def measure_allocations(bundle):
+    """
+    Peak traced allocation (bytes) per stage for one bundle.
+    """
+    peaks = {}
+    coins = [coin for coin, _ in bundle]
+    tracemalloc.start()
+    try:
+        steps = [
+            ("icon_decode", lambda: [icon_cache.put(c["metadata_image_official"], Image.open(BytesIO(i)))
+                                     for c, i in bundle if i]),
+            ("render", lambda: render_bundle_image(coins)),
+        ]
+        grid = None
+        for stage, fn in steps:
+            tracemalloc.reset_peak()
+            out = fn()
+            peaks[stage] = tracemalloc.get_traced_memory()[1]
+            if stage == "render":
+                grid = out
+        tracemalloc.reset_peak()
+        encode_png(grid)
+        peaks["encode"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        [encode_png(tile) for tile in crop_tiles(grid, len(bundle))]
+        peaks["tile_crop"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def bench_set(bundles, iterations):
+    timings = {stage: [] for stage in STAGES}
+    run_bundle(bundles[0])  # warm up fonts/caches
+    for i in range(iterations):
+        run_bundle(bundles[i % len(bundles)], timings)
+    report = {}
+    for stage in STAGES:
+        values = timings[stage]
+        report[stage] = {
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "max_ms": round(max(values) * 1000, 3) if values else 0.0,
+        }
+    for stage, peak in measure_allocations(bundles[0]).items():
+        report[stage]["peak_alloc_kb"] = round(peak / 1024, 1)
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, or None where it cannot be read.
+    """
+    if resource is not None:
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    # peak_wset is the Windows peak working set
+    return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+
+
+def check_regressions(results, baseline, max_regression):
+    failures = []
+    for set_name, report in results.items():
+        base = baseline.get(set_name, {}).get("render", {}).get("p95_ms")
+        if not base:
+            continue
+        current = report["render"]["p95_ms"]
+        if current > base * (1 + max_regression):
+            failures.append(f"{set_name}: render p95 {current:.1f}ms > baseline {base:.1f}ms "
+                            f"(+{(current / base - 1) * 100:.0f}%, limit +{max_regression * 100:.0f}%)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark grid rendering and tile cropping.")
+    parser.add_argument("--sets", default="typical,long_names,cjk_emoji,missing_icons,huge_gif",
+                        help="Comma separated: typical,long_names,cjk_emoji,missing_icons,huge_gif,recorded")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--bundles", type=int, default=5, help="Distinct bundles per set")
+    parser.add_argument("--recording", help="Recording from stream_recorder.py (for the 'recorded' set)")
+    parser.add_argument("--json", help="Write the full report to this file")
+    parser.add_argument("--baseline", help="Baseline report to compare against")
+    parser.add_argument("--save-baseline", help="Write this run's report as the new baseline")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95 render regression (fraction)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, force=True)
+    if not os.path.isfile(bundle_renderer.FONT_PATH):
+        print(f"warning: font '{bundle_renderer.FONT_PATH}' not found, timings use Pillow's default font")
+
+    results = {}
+    for set_name in [s.strip() for s in args.sets.split(",") if s.strip()]:
+        if set_name == "recorded":
+            if not args.recording:
+                parser.error("--recording is required for the 'recorded' set")
+            bundles = recorded_coin_set(args.recording, args.bundles)
+        else:
+            bundles = synthetic_coin_set(set_name, args.bundles)
+        if not bundles:
+            print(f"{set_name}: no bundles, skipped")
+            continue
+        results[set_name] = bench_set(bundles, args.iterations)
+
+        report = results[set_name]
+        rss = f"{report['peak_rss_mb']} MB" if report["peak_rss_mb"] is not None else "n/a"
+        print(f"\n{set_name} ({args.iterations} bundles, peak RSS {rss})")
+        print(f"  {'stage':<12} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'peak alloc KB':>14}")
+        for stage in STAGES:
+            r = report[stage]
+            print(f"  {stage:<12} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['max_ms']:>9.2f} {r['peak_alloc_kb']:>14.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = check_regressions(results, baseline, args.max_regression)
+        if failures:
+            print("\nREGRESSION:")
+            for line in failures:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo p95 render regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# File: /pompv1/bundle_handoff.py
+
+"""
+Hands rendered bundle grids from the listener to image_processor through Redis.
+
+The listener stores the PNG it just rendered, the coin row ids (when the
+bundle store knows them) and the coins' content fingerprints (for the decision
+cache) under bundle_image:<bundle_id> with a TTL. The processor reads it back
+and starts cropping straight away; on a miss (expired key, listener without
+Redis, bundle re-queued much later) it falls back to downloading the public
+image_url as before.
+"""
+
+import json
+import logging
+
+from decision_cache import coin_fingerprint
+
+
+def _json_map(raw):
+    try:
+        return json.loads(raw) if raw else {}
+    except ValueError:
+        return {}
+
+
+class BundleHandoff:
+    def __init__(self, redis_client, ttl_seconds=600, prefix="bundle_image"):
+        self.redis = redis_client
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, bundle_id):
+        return f"{self.prefix}:{bundle_id}"
+
+    def put(self, bundle_id, png_bytes, coins=None):
+        """
+        Stores the grid PNG plus {coin_id: coin_uuid} and {coin_id: fingerprint} maps
+        for the bundle's coins. Returns True on success; failures are logged and
+        never block the listener.
+        """
+        coin_uuids = {}
+        fingerprints = {}
+        for idx, coin in enumerate(coins or []):
+            if coin.get("coin_uuid"):
+                coin_uuids[f"{idx+1:02d}"] = coin["coin_uuid"]
+            fingerprint = coin_fingerprint(coin)
+            if fingerprint:
+                fingerprints[f"{idx+1:02d}"] = fingerprint
+        try:
+            key = self._key(bundle_id)
+            pipe = self.redis.pipeline()
+            pipe.hset(key, mapping={"png": png_bytes, "coins": json.dumps(coin_uuids),
+                                    "fingerprints": json.dumps(fingerprints)})
+            pipe.expire(key, self.ttl_seconds)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logging.error(f"Failed to hand off bundle {bundle_id} image via Redis: {e}")
+            return False
+
+    def get(self, bundle_id):
+        """
+        Returns (png_bytes, {coin_id: coin_uuid}, {coin_id: fingerprint}),
+        or (None, {}, {}) on a miss.
+        """
+        try:
+            png_bytes, coins, fingerprints = self.redis.hmget(self._key(bundle_id),
+                                                              ["png", "coins", "fingerprints"])
+        except Exception as e:
+            logging.error(f"Failed to read bundle {bundle_id} handoff from Redis: {e}")
+            png_bytes, coins, fingerprints = None, None, None
+        if not png_bytes:
+            self.misses += 1
+            return None, {}, {}
+        self.hits += 1
+        return png_bytes, _json_map(coins), _json_map(fingerprints)
+
+    def discard(self, bundle_id):
+        try:
+            self.redis.delete(self._key(bundle_id))
+        except Exception as e:
+            logging.warning(f"Failed to delete bundle {bundle_id} handoff: {e}")
@@ -0,0 +1,184 @@
+# File: /pompv1/bundle_renderer.py
+
+"""
+Renders the bundle grid image the LLM sees, and splits it back into tiles.
+Kept free of Supabase/websocket setup so benchmarks and tools can import it.
+"""
+
+import logging
+import os
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont
+from dotenv import load_dotenv
+
+from text_layout import TextLayoutEngine
+from icon_cache import IconCache
+from grid_spec import TOTAL_COINS, IMG_WIDTH, IMG_HEIGHT, BOX_WIDTH, BOX_HEIGHT, tile_box
+
+load_dotenv()
+
+FONT_PATH = os.getenv("FONT_PATH", "notosans.ttf")
+DEFAULT_FONT_SIZE = 14
+MIN_FONT_SIZE = 6
+NAME_START_FONT_SIZE = 16
+NAME_MIN_FONT_SIZE = 6
+DESC_START_FONT_SIZE = 14
+DESC_MIN_FONT_SIZE = 6
+LABEL_BOX_SIZE = 22
+LINE_SPACING = 2
+LABEL_FONT_SIZE = 14
+ICON_SIZE = max(1, min(100, BOX_HEIGHT - 2*5, BOX_WIDTH // 2))
+
+ICON_CACHE_SIZE = int(os.getenv("ICON_CACHE_SIZE", "2048"))
+ICON_CACHE_DIR = os.getenv("ICON_CACHE_DIR")  # optional on-disk tier
+ICON_FETCH_WORKERS = int(os.getenv("ICON_FETCH_WORKERS", "8"))
+# Max seconds the renderer waits for an icon that is still downloading
+ICON_RENDER_WAIT = float(os.getenv("ICON_RENDER_WAIT", "2"))
+
+icon_cache = IconCache(
+    tile_size=ICON_SIZE,
+    max_items=ICON_CACHE_SIZE,
+    disk_dir=ICON_CACHE_DIR,
+    workers=ICON_FETCH_WORKERS
+)
+
+def load_font(font_path, size):
+    if os.path.isfile(font_path):
+        try:
+            return ImageFont.truetype(font_path, size)
+        except Exception as e:
+            logging.error(f"Failed to load font '{font_path}' with size {size}: {e}")
+    else:
+        logging.warning(f"Font file '{font_path}' not found. Using default font.")
+    return ImageFont.load_default()
+
+NAME_FONT_DEFAULT = load_font(FONT_PATH, NAME_START_FONT_SIZE)
+DESC_FONT_DEFAULT = load_font(FONT_PATH, DESC_START_FONT_SIZE)
+LABEL_FONT = load_font(FONT_PATH, LABEL_FONT_SIZE)
+
+layout = TextLayoutEngine(FONT_PATH, line_spacing=LINE_SPACING)
+
+def text_size(draw, text, font):
+    return layout.text_size(text, font)
+
+def fit_single_line(draw, text, max_width, max_height, start_font_size=16, min_font_size=6):
+    return layout.fit_single_line(text, max_width, max_height, start_font_size, min_font_size)
+
+def force_wrap_text(draw, text, font, max_width):
+    return layout.force_wrap_text(text, font, max_width)
+
+def fit_description(draw, text, max_width, max_height, start_font_size=14, min_font_size=6):
+    return layout.fit_description(text, max_width, max_height, start_font_size, min_font_size)
+
+def draw_coin_box(draw, main_image, x, y, coin_data, index):
+    draw.rectangle([x, y, x+BOX_WIDTH-1, y+BOX_HEIGHT-1], fill="white", outline="white", width=1)
+    draw.rectangle([x+2, y+2, x+BOX_WIDTH-3, y+BOX_HEIGHT-3], outline="red", width=1)
+
+    margin = 5
+    safe_x = x + margin
+    safe_y = y + margin
+    safe_w = BOX_WIDTH - 2*margin
+    safe_h = BOX_HEIGHT - 2*margin
+
+    coin_img = None
+    coin_img_url = coin_data.get("metadata_image_official", "")
+    if coin_img_url:
+        # Prefetched when the token event arrived; only waits on an in-flight fetch
+        coin_img = icon_cache.get(coin_img_url, wait=ICON_RENDER_WAIT)
+        if coin_img is None:
+            logging.warning(f"Icon not available for coin {index+1}; rendering without it.")
+    else:
+        logging.warning(f"No image available for coin {index+1}")
+
+    img_w, img_h = 0, 0
+    if coin_img:
+        img_w, img_h = coin_img.size
+        img_y = safe_y + (safe_h - img_h) // 2
+        main_image.paste(coin_img, (safe_x, img_y), coin_img)
+
+    draw_obj = draw
+    vertical_offset = 10
+    text_start_x = safe_x + img_w + 8
+    right_margin = 5
+
+    label_id_text = f"{index+1:02d}"
+    label_x = text_start_x
+    label_y = safe_y + vertical_offset
+
+    draw_obj.rectangle([label_x, label_y, label_x+LABEL_BOX_SIZE-1, label_y+LABEL_BOX_SIZE-1],
+                       fill="white", outline="red", width=1)
+    lw, lh = text_size(draw_obj, label_id_text, LABEL_FONT)
+    ltx = label_x + (LABEL_BOX_SIZE - lw) // 2
+    lty = label_y + (LABEL_BOX_SIZE - lh) // 2 - 4
+    draw_obj.text((ltx, lty), label_id_text, fill="red", font=LABEL_FONT)
+
+    name_area_x = label_x + LABEL_BOX_SIZE + 5
+    name_area_w = (safe_x + safe_w - right_margin) - name_area_x
+    name_area_h = LABEL_BOX_SIZE
+
+    raw_name = (coin_data.get("metadata_name") or "").strip() or "(No Name)"
+    symbol = (coin_data.get("metadata_symbol") or "").strip()
+    name_line_text = raw_name
+    ticker_line_text = f"({symbol})" if symbol else ""
+
+    name_line, name_font = fit_single_line(draw_obj, name_line_text, name_area_w, name_area_h,
+                                           start_font_size=NAME_START_FONT_SIZE,
+                                           min_font_size=NAME_MIN_FONT_SIZE)
+    nw, nh = text_size(draw_obj, name_line, name_font)
+    name_line_y = label_y + (LABEL_BOX_SIZE - nh) // 2 - 13
+    draw_obj.text((name_area_x, name_line_y), name_line, fill="black", font=name_font)
+
+    if ticker_line_text:
+        ticker_line, ticker_font = fit_single_line(draw_obj, ticker_line_text, name_area_w, name_area_h,
+                                                   start_font_size=NAME_START_FONT_SIZE,
+                                                   min_font_size=NAME_MIN_FONT_SIZE)
+        tw, th = text_size(draw_obj, ticker_line, ticker_font)
+        ticker_line_y = name_line_y + nh + 3
+        draw_obj.text((name_area_x, ticker_line_y), ticker_line, fill="black", font=ticker_font)
+    else:
+        ticker_line_y = name_line_y
+        th = 0
+
+    desc_y = ticker_line_y + (th if ticker_line_text else 0) + 5
+    desc_x = text_start_x
+    desc_w = (safe_x + safe_w - right_margin) - desc_x
+    desc_h = (safe_y + safe_h) - desc_y
+
+    desc = (coin_data.get("metadata_description") or "").strip()
+    if len(desc) > 60:
+        desc = desc[:60] + "..."
+
+    if desc:
+        desc_lines, desc_font = fit_description(draw_obj, desc, desc_w, desc_h,
+                                                start_font_size=DESC_START_FONT_SIZE,
+                                                min_font_size=DESC_MIN_FONT_SIZE)
+        if desc_lines is None:
+            small_font = layout.font(MIN_FONT_SIZE)
+            if desc_h >= text_size(draw_obj, "[Desc too long]", small_font)[1]:
+                draw_obj.text((desc_x, desc_y), "[Desc too long]", fill="black", font=small_font)
+        else:
+            for dl in desc_lines:
+                tw, th = text_size(draw_obj, dl, desc_font)
+                draw_obj.text((desc_x, desc_y), dl, fill="black", font=desc_font)
+                desc_y += th + LINE_SPACING
+
+def render_bundle_image(coins):
+    main_image = Image.new('RGBA', (IMG_WIDTH, IMG_HEIGHT), (255, 255, 255, 255))
+    for i, coin in enumerate(coins):
+        x, y, _, _ = tile_box(i)
+        # Each coin is drawn on its own tile so text can never spill into a neighbour
+        tile = Image.new('RGBA', (BOX_WIDTH, BOX_HEIGHT), (255, 255, 255, 255))
+        draw_coin_box(ImageDraw.Draw(tile), tile, 0, 0, coin, i)
+        main_image.paste(tile, (x, y))
+    return main_image
+
+def encode_png(image):
+    buf = BytesIO()
+    image.save(buf, "PNG")
+    return buf.getvalue()
+
+def crop_tiles(img, count=TOTAL_COINS):
+    """
+    Splits a grid image into its coin tiles, in coin order.
+    """
+    return [img.crop(tile_box(i)) for i in range(count)]
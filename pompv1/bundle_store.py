@@ -0,0 +1,294 @@
+# File: /pompv1/bundle_store.py
+
+"""
+Bundle + coins persistence for the websocket listener.
+
+Modes (DB_WRITE_MODE):
+  "rpc"         - one call to the create_bundle_with_coins() Postgres function
+                  (see sql/create_bundle_with_coins.sql), bundle and coins in a
+                  single transaction. Falls back to "bulk" if the function is missing
+                  (other RPC errors fail only that bundle).
+  "bulk"        - bundle insert + one bulk insert for all coin rows. If the coins
+                  insert fails the bundle row is deleted again.
+  "writebehind" - bundle ids are generated locally and returned immediately;
+                  a background thread flushes pending bundles in batches. Writes are
+                  upserts, so a retried batch never conflicts with what an earlier
+                  attempt already wrote; a failed batch is retried bundle by bundle and
+                  a bundle that keeps failing is dropped (logged) after max_attempts.
+
+bundles.coin_count comes from sql/bundles_coin_count.sql. Without it, "bulk" and
+"writebehind" log a warning once and save bundles without the count.
+"""
+
+import logging
+import threading
+import uuid
+
+COIN_FIELDS = [
+    "mint",
+    "pumpfun_url",
+    "metadata_image_official",
+    "metadata_name",
+    "metadata_symbol",
+    "metadata_description",
+    "twitter",
+    "website",
+]
+
+
+def rpc_missing(error):
+    """
+    True if a PostgREST error means the RPC function does not exist (PGRST202 / 404).
+    """
+    code = str(getattr(error, "code", "") or "")
+    text = str(error)
+    return code in ("PGRST202", "404") or "PGRST202" in text or "Could not find the function" in text
+
+
+def column_missing(error, column):
+    """
+    True if a PostgREST error means `column` does not exist (PGRST204 on writes, 42703 on reads).
+    """
+    code = str(getattr(error, "code", "") or "")
+    text = str(error)
+    if column not in text:
+        return False
+    return code in ("PGRST204", "42703") or "PGRST204" in text or "42703" in text
+
+
+def build_coin_rows(coins, bundle_id=None):
+    rows = []
+    for idx, coin in enumerate(coins):
+        row = {"coin_id": f"{idx+1:02d}"}
+        for field in COIN_FIELDS:
+            default = None if field in ("twitter", "website") else ""
+            row[field] = coin.get(field, default)
+        if bundle_id is not None:
+            row["bundle_id"] = bundle_id
+        rows.append(row)
+    return rows
+
+
+class BundleStore:
+    def __init__(self, supabase, mode="rpc", flush_interval=2.0, flush_batch=10,
+                 max_pending=1000, max_attempts=5):
+        """
+        Args:
+            max_pending (int): Write-behind bundles held in memory at most; beyond that
+                save_bundle() returns None instead of growing without bound.
+            max_attempts (int): Flush attempts before a write-behind bundle is dropped.
+        """
+        self.supabase = supabase
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.dropped = 0
+        self.store_coin_count = True  # cleared if the bundles table has no coin_count column
+        self._pending = []          # [{"bundle": row, "coins": rows, "attempts": n}] not yet flushed
+        self._pending_by_id = {}    # bundle_id -> bundle_row
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        if mode == "writebehind":
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def save_bundle(self, coins):
+        """
+        Persists a bundle and its coins. Returns the bundle id or None on error.
+        Coin row ids are written back to each coin dict as 'coin_uuid' when known.
+        """
+        if self.mode == "writebehind":
+            return self._enqueue(coins)
+        if self.mode == "rpc":
+            try:
+                return self._save_rpc(coins)
+            except Exception as e:
+                if not rpc_missing(e):
+                    # The function may have committed (timeout, 5xx); retrying in bulk could duplicate it
+                    logging.error(f"create_bundle_with_coins RPC failed: {e}", exc_info=True)
+                    return None
+                logging.warning(f"create_bundle_with_coins function not found ({e}); falling back to bulk inserts.")
+                self.mode = "bulk"
+        return self._save_bulk(coins)
+
+    def update_bundle(self, bundle_id, fields):
+        """
+        Updates a bundle row. In write-behind mode, fields of a bundle that has not
+        been flushed yet are merged into the pending insert instead.
+        """
+        with self._lock:
+            pending_row = self._pending_by_id.get(bundle_id)
+            if pending_row is not None:
+                pending_row.update(fields)
+                return
+        self.supabase.table('bundles').update(fields).eq("id", bundle_id).execute()
+
+    def _save_rpc(self, coins):
+        resp = self.supabase.rpc('create_bundle_with_coins', {"coins": build_coin_rows(coins)}).execute()
+        result = resp.data
+        if not result or not result.get("bundle_id"):
+            logging.error(f"Failed to insert bundle via RPC: {resp}")
+            return None
+        bundle_id = result["bundle_id"]
+        self._attach_coin_uuids(coins, result.get("coins") or [])
+        logging.info(f"Inserted bundle {bundle_id} with {len(coins)} coins (1 RPC)")
+        return bundle_id
+
+    def _save_bulk(self, coins):
+        try:
+            bundle_response = self._write_bundles(
+                lambda rows: self.supabase.table('bundles').insert(rows).execute(),
+                [{"coin_count": len(coins)}])
+            if not bundle_response.data:
+                logging.error(f"Failed to insert bundle: {bundle_response}")
+                return None
+            bundle_id = bundle_response.data[0]['id']
+        except Exception as e:
+            logging.error(f"Error saving bundle to database: {e}", exc_info=True)
+            return None
+
+        try:
+            coin_response = self.supabase.table('coins').insert(build_coin_rows(coins, bundle_id)).execute()
+            if not coin_response.data:
+                raise RuntimeError(f"empty response: {coin_response}")
+        except Exception as e:
+            logging.error(f"Failed to insert coins for bundle {bundle_id}: {e}. Removing bundle.", exc_info=True)
+            try:
+                self.supabase.table('bundles').delete().eq("id", bundle_id).execute()
+            except Exception as de:
+                logging.error(f"Failed to remove bundle {bundle_id}: {de}", exc_info=True)
+            return None
+
+        self._attach_coin_uuids(coins, coin_response.data)
+        logging.info(f"Inserted bundle {bundle_id} with {len(coins)} coins (2 requests)")
+        return bundle_id
+
+    def _write_bundles(self, write, rows):
+        """
+        Runs write(rows) against the bundles table. If the table has no coin_count
+        column yet, retries once without it and leaves it out from then on.
+        """
+        try:
+            return write(self._storable(rows))
+        except Exception as e:
+            if not (self.store_coin_count and column_missing(e, "coin_count")):
+                raise
+            logging.warning("bundles.coin_count column missing (see sql/bundles_coin_count.sql); "
+                            "saving bundles without it.")
+            self.store_coin_count = False
+            return write(self._storable(rows))
+
+    def _storable(self, rows):
+        if self.store_coin_count:
+            return rows
+        return [{k: v for k, v in row.items() if k != "coin_count"} for row in rows]
+
+    def _attach_coin_uuids(self, coins, rows):
+        by_coin_id = {row.get("coin_id"): row.get("id") for row in rows}
+        for idx, coin in enumerate(coins):
+            coin_uuid = by_coin_id.get(f"{idx+1:02d}")
+            if coin_uuid:
+                coin["coin_uuid"] = coin_uuid
+
+    def _enqueue(self, coins):
+        bundle_id = str(uuid.uuid4())
+        bundle_row = {"id": bundle_id, "coin_count": len(coins)}
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                logging.error(f"Write-behind queue full ({len(self._pending)} bundles unflushed); "
+                              f"bundle not saved.")
+                return None
+            self._pending.append({"bundle": bundle_row, "coins": build_coin_rows(coins, bundle_id),
+                                  "attempts": 0})
+            self._pending_by_id[bundle_id] = bundle_row
+            if len(self._pending) >= self.flush_batch:
+                self._wakeup.set()
+        logging.info(f"Queued bundle {bundle_id} for write-behind")
+        return bundle_id
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Write-behind flush failed: {e}", exc_info=True)
+
+    def flush(self):
+        """
+        Writes pending bundles in batches of flush_batch (one bundles upsert and one
+        coins upsert each). Bundles that failed before are retried one at a time, so a
+        bad row only holds up itself; after max_attempts it is dropped and logged.
+        Stops at the first failure and resumes on the next flush.
+        """
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                if self._pending[0]["attempts"]:
+                    batch = self._pending[:1]
+                else:
+                    batch = []
+                    for entry in self._pending[:self.flush_batch]:
+                        if entry["attempts"]:
+                            break
+                        batch.append(entry)
+            if not self._write_batch(batch):
+                self._record_failure(batch)
+                return
+
+    def _write_batch(self, batch):
+        bundle_rows = [dict(entry["bundle"]) for entry in batch]
+        coin_rows = [row for entry in batch for row in entry["coins"]]
+        bundle_ids = [b["id"] for b in bundle_rows]
+        try:
+            self._write_bundles(
+                lambda rows: self.supabase.table('bundles').upsert(rows, on_conflict="id").execute(),
+                bundle_rows)
+        except Exception as e:
+            logging.error(f"Write-behind bundles write failed ({len(batch)} bundles), will retry: {e}")
+            return False
+        try:
+            self.supabase.table('coins').upsert(coin_rows, on_conflict="bundle_id,coin_id").execute()
+        except Exception as e:
+            logging.error(f"Write-behind coins write failed, removing {len(batch)} bundles and retrying: {e}")
+            try:
+                self.supabase.table('bundles').delete().in_("id", bundle_ids).execute()
+            except Exception as de:
+                # Harmless: the retry upserts the same bundle ids
+                logging.error(f"Failed to remove bundles after coins write failure: {de}")
+            return False
+
+        with self._lock:
+            flushed = {id(entry) for entry in batch}
+            self._pending = [entry for entry in self._pending if id(entry) not in flushed]
+            late_updates = []
+            for entry, flushed_row in zip(batch, bundle_rows):
+                bundle_row = entry["bundle"]
+                self._pending_by_id.pop(bundle_row["id"], None)
+                # Fields merged while the insert was in flight
+                changed = {k: v for k, v in bundle_row.items() if flushed_row.get(k) != v}
+                if changed:
+                    late_updates.append((bundle_row["id"], changed))
+        for bundle_id, fields in late_updates:
+            try:
+                self.supabase.table('bundles').update(fields).eq("id", bundle_id).execute()
+            except Exception as e:
+                logging.error(f"Failed to apply late update to bundle {bundle_id}: {e}")
+        logging.info(f"Flushed {len(batch)} bundles / {len(coin_rows)} coins (write-behind)")
+        return True
+
+    def _record_failure(self, batch):
+        with self._lock:
+            for entry in batch:
+                entry["attempts"] += 1
+                if entry["attempts"] < self.max_attempts:
+                    continue
+                bundle_id = entry["bundle"]["id"]
+                self._pending = [p for p in self._pending if p is not entry]
+                self._pending_by_id.pop(bundle_id, None)
+                self.dropped += 1
+                logging.error(f"Dropping write-behind bundle {bundle_id} after {entry['attempts']} failed "
+                              f"flushes: bundle={entry['bundle']} coins={entry['coins']}")
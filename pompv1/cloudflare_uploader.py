@@ -1,6 +1,43 @@
 # File: pompv1/cloudflare_uploader.py
 import os
 import logging
+import threading
+from metrics import metrics
+
+_s3_client = None
+_s3_lock = threading.Lock()
+
+def get_s3_client():
+    """
+    Returns a process-wide boto3 S3 client for R2 (thread-safe, connection-pooled),
+    or None if credentials are missing or boto3 is not installed.
+    """
+    global _s3_client
+    if _s3_client is not None:
+        return _s3_client
+
+    CLOUDFLARE_ENDPOINT = os.getenv("CLOUDFLARE_ENDPOINT")
+    CLOUDFLARE_ACCESS_KEY = os.getenv("CLOUDFLARE_ACCESS_KEY")
+    CLOUDFLARE_SECRET_KEY = os.getenv("CLOUDFLARE_SECRET_KEY")
+    if not all([CLOUDFLARE_ENDPOINT, CLOUDFLARE_ACCESS_KEY, CLOUDFLARE_SECRET_KEY]):
+        return None
+
+    try:
+        import boto3
+        from botocore.config import Config
+    except ImportError:
+        logging.error("boto3 not installed. Please `pip install boto3`.")
+        return None
+
+    with _s3_lock:
+        if _s3_client is None:
+            pool_size = int(os.getenv("CLOUDFLARE_MAX_POOL", "16"))
+            _s3_client = boto3.client('s3',
+                                      endpoint_url=CLOUDFLARE_ENDPOINT,
+                                      aws_access_key_id=CLOUDFLARE_ACCESS_KEY,
+                                      aws_secret_access_key=CLOUDFLARE_SECRET_KEY,
+                                      config=Config(max_pool_connections=pool_size))
+    return _s3_client
 
 def upload_to_cloudflare(file_path, file_name):
     CLOUDFLARE_BUCKET = os.getenv("CLOUDFLARE_BUCKET")
@@ -34,3 +71,29 @@ def upload_to_cloudflare(file_path, file_name):
     except Exception as e:
         logging.error(f"Error uploading to Cloudflare: {e}", exc_info=True)
         return None
+
+def upload_bytes_to_cloudflare(data, file_name, content_type="image/png"):
+    """
+    Uploads an in-memory object (bytes or a readable file object) to R2 without touching disk.
+    Returns the same URL format as upload_to_cloudflare(), or None on error.
+    """
+    CLOUDFLARE_BUCKET = os.getenv("CLOUDFLARE_BUCKET")
+    CLOUDFLARE_ENDPOINT = os.getenv("CLOUDFLARE_ENDPOINT")
+
+    s3 = get_s3_client()
+    if not CLOUDFLARE_BUCKET or s3 is None:
+        logging.warning("Cloudflare credentials or bucket/endpoint missing. Skipping upload.")
+        return None
+
+    try:
+        with metrics.timer("r2_upload"):
+            if isinstance(data, (bytes, bytearray)):
+                s3.put_object(Bucket=CLOUDFLARE_BUCKET, Key=file_name, Body=bytes(data), ContentType=content_type)
+            else:
+                s3.upload_fileobj(data, CLOUDFLARE_BUCKET, file_name, ExtraArgs={"ContentType": content_type})
+        url = f"{CLOUDFLARE_ENDPOINT}/{CLOUDFLARE_BUCKET}/{file_name}"
+        logging.info(f"Uploaded {file_name} to Cloudflare R2: {url}")
+        return url
+    except Exception as e:
+        logging.error(f"Error uploading to Cloudflare: {e}", exc_info=True)
+        return None
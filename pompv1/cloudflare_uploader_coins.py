@@ -2,7 +2,8 @@
 
 import os
 import logging
-import boto3
+from cloudflare_uploader import get_s3_client
+from metrics import metrics
 
 def upload_yes_coin_png(file_path, file_name):
     """
@@ -31,12 +32,7 @@ def upload_yes_coin_png(file_path, file_name):
         return None
 
     try:
-        s3 = boto3.client(
-            "s3",
-            endpoint_url=CLOUDFLARE_ENDPOINT,
-            aws_access_key_id=CLOUDFLARE_ACCESS_KEY,
-            aws_secret_access_key=CLOUDFLARE_SECRET_KEY
-        )
+        s3 = get_s3_client()
 
         # Mark file as publicly readable
         s3.upload_file(
@@ -54,3 +50,64 @@ def upload_yes_coin_png(file_path, file_name):
     except Exception as e:
         logging.error(f"Coin uploader: Error uploading {file_name} => {e}", exc_info=True)
         return None
+
+def upload_yes_coin_bytes(data, file_name):
+    """
+    Same as upload_yes_coin_png() for an in-memory PNG, using the shared pooled
+    S3 client so several "yes" coins can be uploaded concurrently.
+    Returns the public URL or None on error.
+    """
+    CLOUDFLARE_BUCKET = os.getenv("CLOUDFLARE_BUCKET")
+    CLOUDFLARE_PUBLIC_COINS = os.getenv("CLOUDFLARE_PUBLIC_COINS")
+
+    s3 = get_s3_client()
+    if not CLOUDFLARE_BUCKET or not CLOUDFLARE_PUBLIC_COINS or s3 is None:
+        logging.warning("Coin uploader: missing some Cloudflare env variables. Skipping upload.")
+        return None
+
+    try:
+        with metrics.timer("r2_upload_yes"):
+            s3.put_object(
+                Bucket=CLOUDFLARE_BUCKET,
+                Key=file_name,
+                Body=bytes(data),
+                ContentType="image/png",
+                ACL="public-read"
+            )
+        final_url = f"{CLOUDFLARE_PUBLIC_COINS}/{file_name}"
+        logging.info(f"Coin uploader: {file_name} => {final_url}")
+        return final_url
+
+    except Exception as e:
+        logging.error(f"Coin uploader: Error uploading {file_name} => {e}", exc_info=True)
+        return None
+
+def copy_yes_coin(source_key, file_name):
+    """
+    Server-side R2 copy of an already uploaded tile (e.g. the watermill tile) to the
+    "yes" coin key, so the image is neither re-encoded nor re-uploaded.
+    Returns the public URL or None on error (callers fall back to an upload).
+    """
+    CLOUDFLARE_BUCKET = os.getenv("CLOUDFLARE_BUCKET")
+    CLOUDFLARE_PUBLIC_COINS = os.getenv("CLOUDFLARE_PUBLIC_COINS")
+
+    s3 = get_s3_client()
+    if not CLOUDFLARE_BUCKET or not CLOUDFLARE_PUBLIC_COINS or s3 is None:
+        logging.warning("Coin uploader: missing some Cloudflare env variables. Skipping copy.")
+        return None
+
+    try:
+        with metrics.timer("r2_copy_yes"):
+            s3.copy_object(
+                Bucket=CLOUDFLARE_BUCKET,
+                Key=file_name,
+                CopySource={"Bucket": CLOUDFLARE_BUCKET, "Key": source_key},
+                ACL="public-read"
+            )
+        final_url = f"{CLOUDFLARE_PUBLIC_COINS}/{file_name}"
+        logging.info(f"Coin uploader: copied {source_key} => {final_url}")
+        return final_url
+
+    except Exception as e:
+        logging.error(f"Coin uploader: Error copying {source_key} to {file_name} => {e}", exc_info=True)
+        return None
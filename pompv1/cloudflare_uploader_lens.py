@@ -2,7 +2,8 @@
 
 import os
 import logging
-import boto3
+from cloudflare_uploader import get_s3_client
+from metrics import metrics
 
 def upload_lens_screenshot(file_path, file_name):
     """
@@ -29,12 +30,7 @@ def upload_lens_screenshot(file_path, file_name):
         return None
 
     try:
-        s3 = boto3.client(
-            's3',
-            endpoint_url=CLOUDFLARE_ENDPOINT,
-            aws_access_key_id=CLOUDFLARE_ACCESS_KEY,
-            aws_secret_access_key=CLOUDFLARE_SECRET_KEY
-        )
+        s3 = get_s3_client()
         # Make object publicly readable
         s3.upload_file(file_path, CLOUDFLARE_BUCKET, file_name, ExtraArgs={'ACL': 'public-read'})
 
@@ -46,3 +42,28 @@ def upload_lens_screenshot(file_path, file_name):
     except Exception as e:
         logging.error(f"Error uploading lens screenshot to Cloudflare: {e}", exc_info=True)
         return None
+
+def upload_lens_fileobj(fileobj, file_name, content_type="image/png"):
+    """
+    Streams a readable file object (e.g. a request body) to R2 with upload_fileobj,
+    reading it in chunks so memory stays bounded. Same public URL as upload_lens_screenshot().
+    """
+    CLOUDFLARE_BUCKET = os.getenv("CLOUDFLARE_BUCKET")
+    CLOUDFLARE_PUBLIC_LENS = os.getenv("CLOUDFLARE_PUBLIC_LENS")
+
+    s3 = get_s3_client()
+    if not CLOUDFLARE_BUCKET or not CLOUDFLARE_PUBLIC_LENS or s3 is None:
+        logging.warning("Cloudflare credentials or lens public domain missing. Skipping lens upload.")
+        return None
+
+    try:
+        with metrics.timer("r2_upload_lens"):
+            s3.upload_fileobj(fileobj, CLOUDFLARE_BUCKET, file_name,
+                              ExtraArgs={'ACL': 'public-read', 'ContentType': content_type})
+        final_url = f"{CLOUDFLARE_PUBLIC_LENS}/{file_name}"
+        logging.info(f"Uploaded lens screenshot => {final_url}")
+        return final_url
+
+    except Exception as e:
+        logging.error(f"Error uploading lens screenshot to Cloudflare: {e}", exc_info=True)
+        return None
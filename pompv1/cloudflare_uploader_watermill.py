@@ -2,7 +2,8 @@
 
 import os
 import logging
-import boto3
+from cloudflare_uploader import get_s3_client
+from metrics import metrics
 
 def upload_watermill_coin(file_path, file_name):
     """
@@ -29,12 +30,7 @@ def upload_watermill_coin(file_path, file_name):
         return None
 
     try:
-        s3 = boto3.client(
-            "s3",
-            endpoint_url=CLOUDFLARE_ENDPOINT,
-            aws_access_key_id=CLOUDFLARE_ACCESS_KEY,
-            aws_secret_access_key=CLOUDFLARE_SECRET_KEY
-        )
+        s3 = get_s3_client()
 
         # Make the file public
         s3.upload_file(
@@ -51,3 +47,55 @@ def upload_watermill_coin(file_path, file_name):
     except Exception as e:
         logging.error(f"Error uploading watermill coin {file_name} => {e}", exc_info=True)
         return None
+
+def upload_watermill_coin_bytes(data, file_name):
+    """
+    Same as upload_watermill_coin() for an in-memory PNG (no temp file), using the
+    shared pooled S3 client so tiles can be uploaded concurrently.
+    Returns the public URL or None on error.
+    """
+    CLOUDFLARE_BUCKET = os.getenv("CLOUDFLARE_BUCKET")
+    CLOUDFLARE_PUBLIC_URL = os.getenv("CLOUDFLARE_PUBLIC_URL")
+
+    s3 = get_s3_client()
+    if not CLOUDFLARE_BUCKET or not CLOUDFLARE_PUBLIC_URL or s3 is None:
+        logging.warning("Missing some Cloudflare env variables for watermill upload. Skipping.")
+        return None
+
+    try:
+        with metrics.timer("r2_upload_watermill"):
+            s3.put_object(
+                Bucket=CLOUDFLARE_BUCKET,
+                Key=file_name,
+                Body=bytes(data),
+                ContentType="image/png",
+                ACL="public-read"
+            )
+        final_url = f"{CLOUDFLARE_PUBLIC_URL}/{file_name}"
+        logging.info(f"Uploaded watermill coin: {file_name} => {final_url}")
+        return final_url
+
+    except Exception as e:
+        logging.error(f"Error uploading watermill coin {file_name} => {e}", exc_info=True)
+        return None
+
+def delete_watermill_object(file_name):
+    """
+    Deletes an object from the watermill bucket (e.g. a temporary grid).
+    Returns True on success, False on error.
+    """
+    CLOUDFLARE_BUCKET = os.getenv("CLOUDFLARE_BUCKET")
+
+    s3 = get_s3_client()
+    if not CLOUDFLARE_BUCKET or s3 is None:
+        logging.warning("Missing some Cloudflare env variables for watermill delete. Skipping.")
+        return False
+
+    try:
+        s3.delete_object(Bucket=CLOUDFLARE_BUCKET, Key=file_name)
+        logging.info(f"Deleted watermill object: {file_name}")
+        return True
+
+    except Exception as e:
+        logging.error(f"Error deleting watermill object {file_name} => {e}", exc_info=True)
+        return False
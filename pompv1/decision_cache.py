@@ -0,0 +1,93 @@
+# File: /pompv1/decision_cache.py
+
+"""
+Shared cache of per-coin LLM decisions, keyed by a content fingerprint.
+
+A coin's fingerprint is a hash of its icon (IPFS hash), name, symbol and
+description, so a coin that shows up again with identical content gets the
+decision it got last time instead of another LLM call. Entries live in Redis
+(decision:<fingerprint>) with a TTL; a sorted set of insertion times keeps the
+cache bounded to max_items by evicting the oldest entries.
+"""
+
+import hashlib
+import logging
+import time
+
+from icon_cache import icon_key
+
+
+def coin_fingerprint(coin):
+    """
+    Content fingerprint of a coin dict (listener buffer entry or 'coins' row),
+    or None if the coin has neither an icon nor a name to recognise it by.
+    """
+    image = coin.get("metadata_image_official") or ""
+    name = (coin.get("metadata_name") or "").strip()
+    if not image and not name:
+        return None
+    parts = [
+        icon_key(image) if image else "",
+        name,
+        (coin.get("metadata_symbol") or "").strip(),
+        (coin.get("metadata_description") or "").strip(),
+    ]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class DecisionCache:
+    def __init__(self, redis_client, ttl_seconds=1800, max_items=50000, prefix="decision"):
+        self.redis = redis_client
+        self.ttl_seconds = int(ttl_seconds)
+        self.max_items = max_items
+        self.prefix = prefix
+        self.index = f"{prefix}:index"
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_many(self, fingerprints):
+        """
+        Returns {fingerprint: "yes"|"no"} for the cached ones. Errors count as misses.
+        """
+        wanted = [fp for fp in fingerprints if fp]
+        found = {}
+        if wanted:
+            try:
+                values = self.redis.mget([f"{self.prefix}:{fp}" for fp in wanted])
+                for fp, value in zip(wanted, values):
+                    if value is not None:
+                        found[fp] = value.decode() if isinstance(value, bytes) else value
+            except Exception as e:
+                logging.error(f"Decision cache read failed: {e}")
+        self.hits += len(found)
+        self.misses += len(fingerprints) - len(found)
+        return found
+
+    def put_many(self, decisions):
+        """
+        Stores {fingerprint: decision} and evicts the oldest entries beyond max_items.
+        """
+        decisions = {fp: d for fp, d in decisions.items() if fp and d in ("yes", "no")}
+        if not decisions:
+            return
+        now = time.time()
+        try:
+            pipe = self.redis.pipeline()
+            for fp, decision in decisions.items():
+                pipe.set(f"{self.prefix}:{fp}", decision, ex=self.ttl_seconds)
+            pipe.zadd(self.index, {fp: now for fp in decisions})
+            # Index entries older than the TTL point at expired keys
+            pipe.zremrangebyscore(self.index, 0, now - self.ttl_seconds)
+            pipe.zcard(self.index)
+            size = pipe.execute()[-1]
+            if size > self.max_items:
+                evicted = self.redis.zpopmin(self.index, size - self.max_items)
+                if evicted:
+                    self.redis.delete(*[f"{self.prefix}:{fp.decode() if isinstance(fp, bytes) else fp}"
+                                        for fp, _ in evicted])
+        except Exception as e:
+            logging.error(f"Decision cache write failed: {e}")
@@ -0,0 +1,186 @@
+# File: /pompv1/dedup.py
+
+"""
+Pre-bundle duplicate filter for re-launched tokens.
+
+Each coin gets a normalized name/symbol key, its icon's IPFS hash and a 64-bit
+perceptual difference hash (dHash) of the icon. Keys are checked against a
+sliding time window of recently seen coins; a match on the name key, the exact
+icon hash, or an icon within `max_distance` bits counts as a duplicate.
+
+Near-duplicate lookups use 8 bands of 8 bits (pigeonhole: any hash within 7
+bits shares at least one band), so only a small candidate set is compared.
+The index lives in memory, or in Redis when a client is given so several
+listeners share one window.
+"""
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+
+BANDS = 8
+BAND_BITS = 64 // BANDS
+
+
+def dhash(img, hash_size=8):
+    """
+    64-bit difference hash of a PIL image.
+    """
+    from PIL.Image import Resampling
+
+    gray = img.convert("L").resize((hash_size + 1, hash_size), Resampling.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (1 if pixels[offset + col] > pixels[offset + col + 1] else 0)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def name_key(name, symbol):
+    """
+    Case/width/punctuation-insensitive key for a coin's name and symbol, or None if both are empty.
+    """
+    def norm(text):
+        text = unicodedata.normalize("NFKC", text or "").casefold()
+        return re.sub(r"[\W_]+", "", text)
+
+    n, s = norm(name), norm(symbol)
+    if not n and not s:
+        return None
+    return f"{n}|{s}"
+
+
+def _bands(value):
+    return [(i, (value >> (i * BAND_BITS)) & ((1 << BAND_BITS) - 1)) for i in range(BANDS)]
+
+
+class DuplicateIndex:
+    def __init__(self, window_seconds=1800, max_distance=6, redis_client=None, prefix="dedup"):
+        self.window_seconds = window_seconds
+        self.max_distance = min(max_distance, BANDS - 1)
+        self.redis = redis_client
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._entries = deque()   # (ts, mint, name_key, icon_key, phash) in insertion order
+        self._by_name = {}
+        self._by_icon = {}
+        self._by_band = {}        # (band, value) -> {mint: phash}
+        self.checked = 0
+        self.duplicates = 0
+
+    def check_and_add(self, mint, name, symbol, icon_key=None, phash=None):
+        """
+        Returns a match dict {"reason", "mint", "distance"} if the coin duplicates one
+        seen within the window, otherwise records it and returns None.
+        """
+        key = name_key(name, symbol)
+        if self.redis is not None:
+            match = self._check_redis(mint, key, icon_key, phash)
+        else:
+            match = self._check_memory(mint, key, icon_key, phash)
+        self.checked += 1
+        if match:
+            self.duplicates += 1
+        return match
+
+    # --- in-memory index -------------------------------------------------
+
+    def _expire(self, now):
+        cutoff = now - self.window_seconds
+        while self._entries and self._entries[0][0] < cutoff:
+            _, mint, key, ikey, phash = self._entries.popleft()
+            if key and self._by_name.get(key) == mint:
+                del self._by_name[key]
+            if ikey and self._by_icon.get(ikey) == mint:
+                del self._by_icon[ikey]
+            if phash is not None:
+                for band in _bands(phash):
+                    bucket = self._by_band.get(band)
+                    if bucket is not None:
+                        bucket.pop(mint, None)
+                        if not bucket:
+                            del self._by_band[band]
+
+    def _check_memory(self, mint, key, icon_key, phash):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if key and key in self._by_name:
+                return {"reason": "name", "mint": self._by_name[key], "distance": 0}
+            if icon_key and icon_key in self._by_icon:
+                return {"reason": "icon", "mint": self._by_icon[icon_key], "distance": 0}
+            if phash is not None:
+                best = None
+                for band in _bands(phash):
+                    for other_mint, other_hash in self._by_band.get(band, {}).items():
+                        distance = hamming(phash, other_hash)
+                        if distance <= self.max_distance and (best is None or distance < best["distance"]):
+                            best = {"reason": "icon", "mint": other_mint, "distance": distance}
+                if best:
+                    return best
+
+            self._entries.append((now, mint, key, icon_key, phash))
+            if key:
+                self._by_name[key] = mint
+            if icon_key:
+                self._by_icon[icon_key] = mint
+            if phash is not None:
+                for band in _bands(phash):
+                    self._by_band.setdefault(band, {})[mint] = phash
+        return None
+
+    # --- Redis index -----------------------------------------------------
+
+    def _check_redis(self, mint, key, icon_key, phash):
+        now = time.time()
+        ttl = int(self.window_seconds)
+        r = self.redis
+        try:
+            if key:
+                original = r.get(f"{self.prefix}:name:{key}")
+                if original:
+                    return {"reason": "name", "mint": original.decode(), "distance": 0}
+            if icon_key:
+                original = r.get(f"{self.prefix}:icon:{icon_key}")
+                if original:
+                    return {"reason": "icon", "mint": original.decode(), "distance": 0}
+
+            band_keys = [f"{self.prefix}:band:{i}:{v}" for i, v in _bands(phash)] if phash is not None else []
+            if band_keys:
+                pipe = r.pipeline()
+                for bk in band_keys:
+                    pipe.zremrangebyscore(bk, 0, now - self.window_seconds)
+                    pipe.zrange(bk, 0, -1)
+                results = pipe.execute()
+                best = None
+                for members in results[1::2]:
+                    for member in members:
+                        other_hash, other_mint = member.decode().split(":", 1)
+                        distance = hamming(phash, int(other_hash, 16))
+                        if distance <= self.max_distance and (best is None or distance < best["distance"]):
+                            best = {"reason": "icon", "mint": other_mint, "distance": distance}
+                if best:
+                    return best
+
+            pipe = r.pipeline()
+            if key:
+                pipe.set(f"{self.prefix}:name:{key}", mint, ex=ttl, nx=True)
+            if icon_key:
+                pipe.set(f"{self.prefix}:icon:{icon_key}", mint, ex=ttl, nx=True)
+            for bk in band_keys:
+                pipe.zadd(bk, {f"{phash:016x}:{mint}": now})
+                pipe.expire(bk, ttl)
+            pipe.execute()
+        except Exception as e:
+            # Never drop coins because the dedup store is unavailable
+            logging.error(f"Dedup Redis error, treating coin as novel: {e}", exc_info=True)
+        return None
@@ -8,57 +8,47 @@ let bundleQueue = [];
 let decisionsStore = {};    // { [bundleId]: { [coinId]: "yes"|"no" } }
 let currentBundleId = null; // Which bundle is currently being displayed?
 
-socket.on("clear_canvas", (data) => {
-  console.log("Received clear_canvas:", data);
-  const { bundle_id } = data;
-  if (!bundle_id) return console.warn("clear_canvas missing bundle_id.");
+// Grid geometry (coins per bundle, tile size); overwritten from /grid_spec
+let gridSpec = { total: 8, tile_width: 256, tile_height: 128 };
+
+// One event per bundle with all of its tiles (tiles whose upload failed have no url)
+socket.on("bundle_ready", (data) => {
+  console.log("Received bundle_ready:", data);
+  const { bundle_id, coins } = data;
+  if (!bundle_id || !Array.isArray(coins)) {
+    return console.warn("bundle_ready missing bundle_id or coins.");
+  }
+
+  const uploaded = coins.filter(c => c.id && c.url);
+  if (uploaded.length === 0) {
+    // Nothing to scroll; queueing it would never finish and stall the feed
+    return console.warn("bundle_ready without any uploaded tiles, skipping:", bundle_id);
+  }
 
   bundleQueue.push({
     bundle_id,
-    coins: [],
-    ready: false
+    coins: uploaded,
+    ready: true
   });
   tryToStartNextBundle();
 });
 
-socket.on("add_coin", (data) => {
-  console.log("Received add_coin:", data);
-  const { bundle_id, id, url } = data;
-  if (!bundle_id || !id || !url) {
-    return console.warn("add_coin event missing data.");
-  }
-
-  const bundle = bundleQueue.find(b => b.bundle_id === bundle_id);
-  if (!bundle) {
-    return console.warn("No matching bundle for add_coin.");
-  }
-
-  bundle.coins.push({ id, url });
-  // If we have 8 coins, mark ready
-  if (bundle.coins.length === 8) {
-    console.log(`All 8 coins for bundle ${bundle_id} received; marking ready.`);
-    bundle.ready = true;
-    tryToStartNextBundle();
-  }
-});
-
-socket.on("overlay_marks", (marks) => {
-  console.log("Received overlay_marks:", marks);
-  if (!currentBundleId) {
-    console.warn("No currentBundleId, storing decisions anyway.");
+// Decisions arrive separately (possibly before the bundle is displayed); the
+// scroll animation picks them up from decisionsStore, so there is no fade_out event
+socket.on("bundle_decided", (data) => {
+  console.log("Received bundle_decided:", data);
+  const { bundle_id, decisions } = data;
+  if (!bundle_id || !Array.isArray(decisions)) {
+    return console.warn("bundle_decided missing bundle_id or decisions.");
   }
-  if (!decisionsStore[currentBundleId]) {
-    decisionsStore[currentBundleId] = {};
+  if (!decisionsStore[bundle_id]) {
+    decisionsStore[bundle_id] = {};
   }
-  marks.forEach(m => {
-    decisionsStore[currentBundleId][m.id] = m.decision; // "yes" or "no"
+  decisions.forEach(m => {
+    decisionsStore[bundle_id][m.id] = m.decision; // "yes" or "no"
   });
 });
 
-socket.on("fade_out", () => {
-  console.log("Received fade_out (unused in watermill approach).");
-});
-
 // Listener for disqualified (or "pass") coins
 socket.on("disqualified_coin", (data) => {
   console.log("Received disqualified_coin:", data);
@@ -343,8 +333,8 @@ function drawInvestigation() {
 const canvas = document.getElementById("feedCanvas");
 const ctx = canvas.getContext("2d");
 
-const IMAGE_WIDTH = 256;
-const IMAGE_HEIGHT = 128;
+let IMAGE_WIDTH = gridSpec.tile_width;
+let IMAGE_HEIGHT = gridSpec.tile_height;
 const RECT_SPACING = 5; 
 const SPEED = 1;
 const STROBE_DURATION = 700;
@@ -358,6 +348,20 @@ const imageCache = {};
 let activeCoins = [];
 let nextSpawnY = -(IMAGE_HEIGHT + RECT_SPACING);
 
+// Pick up the server's grid geometry (coins per bundle, tile size)
+fetch("/grid_spec")
+  .then(res => res.json())
+  .then(spec => {
+    gridSpec = spec;
+    IMAGE_WIDTH = spec.tile_width;
+    IMAGE_HEIGHT = spec.tile_height;
+    if (!activeCoins.length) {
+      nextSpawnY = -(IMAGE_HEIGHT + RECT_SPACING);
+    }
+    console.log("Loaded grid spec:", spec);
+  })
+  .catch(err => console.warn("Could not load /grid_spec, using defaults.", err));
+
 function tryToStartNextBundle() {
   if (!currentBundleId) {
     const next = bundleQueue.find(b => b.ready);
@@ -386,6 +390,10 @@ function startBundleDisplay(bundle) {
 
   let loadCount = 0;
   const totalToLoad = bundle.coins.length;
+  if (totalToLoad === 0) {
+    // No coins means no scroll-off to wait for
+    return finishCurrentBundle();
+  }
 
   function spawnCoins() {
     bundle.coins.forEach((coin) => {
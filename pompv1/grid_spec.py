@@ -0,0 +1,63 @@
+# File: /pompv1/grid_spec.py
+
+"""
+Single source of truth for the bundle grid geometry.
+
+Read by the renderer (websocketlistener / bundle_renderer), the tile splitter
+(image_processor), the decider prompt and parser (openai_decider) and, via the
+/grid_spec route, the frontend. Configure through the environment:
+
+    GRID_COLS, GRID_ROWS       - layout (default 2 x 4 = 8 coins per bundle)
+    GRID_TILE_WIDTH/HEIGHT     - size of one coin tile (default 256 x 128)
+    GRID_IMG_WIDTH/HEIGHT      - canvas size (default cols*tile_width x rows*tile_height)
+
+Bigger bundles keep the tile size and grow the canvas, so 4 x 4 renders 16 coins
+on a 1024 x 512 image with the same per-coin layout as the default grid.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GRID_COLS = int(os.getenv("GRID_COLS", "2"))
+GRID_ROWS = int(os.getenv("GRID_ROWS", "4"))
+TOTAL_COINS = GRID_COLS * GRID_ROWS
+
+_TILE_WIDTH = int(os.getenv("GRID_TILE_WIDTH", "256"))
+_TILE_HEIGHT = int(os.getenv("GRID_TILE_HEIGHT", "128"))
+IMG_WIDTH = int(os.getenv("GRID_IMG_WIDTH", str(GRID_COLS * _TILE_WIDTH)))
+IMG_HEIGHT = int(os.getenv("GRID_IMG_HEIGHT", str(GRID_ROWS * _TILE_HEIGHT)))
+BOX_WIDTH = IMG_WIDTH // GRID_COLS
+BOX_HEIGHT = IMG_HEIGHT // GRID_ROWS
+
+
+def coin_ids(count=TOTAL_COINS):
+    """
+    Zero-padded coin ids as drawn in the grid labels: ["01", "02", ...].
+    """
+    return [f"{i+1:02d}" for i in range(count)]
+
+
+def tile_box(index):
+    """
+    (left, upper, right, lower) of coin tile `index` (0-based) in the grid image.
+    """
+    row = index // GRID_COLS
+    col = index % GRID_COLS
+    x = col * BOX_WIDTH
+    y = row * BOX_HEIGHT
+    return (x, y, x + BOX_WIDTH, y + BOX_HEIGHT)
+
+
+def as_dict():
+    return {
+        "cols": GRID_COLS,
+        "rows": GRID_ROWS,
+        "total": TOTAL_COINS,
+        "width": IMG_WIDTH,
+        "height": IMG_HEIGHT,
+        "tile_width": BOX_WIDTH,
+        "tile_height": BOX_HEIGHT,
+    }
@@ -0,0 +1,153 @@
+# File: /pompv1/icon_cache.py
+
+"""
+Prefetching coin-icon cache.
+
+Icons are fetched on a background thread pool as soon as a token's metadata is
+known, decoded and downscaled to the tile size once, and kept in a bounded LRU
+keyed by IPFS hash (copycat launches usually reuse the same hash). An optional
+on-disk tier (ICON_CACHE_DIR) keeps the downscaled PNGs across restarts.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from io import BytesIO
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+from PIL.Image import Resampling
+
+
+def scale_image_keep_aspect(img, max_size):
+    w, h = img.size
+    scale = min(max_size/w, max_size/h)
+    return img.resize((int(w*scale), int(h*scale)), Resampling.LANCZOS)
+
+
+def icon_key(url):
+    """
+    IPFS hash of an icon URL (query string stripped), or a sha1 of the URL for non-IPFS links.
+    """
+    parts = url.split("/ipfs/")
+    if len(parts) == 2:
+        ipfs_hash = parts[1].split("?")[0].strip("/")
+        if ipfs_hash:
+            return ipfs_hash
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+class IconCache:
+    def __init__(self, tile_size=100, max_items=2048, disk_dir=None, workers=8, fetch_timeout=5):
+        self.tile_size = tile_size
+        self.max_items = max_items
+        self.disk_dir = disk_dir
+        self.fetch_timeout = fetch_timeout
+        self._icons = OrderedDict()   # key -> downscaled RGBA image
+        self._inflight = {}           # key -> Future
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="icon")
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def prefetch(self, url):
+        """
+        Starts a background fetch for `url` unless it is cached or already in flight.
+        """
+        if not url:
+            return None
+        key = icon_key(url)
+        with self._lock:
+            if key in self._icons:
+                return None
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._load, key, url)
+                self._inflight[key] = future
+            return future
+
+    def get(self, url, wait=0.0):
+        """
+        Returns the downscaled icon for `url`, or None if it is not available.
+        Never starts a blocking download: on a miss it waits at most `wait`
+        seconds for a fetch that is already in flight (starting one if needed).
+        """
+        if not url:
+            return None
+        key = icon_key(url)
+        with self._lock:
+            img = self._icons.get(key)
+            if img is not None:
+                self._icons.move_to_end(key)
+                return img
+        future = self.prefetch(url)
+        if future is None:
+            with self._lock:
+                return self._icons.get(key)
+        try:
+            return future.result(timeout=wait)
+        except FutureTimeout:
+            logging.warning(f"Icon {key} not ready after {wait}s; rendering without it.")
+        except Exception as e:
+            logging.error(f"Icon {key} failed to load: {e}", exc_info=True)
+        return None
+
+    def put(self, url, img):
+        """
+        Downscales `img` and stores it under the key for `url`.
+        """
+        key = icon_key(url)
+        self._store(key, scale_image_keep_aspect(img.convert("RGBA"), self.tile_size))
+
+    def _store(self, key, img):
+        with self._lock:
+            self._icons[key] = img
+            self._icons.move_to_end(key)
+            while len(self._icons) > self.max_items:
+                self._icons.popitem(last=False)
+
+    def _disk_path(self, key):
+        safe_key = "".join(ch for ch in key if ch.isalnum() or ch in "-_")
+        return os.path.join(self.disk_dir, f"{safe_key}_{self.tile_size}.png")
+
+    def _load(self, key, url):
+        try:
+            img = None
+            if self.disk_dir:
+                path = self._disk_path(key)
+                if os.path.isfile(path):
+                    try:
+                        with Image.open(path) as cached:
+                            img = cached.convert("RGBA")
+                    except Exception as e:
+                        logging.warning(f"Discarding unreadable cached icon {path}: {e}")
+
+            if img is None:
+                resp = self._session.get(url, timeout=self.fetch_timeout)
+                if resp.status_code != 200:
+                    logging.warning(f"Failed to fetch icon {url}: Status {resp.status_code}")
+                    return None
+                cimg = Image.open(BytesIO(resp.content)).convert("RGBA")
+                img = scale_image_keep_aspect(cimg, self.tile_size)
+                if self.disk_dir:
+                    try:
+                        img.save(self._disk_path(key), "PNG")
+                    except Exception as e:
+                        logging.warning(f"Failed to write icon cache file for {key}: {e}")
+
+            self._store(key, img)
+            return img
+        except Exception as e:
+            logging.error(f"Error fetching coin icon {url}: {e}", exc_info=True)
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
@@ -8,16 +8,25 @@ import requests
 import logging
 import base64
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from flask import Flask, request, send_from_directory, jsonify
+from flask import Flask, Request, Response, request, send_from_directory, jsonify
 from flask_socketio import SocketIO
+from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
-from openai_decider import get_decision
-from cloudflare_uploader_coins import upload_yes_coin_png
+from openai_decider import request_decisions
+from grid_spec import TOTAL_COINS, GRID_COLS, IMG_WIDTH, BOX_HEIGHT, coin_ids, tile_box, as_dict as grid_spec_dict
+from decision_cache import DecisionCache, coin_fingerprint
+from bundle_handoff import BundleHandoff
+from reliable_queue import ReliableQueue
+from metrics import metrics
+from cloudflare_uploader import upload_bytes_to_cloudflare
+from cloudflare_uploader_lens import upload_lens_fileobj
+from cloudflare_uploader_coins import upload_yes_coin_bytes, copy_yes_coin
 # NEW importer
-from cloudflare_uploader_watermill import upload_watermill_coin
+from cloudflare_uploader_watermill import upload_watermill_coin_bytes, delete_watermill_object
 
 load_dotenv()
 
@@ -43,28 +52,308 @@ except Exception as e:
     logging.error(f"Failed to connect to Redis: {e}", exc_info=True)
     exit(1)
 
+# Grids rendered by the listener, read from Redis before falling back to image_url
+bundle_handoff = BundleHandoff(r, ttl_seconds=int(os.getenv("HANDOFF_TTL_SECONDS", "600")))
+
+# bundle_queue is consumed with blocking BLMOVE + leases (see reliable_queue.py)
+PROCESSOR_WORKERS = int(os.getenv("PROCESSOR_WORKERS", "2"))
+QUEUE_BLOCK_SECONDS = int(os.getenv("QUEUE_BLOCK_SECONDS", "5"))
+QUEUE_VISIBILITY_TIMEOUT = float(os.getenv("QUEUE_VISIBILITY_TIMEOUT", "300"))
+QUEUE_MAX_DELIVERIES = int(os.getenv("QUEUE_MAX_DELIVERIES", "3"))
+QUEUE_REAP_INTERVAL = float(os.getenv("QUEUE_REAP_INTERVAL", "15"))
+bundle_queue = ReliableQueue(r, "bundle_queue",
+                             visibility_timeout=QUEUE_VISIBILITY_TIMEOUT,
+                             max_deliveries=QUEUE_MAX_DELIVERIES)
+
+# Per-coin decisions shared by all processors (see decision_cache.py)
+DECISION_CACHE_ENABLED = os.getenv("DECISION_CACHE_ENABLED", "1") == "1"
+decision_cache = DecisionCache(r,
+                               ttl_seconds=int(os.getenv("DECISION_CACHE_TTL", "1800")),
+                               max_items=int(os.getenv("DECISION_CACHE_MAX", "50000"))) if DECISION_CACHE_ENABLED else None
+
+# Tiles are encoded and uploaded concurrently (one pooled S3 client, see cloudflare_uploader.py)
+TILE_UPLOAD_WORKERS = int(os.getenv("TILE_UPLOAD_WORKERS", str(TOTAL_COINS)))
+tile_executor = ThreadPoolExecutor(max_workers=TILE_UPLOAD_WORKERS, thread_name_prefix="tile-upload")
+# Decision requests run next to the tile stage, one slot per bundle worker
+decision_executor = ThreadPoolExecutor(max_workers=PROCESSOR_WORKERS, thread_name_prefix="decision")
+
+class InMemoryUploadRequest(Request):
+    """
+    Keeps multipart file uploads in memory. Werkzeug spools files over 500 KB to a
+    temporary file; uploads are capped by MAX_CONTENT_LENGTH below instead.
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return BytesIO()
+
 app = Flask(__name__, static_url_path='/static', static_folder='frontend')
+app.request_class = InMemoryUploadRequest
+# Caps screenshot uploads (JSON and streamed); 0 = unlimited
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024) or None
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-IMG_WIDTH = 512
-IMG_HEIGHT = 512
-GRID_COLS = 2
-GRID_ROWS = 4
-BOX_WIDTH = IMG_WIDTH // GRID_COLS
-BOX_HEIGHT = IMG_HEIGHT // GRID_ROWS
+def load_bundle_image(bundle_id, image_url):
+    """
+    Returns (RGBA grid image, {coin_id: coin_uuid}, {coin_id: fingerprint}) from the
+    Redis handoff, or by downloading image_url on a miss. Returns (None, {}, {}) if
+    neither works.
+    """
+    png_bytes, coin_uuids, fingerprints = bundle_handoff.get(bundle_id)
+    metrics.inc("handoff_hits" if png_bytes else "handoff_misses")
+    if png_bytes:
+        try:
+            img = Image.open(BytesIO(png_bytes)).convert("RGBA")
+            logging.info(f"Loaded bundle {bundle_id} image from Redis handoff "
+                         f"[{bundle_handoff.hits} hits / {bundle_handoff.misses} misses].")
+            return img, coin_uuids, fingerprints
+        except Exception as e:
+            logging.error(f"Corrupt handoff image for bundle {bundle_id}, downloading instead: {e}")
+
+    logging.info("Downloading image...")
+    try:
+        resp = requests.get(image_url, timeout=10)
+        resp.raise_for_status()
+        img = Image.open(BytesIO(resp.content)).convert("RGBA")
+        logging.info("Image downloaded and opened successfully.")
+        return img, {}, {}
+    except requests.RequestException as e:
+        logging.error(f"Failed to download image for bundle {bundle_id}: {e}", exc_info=True)
+    except Exception as e:
+        logging.error(f"Error processing image for bundle {bundle_id}: {e}", exc_info=True)
+    return None, {}, {}
+
+def watermill_tile_key(bundle_id, coin_id):
+    return f"{bundle_id}_{coin_id}.png"
 
-current_bundle_id = None
+def upload_tile(bundle_id, index, tile):
+    """
+    Encodes one cropped tile in memory, uploads it to the watermill bucket and saves
+    the URL to the coin's existing row. Returns {"id", "url"}; url is "" if the upload failed.
+    """
+    coin_id_str = f"{index+1:02d}"
+    buf = BytesIO()
+    tile.save(buf, format='PNG')
+    cf_url = upload_watermill_coin_bytes(buf.getvalue(), watermill_tile_key(bundle_id, coin_id_str))
+    if not cf_url:
+        cf_url = ""  # fallback empty
+    logging.info(f"Cropped, uploaded coin {index+1} => {cf_url}")
+
+    # Save that CF URL to DB's "coins.watermillcoins" (an update, so a missing coin
+    # row stays missing instead of being created without its metadata)
+    try:
+        supabase.table('coins') \
+            .update({"watermillcoins": cf_url}) \
+            .eq("bundle_id", bundle_id) \
+            .eq("coin_id", coin_id_str) \
+            .execute()
+    except Exception as e:
+        logging.error(f"Failed to update DB watermillcoins for bundle {bundle_id} coin {coin_id_str}: {e}",
+                      exc_info=True)
+    return {"id": coin_id_str, "url": cf_url}
 
-def process_next_bundle():
+def upload_tiles(bundle_id, img, coin_count):
     """
-    Continuously checks the 'bundle_queue' in Redis for the next item (bundle).
+    Crops the grid into coin_count tiles and uploads them (and saves their watermill
+    URLs) in parallel. Returns the coins_data list in coin order, or None if a tile
+    could not be cropped.
     """
-    global current_bundle_id
-    item = r.lpop("bundle_queue")
-    if not item:
-        logging.info("No item found in bundle_queue.")
+    started = time.time()
+    try:
+        tiles = [img.crop(tile_box(i)) for i in range(coin_count)]
+    except Exception as e:
+        logging.error(f"Error cropping coins from bundle {bundle_id}: {e}", exc_info=True)
+        return None
+
+    futures = [tile_executor.submit(upload_tile, bundle_id, i, tile) for i, tile in enumerate(tiles)]
+    coins_data = []
+    for i, future in enumerate(futures):
+        try:
+            coins_data.append(future.result())
+        except Exception as e:
+            logging.error(f"Error uploading coin {i+1} from bundle {bundle_id}: {e}", exc_info=True)
+            coins_data.append({"id": f"{i+1:02d}", "url": ""})
+
+    logging.info(f"Uploaded {len(coins_data)} tiles for bundle {bundle_id} in {time.time() - started:.2f}s")
+    return coins_data
+
+def resolve_coin_uuids(bundle_id, coin_ids, known=None):
+    """
+    Returns {coin_id: coin_uuid} for the given coin ids, using ids handed off by the
+    listener where available and one 'coins' select for the rest.
+    """
+    coin_uuids = {cid: (known or {}).get(cid) for cid in coin_ids}
+    missing = [cid for cid, uuid in coin_uuids.items() if not uuid]
+    if missing:
+        resp = supabase.table('coins') \
+            .select('id, coin_id') \
+            .eq('bundle_id', bundle_id) \
+            .in_('coin_id', missing) \
+            .execute()
+        for row in resp.data or []:
+            coin_uuids[row['coin_id']] = row['id']
+    return {cid: uuid for cid, uuid in coin_uuids.items() if uuid}
+
+def upload_yes_tile(img, bundle_id, coin_id, goodcoin_id, tile_uploaded=False):
+    """
+    Copies the already uploaded watermill tile to the goodcoin's key in R2; crops,
+    encodes and uploads the tile only if there is nothing to copy or the copy fails.
+    """
+    if tile_uploaded:
+        copied_url = copy_yes_coin(watermill_tile_key(bundle_id, coin_id), f"{goodcoin_id}.png")
+        if copied_url:
+            return copied_url
+    buf = BytesIO()
+    img.crop(tile_box(int(coin_id) - 1)).save(buf, format='PNG')
+    return upload_yes_coin_bytes(buf.getvalue(), f"{goodcoin_id}.png")
+
+def create_goodcoins(bundle_id, img, yes_ids, known_uuids=None, uploaded_tiles=()):
+    """
+    Inserts a 'goodcoins' row for every "yes" coin in one call, copies (or uploads)
+    their tiles concurrently and stores the image URLs with one upsert.
+    `uploaded_tiles` are the coin ids whose watermill tile is already in R2.
+    Coins that already have a goodcoins row (a redelivered bundle) are skipped, so
+    newcoincheck never sees the same coin twice (sql/goodcoins_coin_uuid_unique.sql).
+    """
+    try:
+        coin_uuids = resolve_coin_uuids(bundle_id, yes_ids, known_uuids)
+    except Exception as e:
+        logging.error(f"Failed to look up coin rows for bundle {bundle_id}: {e}", exc_info=True)
+        return
+    for coin_id in yes_ids:
+        if coin_id not in coin_uuids:
+            logging.warning(f"Could not find coin row for (bundle_id={bundle_id}, coin_id={coin_id}).")
+    if not coin_uuids:
+        return
+
+    try:
+        # Only the rows actually inserted come back
+        gc_insert_resp = supabase.table('goodcoins') \
+            .upsert([{"coin_uuid": uuid} for uuid in coin_uuids.values()],
+                    on_conflict="coin_uuid", ignore_duplicates=True) \
+            .execute()
+    except Exception as e:
+        logging.error(f"Failed to insert goodcoins rows for bundle {bundle_id}: {e}", exc_info=True)
         return
+    if not gc_insert_resp.data:
+        logging.info(f"No new goodcoins rows for bundle {bundle_id} (already created).")
+        return
+
+    coin_id_by_uuid = {uuid: cid for cid, uuid in coin_uuids.items()}
+    futures = {}
+    for row in gc_insert_resp.data:
+        coin_id = coin_id_by_uuid.get(row['coin_uuid'])
+        if coin_id:
+            futures[(row['id'], row['coin_uuid'])] = tile_executor.submit(
+                upload_yes_tile, img, bundle_id, coin_id, row['id'], coin_id in uploaded_tiles)
+
+    updates = []
+    for (goodcoin_id, coin_uuid), future in futures.items():
+        try:
+            uploaded_url = future.result()
+        except Exception as e:
+            logging.error(f"Error uploading goodcoins id={goodcoin_id} image: {e}", exc_info=True)
+            uploaded_url = None
+        if uploaded_url:
+            updates.append({"id": goodcoin_id, "coin_uuid": coin_uuid, "cloudflareimage": uploaded_url})
+        else:
+            logging.warning(f"Coin upload failed for goodcoins id={goodcoin_id}")
+
+    if updates:
+        try:
+            supabase.table('goodcoins').upsert(updates).execute()
+            logging.info(f"Updated {len(updates)} goodcoins rows with images for bundle {bundle_id}")
+        except Exception as e:
+            logging.error(f"Failed to update goodcoins images for bundle {bundle_id}: {e}", exc_info=True)
+
+def bundle_fingerprints(bundle_id, coin_count, known=None):
+    """
+    {coin_id: fingerprint} from the handoff, or from one 'coins' select on a miss.
+    """
+    if known:
+        return known
+    try:
+        resp = supabase.table('coins') \
+            .select('coin_id, metadata_image_official, metadata_name, metadata_symbol, metadata_description') \
+            .eq('bundle_id', bundle_id) \
+            .execute()
+    except Exception as e:
+        logging.error(f"Failed to load coins for bundle {bundle_id} fingerprints: {e}")
+        return {}
+    return {row['coin_id']: coin_fingerprint(row) for row in resp.data or []
+            if row.get('coin_id') in coin_ids(coin_count) and coin_fingerprint(row)}
+
+def compact_grid(img, ids):
+    """
+    A smaller grid holding only the tiles of `ids` (their drawn labels are kept).
+    """
+    rows = (len(ids) + GRID_COLS - 1) // GRID_COLS
+    grid = Image.new("RGBA", (IMG_WIDTH, rows * BOX_HEIGHT), (255, 255, 255, 255))
+    for slot, coin_id in enumerate(ids):
+        x, y, _, _ = tile_box(slot)
+        grid.paste(img.crop(tile_box(int(coin_id) - 1)), (x, y))
+    return grid
+
+def decide_bundle(bundle_id, image_url, img, coin_count, known_fingerprints=None):
+    """
+    Decisions for all coins of a bundle. Coins found in the decision cache are not
+    sent to the LLM: a fully cached bundle makes no request, a partly cached one
+    sends a compact grid of the unknown coins only. That grid is a temporary object
+    in the watermill bucket and is deleted once the request is over.
+    """
+    ids = coin_ids(coin_count)
+    cached = {}
+    fingerprints = {}
+    if decision_cache is not None:
+        fingerprints = bundle_fingerprints(bundle_id, coin_count, known_fingerprints)
+        hits = decision_cache.get_many([fingerprints.get(cid) for cid in ids])
+        cached = {cid: hits[fingerprints[cid]] for cid in ids if fingerprints.get(cid) in hits}
+        metrics.inc("decision_cache_hits", len(cached))
+        metrics.inc("decision_cache_misses", len(ids) - len(cached))
+        logging.info(f"Decision cache: {len(cached)}/{len(ids)} coins of bundle {bundle_id} cached "
+                     f"[hit rate {decision_cache.hit_rate():.1%}]")
+
+    unknown = [cid for cid in ids if cid not in cached]
+    fresh = {}
+    if unknown:
+        grid_url, pending_key = image_url, None
+        if cached:
+            buf = BytesIO()
+            compact_grid(img, unknown).save(buf, format='PNG')
+            pending_key = f"{bundle_id}_pending.png"
+            grid_url = upload_watermill_coin_bytes(buf.getvalue(), pending_key)
+            if not grid_url:
+                grid_url, unknown, pending_key = image_url, ids, None
+        try:
+            with metrics.timer("llm_decision", bundle_id):
+                decisions, answered = request_decisions(bundle_id, grid_url, unknown)
+        finally:
+            # Also runs when the request failed or the bundle was abandoned meanwhile
+            if pending_key:
+                tile_executor.submit(delete_watermill_object, pending_key)
+        fresh = {d['id']: d['decision'] for d in decisions}
+        if answered and decision_cache is not None:
+            decision_cache.put_many({fingerprints.get(cid): fresh[cid] for cid in unknown})
+    else:
+        metrics.inc("llm_requests_skipped")
+
+    merged = dict(cached, **fresh)
+    return [{"id": cid, "decision": merged.get(cid, "no")} for cid in ids]
+
+def abandon_decision(bundle_id, decision_future):
+    """
+    Drops a bundle's decision request. Only a request still waiting for a worker can
+    be cancelled; one already running completes (answered decisions still go to the
+    decision cache) and its result is ignored.
+    """
+    if decision_future.cancel():
+        logging.info(f"Cancelled the pending decision request for bundle {bundle_id}.")
+    else:
+        logging.warning(f"Decision request for bundle {bundle_id} is already running; it will complete "
+                        f"but its result is discarded.")
 
+def process_bundle_item(item):
+    """
+    Processes one raw 'bundle_queue' item: tiles, frontend, decisions, goodcoins.
+    """
     logging.info(f"Pulled item from queue: {item}")
 
     try:
@@ -75,152 +364,118 @@ def process_next_bundle():
 
     bundle_id = data.get("bundle_id")
     image_url = data.get("image_url")
+    # Partial bundles (time-bounded flush) fill only the first coin_count tiles
+    coin_count = min(int(data.get("coin_count") or TOTAL_COINS), TOTAL_COINS)
     logging.info(f"Starting process for bundle {bundle_id} with image_url {image_url}")
 
     if not bundle_id or not image_url:
         logging.error("Bundle data missing bundle_id or image_url.")
         return
 
-    current_bundle_id = bundle_id
+    started = time.time()
+    if data.get("enqueued_at"):
+        metrics.observe("queue_wait", max(0.0, started - float(data["enqueued_at"])), bundle_id)
 
-    # 1) Download main image
-    logging.info("Downloading image...")
-    try:
-        resp = requests.get(image_url, timeout=10)
-        resp.raise_for_status()
-        img = Image.open(BytesIO(resp.content)).convert("RGBA")
-        logging.info("Image downloaded and opened successfully.")
-    except requests.RequestException as e:
-        logging.error(f"Failed to download image for bundle {bundle_id}: {e}", exc_info=True)
-        return
-    except Exception as e:
-        logging.error(f"Error processing image for bundle {bundle_id}: {e}", exc_info=True)
+    # 1) Load main image (Redis handoff from the listener, else download)
+    with metrics.timer("image_load", bundle_id):
+        img, coin_uuids, fingerprints = load_bundle_image(bundle_id, image_url)
+    if img is None:
         return
 
-    # 2) Split into 8 coins
-    coins_data = []
-    for i in range(8):
-        row = i // GRID_COLS
-        col = i % GRID_COLS
-        x = col * BOX_WIDTH
-        y = row * BOX_HEIGHT
-        try:
-            coin_img = img.crop((x, y, x + BOX_WIDTH, y + BOX_HEIGHT))
-            coin_file_name = f"{bundle_id}_{i+1:02d}.png"
-            coin_img.save(coin_file_name, format='PNG')  # temp local
-
-            # NEW: upload each piece to CF
-            cf_url = upload_watermill_coin(coin_file_name, coin_file_name)
-            if not cf_url:
-                cf_url = ""  # fallback empty
-
-            # Save that CF URL to DB's "coins.watermillcoins"
-            coin_id_str = f"{i+1:02d}"
-            try:
-                supabase.table('coins') \
-                    .update({"watermillcoins": cf_url}) \
-                    .eq("bundle_id", bundle_id) \
-                    .eq("coin_id", coin_id_str) \
-                    .execute()
-            except Exception as e:
-                logging.error(f"Failed to update DB watermillcoins for coin_id={coin_id_str}: {e}", exc_info=True)
-
-            coins_data.append({
-                "id": coin_id_str,
-                "url": cf_url
-            })
-            # Clean up local file if desired
-            if os.path.isfile(coin_file_name):
-                os.remove(coin_file_name)
-
-            logging.info(f"Cropped, uploaded coin {i+1} => {cf_url}")
-        except Exception as e:
-            logging.error(f"Error cropping coin {i+1} from bundle {bundle_id}: {e}", exc_info=True)
-            return
+    # The decision request (cache lookup + LLM for unknown coins) runs while the
+    # tiles are uploaded and sent to the frontend:
+    #          .-> decision (cache, LLM) ------.
+    #   image -+-> tiles -> bundle_ready ------+--> bundle_decided -> goodcoins
+    logging.info("Requesting decisions from OpenAI (image-based).")
+    decision_future = decision_executor.submit(decide_bundle, bundle_id, image_url, img, coin_count, fingerprints)
+
+    # 2) Split into coin_count tiles (see grid_spec.py) and upload them in parallel
+    with metrics.timer("tile_upload", bundle_id):
+        coins_data = upload_tiles(bundle_id, img, coin_count)
+    if coins_data is None:
+        abandon_decision(bundle_id, decision_future)
+        return
 
-    # 3) Send them to front-end
+    # 3) Send them to front-end (one event with all tiles; the client owns the animation)
     try:
-        socketio.emit("clear_canvas", {"bundle_id": bundle_id})
-        for c in coins_data:
-            socketio.emit("add_coin", {
-                "bundle_id": bundle_id,
-                "id": c["id"],
-                "url": c["url"]
-            })
+        socketio.emit("bundle_ready", {
+            "bundle_id": bundle_id,
+            "coin_count": len(coins_data),
+            "coins": coins_data
+        })
     except Exception as e:
         logging.error(f"Error sending coins to frontend: {e}", exc_info=True)
+        abandon_decision(bundle_id, decision_future)
         return
 
-    # 4) Skip the GPT meta-data fetch (we only call openai_decider with the big image)
-    logging.info("Requesting decisions from OpenAI (image-based).")
-    decisions = get_decision(bundle_id, image_url)
+    # 4) Wait for the decisions (we only call openai_decider with the big image)
+    waited = time.time()
+    try:
+        decisions = decision_future.result()
+        metrics.observe("decision_wait", time.time() - waited, bundle_id)
+    except Exception as e:
+        logging.error(f"Decision request failed for bundle {bundle_id}: {e}", exc_info=True)
+        decisions = None
     logging.info(f"OpenAI decisions: {decisions}")
     if not decisions:
         logging.error(f"No valid decisions for bundle {bundle_id}.")
         return
 
-    # 5) For each "yes" coin => insert row in 'goodcoins'
-    yes_coins = [d for d in decisions if d['decision'] == 'yes']
-    for yc in yes_coins:
-        coin_id = yc['id']
-        # find coin_uuid in the 'coins' table
-        try:
-            coin_info_resp = supabase.table('coins') \
-                .select('id') \
-                .eq('bundle_id', bundle_id) \
-                .eq('coin_id', coin_id) \
-                .execute()
-            if coin_info_resp.data and len(coin_info_resp.data) > 0:
-                coin_uuid = coin_info_resp.data[0]['id']
-
-                # Insert row into goodcoins
-                gc_insert_resp = supabase.table('goodcoins').insert({
-                    "coin_uuid": coin_uuid
-                }).execute()
-                if not gc_insert_resp.data:
-                    logging.error(f"Failed to insert new row in goodcoins for coin_uuid={coin_uuid}.")
-                    continue
-
-                goodcoin_id = gc_insert_resp.data[0]['id']
-
-                # Re-crop the coin from the big image, then use upload_yes_coin_png
-                x = ((int(coin_id) - 1) % GRID_COLS) * BOX_WIDTH
-                y = ((int(coin_id) - 1) // GRID_COLS) * BOX_HEIGHT
-                sub_img = img.crop((x, y, x + BOX_WIDTH, y + BOX_HEIGHT))
-                yes_file_name = f"yes_{bundle_id}_{coin_id}.png"
-                sub_img.save(yes_file_name, format='PNG')
-                uploaded_url = upload_yes_coin_png(yes_file_name, f"{goodcoin_id}.png")
-                if os.path.isfile(yes_file_name):
-                    os.remove(yes_file_name)
-
-                if uploaded_url:
-                    supabase.table('goodcoins') \
-                        .update({"cloudflareimage": uploaded_url}) \
-                        .eq("id", goodcoin_id) \
-                        .execute()
-                    logging.info(f"Updated goodcoins id={goodcoin_id} with image={uploaded_url}")
-                else:
-                    logging.warning(f"Coin upload failed for coin_uuid={coin_uuid}")
-            else:
-                logging.warning(f"Could not find coin row for (bundle_id={bundle_id}, coin_id={coin_id}).")
-        except Exception as e:
-            logging.error(f"Error handling 'yes' coin for coin_id={coin_id}: {e}", exc_info=True)
-
-    # 6) Emit overlay marks & fade out
+    # 5) Send the marks
     try:
-        socketio.emit("overlay_marks", decisions)
-        time.sleep(1)
-        socketio.emit("fade_out", {})
+        socketio.emit("bundle_decided", {"bundle_id": bundle_id, "decisions": decisions})
     except Exception as e:
-        logging.error(f"Error overlaying marks/fading out: {e}", exc_info=True)
-
-    current_bundle_id = None
+        logging.error(f"Error sending decisions to frontend: {e}", exc_info=True)
+
+    # 6) "yes" coins => one batch of 'goodcoins' rows + their images
+    yes_ids = [d['id'] for d in decisions if d['decision'] == 'yes']
+    metrics.inc("decisions_yes", len(yes_ids))
+    metrics.inc("decisions_no", len(decisions) - len(yes_ids))
+    if yes_ids:
+        with metrics.timer("goodcoins", bundle_id):
+            create_goodcoins(bundle_id, img, yes_ids, coin_uuids,
+                             uploaded_tiles={c["id"] for c in coins_data if c["url"]})
+
+    bundle_handoff.discard(bundle_id)
+    metrics.observe("bundle_process", time.time() - started, bundle_id)
+    metrics.inc("bundles_processed")
     logging.info(f"Completed processing for bundle {bundle_id}")
 
 @app.route('/')
 def index():
     return app.send_static_file('index.html')
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Per-stage latency histograms, counters and gauges from every process (Prometheus text format).
+    """
+    gauges = {}
+    try:
+        gauges = {f"bundle_queue_{k}": v for k, v in bundle_queue.stats().items()}
+    except Exception as e:
+        logging.error(f"Failed to read bundle_queue depth: {e}")
+    try:
+        body = metrics.render_prometheus(gauges)
+    except Exception as e:
+        logging.error(f"Failed to render metrics: {e}", exc_info=True)
+        return Response(f"# metrics unavailable: {e}\n", status=503, mimetype="text/plain")
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+@app.route('/metrics/bundle/<bundle_id>', methods=['GET'])
+def bundle_metrics(bundle_id):
+    """
+    Stage timings recorded for one bundle (seconds), across listener and processor.
+    """
+    return jsonify({"bundle_id": bundle_id, "stages": metrics.bundle_timings(bundle_id)})
+
+@app.route('/grid_spec', methods=['GET'])
+def grid_spec():
+    """
+    Grid geometry shared with the renderer and decider, so the frontend can size tiles.
+    """
+    return jsonify(grid_spec_dict())
+
 @app.route('/disqualify_coin', methods=['POST'])
 def disqualify_coin():
     data = request.get_json()
@@ -239,8 +494,23 @@ def bought_coin():
         return {"status": "ok"}, 200
     return {"status": "missing coin_id"}, 400
 
+def screenshot_source(filename=None):
+    """
+    Returns (file object, filename, content type) for a binary screenshot upload:
+    a multipart 'file' field (held in memory, see InMemoryUploadRequest), or the raw
+    request body (filename from the URL), which the uploaders read in chunks.
+    Neither touches the disk.
+    """
+    upload = request.files.get("file")
+    if upload is not None:
+        return upload.stream, secure_filename(filename or upload.filename or ""), upload.mimetype or "image/png"
+    return request.stream, secure_filename(filename or ""), request.mimetype or "image/png"
+
 @app.route('/upload_screenshot', methods=['POST'])
 def upload_screenshot():
+    """
+    JSON {"base64", "filename"} upload (kept for compatibility; prefer /upload_screenshot/<filename>).
+    """
     data = request.get_json()
     if not data or 'base64' not in data or 'filename' not in data:
         return {"success": False, "message": "Missing base64 or filename"}, 400
@@ -249,12 +519,7 @@ def upload_screenshot():
     filename = data['filename']
     try:
         raw_bytes = base64.b64decode(image_b64)
-        temp_path = f"temp_{filename}"
-        with open(temp_path, "wb") as f:
-            f.write(raw_bytes)
-
-        from cloudflare_uploader import upload_to_cloudflare
-        uploaded_url = upload_to_cloudflare(temp_path, filename)
+        uploaded_url = upload_bytes_to_cloudflare(raw_bytes, filename)
         if not uploaded_url:
             return {"success": False, "message": "Cloudflare upload failed"}, 500
 
@@ -264,8 +529,31 @@ def upload_screenshot():
         logging.error(f"Error in /upload_screenshot: {e}", exc_info=True)
         return {"success": False, "message": str(e)}, 500
 
+@app.route('/upload_screenshot/<filename>', methods=['POST'])
+@app.route('/upload_screenshot_stream', methods=['POST'])
+def upload_screenshot_stream(filename=None):
+    """
+    Streams a raw PNG body (or multipart 'file') straight to R2.
+    """
+    stream, filename, content_type = screenshot_source(filename)
+    if not filename:
+        return {"success": False, "message": "Missing filename"}, 400
+    try:
+        uploaded_url = upload_bytes_to_cloudflare(stream, filename, content_type)
+        if not uploaded_url:
+            return {"success": False, "message": "Cloudflare upload failed"}, 500
+
+        return {"success": True, "cloudflareUrl": uploaded_url}, 200
+
+    except Exception as e:
+        logging.error(f"Error in /upload_screenshot stream: {e}", exc_info=True)
+        return {"success": False, "message": str(e)}, 500
+
 @app.route('/upload_screenshot_lens', methods=['POST'])
 def upload_screenshot_lens():
+    """
+    JSON {"base64", "filename"} upload (kept for compatibility; prefer /upload_screenshot_lens/<filename>).
+    """
     data = request.get_json()
     if not data or 'base64' not in data or 'filename' not in data:
         return {"success": False, "message": "Missing base64 or filename"}, 400
@@ -274,12 +562,7 @@ def upload_screenshot_lens():
     filename = data['filename']
     try:
         raw_bytes = base64.b64decode(image_b64)
-        temp_path = f"temp_{filename}"
-        with open(temp_path, "wb") as f:
-            f.write(raw_bytes)
-
-        from cloudflare_uploader_lens import upload_lens_screenshot
-        uploaded_url = upload_lens_screenshot(temp_path, filename)
+        uploaded_url = upload_lens_fileobj(BytesIO(raw_bytes), filename)
         if not uploaded_url:
             return {"success": False, "message": "Lens Cloudflare upload failed"}, 500
 
@@ -289,6 +572,26 @@ def upload_screenshot_lens():
         logging.error(f"Error in /upload_screenshot_lens: {e}", exc_info=True)
         return {"success": False, "message": str(e)}, 500
 
+@app.route('/upload_screenshot_lens/<filename>', methods=['POST'])
+@app.route('/upload_screenshot_lens_stream', methods=['POST'])
+def upload_screenshot_lens_stream(filename=None):
+    """
+    Streams a raw PNG body (or multipart 'file') straight to the lens bucket.
+    """
+    stream, filename, content_type = screenshot_source(filename)
+    if not filename:
+        return {"success": False, "message": "Missing filename"}, 400
+    try:
+        uploaded_url = upload_lens_fileobj(stream, filename, content_type)
+        if not uploaded_url:
+            return {"success": False, "message": "Lens Cloudflare upload failed"}, 500
+
+        return {"success": True, "cloudflareUrl": uploaded_url}, 200
+
+    except Exception as e:
+        logging.error(f"Error in /upload_screenshot_lens stream: {e}", exc_info=True)
+        return {"success": False, "message": str(e)}, 500
+
 @app.route('/start_investigation', methods=['POST'])
 def start_investigation():
     data = request.get_json()
@@ -325,13 +628,43 @@ def livechat_config():
         "SUPABASE_ANON_KEY": os.getenv("SUPABASE_ANON_KEY", "")
     }
 
+def process_next_bundle(timeout=QUEUE_BLOCK_SECONDS):
+    """
+    Blocks up to `timeout` seconds for the next 'bundle_queue' item and processes it.
+    The lease is extended while the bundle is processed and the item is acked when
+    processing returns; if it raises it is requeued right away (dead-lettered after
+    QUEUE_MAX_DELIVERIES), if the worker dies it is redelivered once its lease expires.
+    """
+    item = bundle_queue.get(timeout=timeout)
+    if not item:
+        return False
+    try:
+        with bundle_queue.holding(item):
+            process_bundle_item(item)
+    except Exception as e:
+        logging.error(f"Unhandled error processing {item}, requeueing it: {e}", exc_info=True)
+        try:
+            bundle_queue.requeue(item)
+        except Exception as requeue_error:
+            logging.error(f"Failed to requeue {item}, it will be redelivered after its lease: {requeue_error}")
+        return True
+    bundle_queue.ack(item)
+    return True
+
 def run_processor():
     while True:
-        process_next_bundle()
-        time.sleep(5)
+        try:
+            process_next_bundle()
+        except Exception as e:
+            # Redis unavailable etc.; back off instead of spinning
+            logging.error(f"Error reading bundle_queue: {e}", exc_info=True)
+            time.sleep(5)
 
 if __name__ == "__main__":
     import threading
-    t = threading.Thread(target=run_processor, daemon=True)
-    t.start()
+    bundle_queue.start_reaper(QUEUE_REAP_INTERVAL)
+    for n in range(PROCESSOR_WORKERS):
+        t = threading.Thread(target=run_processor, name=f"bundle-worker-{n+1}", daemon=True)
+        t.start()
+    logging.info(f"Started {PROCESSOR_WORKERS} bundle workers ({bundle_queue.stats()})")
     socketio.run(app, host="0.0.0.0", port=5000)
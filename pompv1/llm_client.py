@@ -0,0 +1,292 @@
+# File: /pompv1/llm_client.py
+
+"""
+Rate-limit-aware wrapper around the OpenAI chat completions client.
+
+- Token bucket per account limit (requests/min and tokens/min). With Redis the
+  buckets are shared by every process (one Lua call per acquire); without it
+  each process keeps its own.
+- Retries transient failures (429, 5xx, timeouts, connection errors) with full
+  jitter backoff, honouring Retry-After, and never sleeps past the caller's deadline.
+- Hedging: once enough latencies are known, a request still running after the
+  recent p95 gets a second copy (only if the bucket has room right now) and the
+  first answer wins.
+
+    llm = create_llm_client(OpenAI(api_key=...))
+    response = llm.chat(deadline=time.time() + 30, model=..., messages=[...])
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import openai
+
+# Both buckets refill continuously; returns 0 when granted, otherwise seconds to wait
+_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local need = {1, tonumber(ARGV[5])}
+local caps = {tonumber(ARGV[1]), tonumber(ARGV[3])}
+local rates = {tonumber(ARGV[2]), tonumber(ARGV[4])}
+local levels = {}
+local wait = 0
+for i = 1, 2 do
+  local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local tokens = tonumber(state[1]) or caps[i]
+  local ts = tonumber(state[2]) or now
+  tokens = math.min(caps[i], tokens + math.max(0, now - ts) * rates[i])
+  levels[i] = tokens
+  if tokens < need[i] then
+    wait = math.max(wait, (need[i] - tokens) / rates[i])
+  end
+end
+for i = 1, 2 do
+  local tokens = levels[i]
+  if wait == 0 then tokens = tokens - need[i] end
+  redis.call('HSET', KEYS[i], 'tokens', tokens, 'ts', now)
+  redis.call('EXPIRE', KEYS[i], 120)
+end
+return tostring(wait)
+"""
+
+RETRYABLE = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+             openai.InternalServerError)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class RateLimiter:
+    def __init__(self, rpm, tpm, redis_client=None, prefix="llm_bucket"):
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+        self.redis = redis_client
+        self.keys = [f"{prefix}:rpm", f"{prefix}:tpm"]
+        self._script = redis_client.register_script(_BUCKET_SCRIPT) if redis_client is not None else None
+        self._lock = threading.Lock()
+        self._levels = [self.rpm, self.tpm]
+        self._ts = time.monotonic()
+
+    def _try_local(self, tokens):
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._ts
+            self._ts = now
+            caps = (self.rpm, self.tpm)
+            needs = (1, tokens)
+            wait = 0.0
+            for i in range(2):
+                self._levels[i] = min(caps[i], self._levels[i] + elapsed * caps[i] / 60.0)
+                if self._levels[i] < needs[i]:
+                    wait = max(wait, (needs[i] - self._levels[i]) / (caps[i] / 60.0))
+            if wait == 0:
+                self._levels = [self._levels[0] - 1, self._levels[1] - tokens]
+            return wait
+
+    def try_acquire(self, tokens):
+        """
+        Takes one request and `tokens` tokens if both buckets have room.
+        Returns 0.0 when granted, otherwise the seconds until they would.
+        """
+        tokens = min(float(tokens), self.tpm)
+        if self._script is None:
+            return self._try_local(tokens)
+        try:
+            return float(self._script(keys=self.keys,
+                                      args=[self.rpm, self.rpm / 60.0, self.tpm, self.tpm / 60.0, tokens]))
+        except Exception as e:
+            # A missing limiter must not stop decisions; the API's own 429s still apply
+            logging.error(f"Rate limiter Redis error, not throttling: {e}")
+            return 0.0
+
+    def acquire(self, tokens, deadline=None):
+        while True:
+            wait_for = self.try_acquire(tokens)
+            if wait_for <= 0:
+                return
+            # Jitter so waiting workers do not all retry at the same instant
+            wait_for += random.uniform(0, min(1.0, wait_for))
+            if deadline is not None and time.time() + wait_for > deadline:
+                raise DeadlineExceeded(f"rate limit wait {wait_for:.1f}s exceeds deadline")
+            time.sleep(wait_for)
+
+    def settle(self, estimated, actual):
+        """
+        Returns over-estimated tokens to the TPM bucket (or takes the shortfall).
+        """
+        delta = float(estimated) - float(actual)
+        if not delta:
+            return
+        if self._script is None:
+            with self._lock:
+                self._levels[1] = min(self.tpm, self._levels[1] + delta)
+            return
+        try:
+            self.redis.hincrbyfloat(self.keys[1], "tokens", delta)
+        except Exception as e:
+            logging.warning(f"Failed to settle LLM token usage: {e}")
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """
+    Rough prompt + completion token estimate (~4 characters per token).
+    """
+    chars = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            chars += sum(len(part.get("text", "")) + (800 if part.get("type") == "image_url" else 0)
+                         for part in content)
+    return chars // 4 + (max_tokens or 300)
+
+
+class LLMClient:
+    def __init__(self, client, limiter, max_retries=4, base_backoff=0.5, max_backoff=8.0,
+                 request_timeout=30.0, hedge=True, hedge_min_samples=20, workers=16):
+        self.client = client
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.request_timeout = request_timeout
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+        # submit() runs chat() on _executor; the API calls (primary + hedge) run on
+        # _calls, so a full _executor never waits on calls it has no room to run
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+        self._calls = ThreadPoolExecutor(max_workers=2 * workers, thread_name_prefix="llm-call")
+        self.stats = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+
+    def p95(self):
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _call(self, deadline, estimated, kwargs):
+        timeout = self.request_timeout
+        if deadline is not None:
+            timeout = min(timeout, max(0.1, deadline - time.time()))
+        started = time.time()
+        self._count("requests")
+        response = self.client.with_options(timeout=timeout, max_retries=0).chat.completions.create(**kwargs)
+        with self._lock:
+            self._latencies.append(time.time() - started)
+        usage = getattr(response, "usage", None)
+        if usage is not None and getattr(usage, "total_tokens", None):
+            self.limiter.settle(estimated, usage.total_tokens)
+        return response
+
+    def _attempt(self, deadline, estimated, kwargs):
+        """
+        One attempt, hedged with a second copy if it runs past the recent p95.
+        """
+        self.limiter.acquire(estimated, deadline)
+        p95 = self.p95() if self.hedge else None
+        if p95 is None:
+            return self._call(deadline, estimated, kwargs)
+
+        primary = self._calls.submit(self._call, deadline, estimated, kwargs)
+        done, _ = wait([primary], timeout=p95)
+        if done or (deadline is not None and time.time() + p95 > deadline) \
+                or self.limiter.try_acquire(estimated) > 0:
+            return primary.result()
+
+        self._count("hedges")
+        logging.info(f"LLM request slower than p95 ({p95:.1f}s), sending a hedged copy.")
+        hedge = self._calls.submit(self._call, deadline, estimated, kwargs)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is hedge:
+                    self._count("hedge_wins")
+                return response
+        raise error
+
+    def chat(self, deadline=None, **kwargs):
+        """
+        chat.completions.create(**kwargs) with rate limiting, retries and hedging.
+        `deadline` is an absolute time.time(); raises DeadlineExceeded or the last
+        API error when no answer can be had in time.
+        """
+        estimated = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+        attempt = 0
+        while True:
+            try:
+                return self._attempt(deadline, estimated, kwargs)
+            except RETRYABLE as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    self._count("failures")
+                    raise
+                backoff = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+                retry_after = _retry_after(e)
+                if retry_after:
+                    backoff = max(backoff, retry_after)
+                if deadline is not None and time.time() + backoff > deadline:
+                    self._count("failures")
+                    raise DeadlineExceeded(f"retry {attempt} after {backoff:.1f}s would miss the deadline") from e
+                self._count("retries")
+                logging.warning(f"LLM request failed ({type(e).__name__}), retry {attempt}/{self.max_retries} "
+                                f"in {backoff:.2f}s")
+                time.sleep(backoff)
+
+    def submit(self, deadline=None, **kwargs):
+        """
+        Same as chat() on the client's worker pool; returns a Future.
+        """
+        return self._executor.submit(lambda: self.chat(deadline=deadline, **kwargs))
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def create_llm_client(client):
+    """
+    LLMClient configured from the environment (OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT,
+    LLM_RATE_REDIS_URL or REDIS_URL, LLM_MAX_RETRIES, LLM_TIMEOUT, LLM_HEDGE).
+    """
+    redis_client = None
+    if os.getenv("LLM_SHARED_LIMITS", "1") == "1":
+        try:
+            import redis
+            redis_client = redis.from_url(os.getenv("LLM_RATE_REDIS_URL") or
+                                          os.getenv("REDIS_URL", "redis://localhost:6380/0"))
+        except Exception as e:
+            logging.error(f"Failed to set up rate limit Redis, limits are per process: {e}")
+    limiter = RateLimiter(float(os.getenv("OPENAI_RPM_LIMIT", "500")),
+                          float(os.getenv("OPENAI_TPM_LIMIT", "200000")),
+                          redis_client=redis_client)
+    return LLMClient(client, limiter,
+                     max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+                     request_timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+                     hedge=os.getenv("LLM_HEDGE", "1") == "1",
+                     hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")))
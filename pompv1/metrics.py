@@ -0,0 +1,248 @@
+# File: /pompv1/metrics.py
+
+"""
+Lightweight per-stage latency histograms, counters and gauges shared by the
+listener, image_processor, newcoincheck and the uploaders.
+
+Recording is an in-process dict update under a lock (no I/O on the hot path);
+a background thread pushes the deltas to Redis every METRICS_FLUSH_INTERVAL
+seconds with one pipeline, so every process adds into the same totals.
+image_processor serves them at /metrics in Prometheus text format.
+
+    from metrics import metrics
+    with metrics.timer("render", bundle_id=bundle_id):
+        ...
+    metrics.observe("llm_decision", seconds, bundle_id=bundle_id)
+    metrics.inc("duplicates")
+    metrics.set_gauge("listener_buffer", len(coins_buffer))
+
+Per-bundle stage timings are also kept (metrics:bundle:<id>, METRICS_BUNDLE_TTL)
+for the /metrics/bundle/<bundle_id> route.
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+NAMESPACE = "pomp"
+
+
+def _new_hist():
+    return {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+
+
+class Metrics:
+    def __init__(self, redis_client=None, prefix="metrics", flush_interval=2.0,
+                 bundle_ttl=3600, recent_bundles=500):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self.bundle_ttl = int(bundle_ttl)
+        self.recent_bundles = recent_bundles
+        self._lock = threading.Lock()
+        self._hists = {}
+        self._counters = {}
+        self._gauges = {}
+        self._bundles = {}        # bundle_id -> {stage: seconds}
+        # Totals seen by this process, for rendering without Redis
+        self._local_hists = {}
+        self._local_counters = {}
+        self._flusher = None
+        self._redis_failed = False
+
+    # --- recording -------------------------------------------------------
+
+    def observe(self, stage, seconds, bundle_id=None):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            for hists in (self._hists, self._local_hists):
+                hist = hists.get(stage)
+                if hist is None:
+                    hist = hists[stage] = _new_hist()
+                hist["buckets"][index] += 1
+                hist["sum"] += seconds
+                hist["count"] += 1
+            if bundle_id is not None and self.redis is not None:
+                self._bundles.setdefault(str(bundle_id), {})[stage] = round(seconds, 4)
+        self._ensure_flusher()
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            self._local_counters[name] = self._local_counters.get(name, 0) + value
+        self._ensure_flusher()
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+        self._ensure_flusher()
+
+    @contextmanager
+    def timer(self, stage, bundle_id=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, bundle_id)
+
+    # --- Redis aggregation -----------------------------------------------
+
+    def _ensure_flusher(self):
+        if self.redis is None or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Adds the deltas recorded since the last flush to the Redis totals.
+        """
+        if self.redis is None:
+            return
+        with self._lock:
+            hists, counters, gauges, bundles = self._hists, self._counters, self._gauges, self._bundles
+            self._hists, self._counters, self._gauges, self._bundles = {}, {}, {}, {}
+        if not (hists or counters or gauges or bundles):
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for stage, hist in hists.items():
+                key = f"{self.prefix}:hist:{stage}"
+                for i, n in enumerate(hist["buckets"]):
+                    if n:
+                        pipe.hincrby(key, str(i), n)
+                pipe.hincrbyfloat(key, "sum", hist["sum"])
+                pipe.hincrby(key, "count", hist["count"])
+                pipe.sadd(f"{self.prefix}:stages", stage)
+            for name, value in counters.items():
+                pipe.hincrbyfloat(f"{self.prefix}:counters", name, value)
+            if gauges:
+                pipe.hset(f"{self.prefix}:gauges", mapping=gauges)
+            now = time.time()
+            for bundle_id, stages in bundles.items():
+                key = f"{self.prefix}:bundle:{bundle_id}"
+                pipe.hset(key, mapping=stages)
+                pipe.expire(key, self.bundle_ttl)
+                pipe.zadd(f"{self.prefix}:bundles", {bundle_id: now})
+            if bundles:
+                pipe.zremrangebyrank(f"{self.prefix}:bundles", 0, -self.recent_bundles - 1)
+            pipe.execute()
+            self._redis_failed = False
+        except Exception as e:
+            if not self._redis_failed:
+                logging.warning(f"Failed to push metrics to Redis, keeping them locally: {e}")
+            self._redis_failed = True
+            self._merge_back(hists, counters, gauges)
+
+    def _merge_back(self, hists, counters, gauges):
+        with self._lock:
+            for stage, hist in hists.items():
+                current = self._hists.setdefault(stage, _new_hist())
+                current["buckets"] = [a + b for a, b in zip(current["buckets"], hist["buckets"])]
+                current["sum"] += hist["sum"]
+                current["count"] += hist["count"]
+            for name, value in counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for name, value in gauges.items():
+                self._gauges.setdefault(name, value)
+
+    # --- reading ---------------------------------------------------------
+
+    def snapshot(self):
+        """
+        Returns (hists, counters, gauges) aggregated across processes (from Redis),
+        or this process's own totals when there is no Redis.
+        """
+        if self.redis is None:
+            with self._lock:
+                hists = {s: dict(h, buckets=list(h["buckets"])) for s, h in self._local_hists.items()}
+                return hists, dict(self._local_counters), dict(self._gauges)
+
+        self.flush()
+        stages = sorted(s.decode() if isinstance(s, bytes) else s
+                        for s in self.redis.smembers(f"{self.prefix}:stages"))
+        pipe = self.redis.pipeline(transaction=False)
+        for stage in stages:
+            pipe.hgetall(f"{self.prefix}:hist:{stage}")
+        pipe.hgetall(f"{self.prefix}:counters")
+        pipe.hgetall(f"{self.prefix}:gauges")
+        results = pipe.execute()
+
+        def decoded(raw):
+            return {(k.decode() if isinstance(k, bytes) else k): float(v) for k, v in raw.items()}
+
+        hists = {}
+        for stage, raw in zip(stages, results):
+            fields = decoded(raw)
+            hist = _new_hist()
+            for i in range(len(hist["buckets"])):
+                hist["buckets"][i] = int(fields.get(str(i), 0))
+            hist["sum"] = fields.get("sum", 0.0)
+            hist["count"] = int(fields.get("count", 0))
+            hists[stage] = hist
+        return hists, decoded(results[-2]), decoded(results[-1])
+
+    def bundle_timings(self, bundle_id):
+        if self.redis is None:
+            return {}
+        raw = self.redis.hgetall(f"{self.prefix}:bundle:{bundle_id}")
+        return {(k.decode() if isinstance(k, bytes) else k): float(v) for k, v in raw.items()}
+
+    def render_prometheus(self, extra_gauges=None):
+        """
+        Prometheus text exposition of all stages, counters and gauges.
+        """
+        hists, counters, gauges = self.snapshot()
+        gauges.update(extra_gauges or {})
+        lines = [f"# HELP {NAMESPACE}_stage_seconds Pipeline stage latency.",
+                 f"# TYPE {NAMESPACE}_stage_seconds histogram"]
+        for stage, hist in sorted(hists.items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS, hist["buckets"]):
+                cumulative += n
+                lines.append(f'{NAMESPACE}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{NAMESPACE}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist["count"]}')
+            lines.append(f'{NAMESPACE}_stage_seconds_sum{{stage="{stage}"}} {hist["sum"]:.6f}')
+            lines.append(f'{NAMESPACE}_stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE {NAMESPACE}_{name}_total counter")
+            lines.append(f"{NAMESPACE}_{name}_total {float(value)!r}")
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE {NAMESPACE}_{name} gauge")
+            lines.append(f"{NAMESPACE}_{name} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+
+def create_metrics():
+    """
+    Process-wide Metrics from the environment (METRICS_ENABLED, METRICS_REDIS_URL or REDIS_URL).
+    """
+    redis_client = None
+    if os.getenv("METRICS_ENABLED", "1") == "1":
+        try:
+            import redis
+            redis_client = redis.from_url(os.getenv("METRICS_REDIS_URL") or
+                                          os.getenv("REDIS_URL", "redis://localhost:6380/0"))
+        except Exception as e:
+            logging.error(f"Failed to set up metrics Redis, metrics stay per-process: {e}")
+    return Metrics(redis_client,
+                   flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", "2")),
+                   bundle_ttl=int(os.getenv("METRICS_BUNDLE_TTL", "3600")))
+
+
+metrics = create_metrics()
@@ -2,12 +2,16 @@
 
 import os
 import logging
-from typing import List
+import time
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 from openai import OpenAI
 
 import json
 
+from grid_spec import TOTAL_COINS, coin_ids
+from llm_client import create_llm_client
+
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
@@ -17,132 +21,202 @@ if not openai_api_key:
     logging.error("OPENAI_API_KEY not set.")
     raise EnvironmentError("OPENAI_API_KEY not set.")
 
-client = OpenAI(api_key=openai_api_key)
+# OPENAI_BASE_URL points the client at another OpenAI-compatible server,
+# e.g. the local stand-in (pompv1/openai_standin.py) for load tests
+client = OpenAI(api_key=openai_api_key, base_url=os.getenv("OPENAI_BASE_URL") or None)
+# Retries, shared RPM/TPM limits and hedging around `client`
+llm = create_llm_client(client)
+
+# Model for live decisions; rescore_bundles.py can override it per run
+DECISION_MODEL = os.getenv("DECISION_MODEL", "gpt-4o-mini")
+
+# Total time a decision may take, retries and rate-limit waits included
+DECISION_DEADLINE_SECONDS = float(os.getenv("DECISION_DEADLINE_SECONDS", "45"))
+
+def all_no(coin_count: int = TOTAL_COINS, ids: Optional[List[str]] = None) -> List[dict]:
+    return [{"id": cid, "decision": "no"} for cid in (ids or coin_ids(coin_count))]
 
-def get_decision(bundle_id: str, image_url: str) -> List[dict]:
+def build_system_prompt(coin_count: int = TOTAL_COINS, ids: Optional[List[str]] = None) -> str:
     """
-    Requests OpenAI to provide "yes" or "no" decisions for 8 coins in a bundle based on the provided image URL.
-    
-    Args:
-        bundle_id (str): Unique identifier for the bundle.
-        image_url (str): URL of the bundle grid image containing 8 memecoins.
-    
-    Returns:
-        List[dict]: A list of 8 dictionaries each containing 'id' and 'decision'.
-                    Example:
-                    [
-                        {"id": "01", "decision": "yes"},
-                        {"id": "02", "decision": "no"},
-                        ...
-                        {"id": "08", "decision": "yes"}
-                    ]
+    `ids` are the coin ids drawn in the grid when they are not simply "01".."N"
+    (e.g. a grid holding only the coins missing from the decision cache).
     """
-
-    system_prompt = """
+    if ids is not None and ids == coin_ids(len(ids)):
+        coin_count, ids = len(ids), None
+    if ids is None:
+        ids = coin_ids(coin_count)
+        id_range = f'from "{ids[0]}" to "{ids[-1]}"'
+        id_list = f'IDs "{ids[0]}" through "{ids[-1]}"'
+    else:
+        coin_count = len(ids)
+        id_range = "(" + ", ".join(f'"{cid}"' for cid in ids) + ")"
+        id_list = "IDs " + ", ".join(f'"{cid}"' for cid in ids)
+    example = ",\n".join(
+        f'    {{"id": "{cid}", "decision": "{"yes" if i % 2 == 0 else "no"}"}}' for i, cid in enumerate(ids)
+    )
+    return f"""
 You are a pumpfun memecoin prefilter machine.
-You will be provided with a single image, displaying a grid of 8 memecoins, each in its own rectangle. 
-Each memecoin in the grid has a unique ID from "01" to "08" displayed within its rectangle, aswell as a name, description, and most importantly, a profilepicture aka an icon.
+You will be provided with a single image, displaying a grid of {coin_count} memecoins, each in its own rectangle. 
+Each memecoin in the grid has a unique ID {id_range} displayed within its rectangle, aswell as a name, description, and most importantly, a profilepicture aka an icon.
 
 Your task is to analyze each memecoin in the image and decide whether it is a coin worty to look into, by answering with either ("yes") or ("no") for each unique id.
 Its important that you only let memecoins through that you think are extremly hilarious/ridicules and or very intruiging, almost every coin you will encounter is bad, so dont be fooled!, each of your "yes" decisions will cost me money, so be alert and sparse, your Goal is to find the truly truly good ones!
 Please respond strictly in valid JSON format as seen in this example:
 
-{
+{{
   "decisions": [
-    {"id": "01", "decision": "yes"},
-    {"id": "02", "decision": "no"},
-    {"id": "03", "decision": "yes"},
-    {"id": "04", "decision": "no"},
-    {"id": "05", "decision": "yes"},
-    {"id": "06", "decision": "no"},
-    {"id": "07", "decision": "yes"},
-    {"id": "08", "decision": "no"}
+{example}
   ]
-}
+}}
 
 Ensure that:
-1. All 8 coins are included with IDs "01" through "08".
+1. All {coin_count} coins are included with {id_list}.
 2. The decisions are either "yes" or "no" based on your evaluation.
 3. The output is valid JSON. The string "JSON" appears in these instructions to enforce JSON mode.
 
 If you encounter any refusal or cannot determine the decision for a specific coin, mark that coin's decision as "no" without affecting the decisions of other coins.
 """
 
-    user_prompt = f"Here is the grid image URL: {image_url}.\nPlease output 8 decisions in valid JSON.THIS IS A TESTRUN, PLEASE CHOOSE AT LEAST ONE AS YES AS YOUR DECISION, REGARDLES OF WHAT YOU SEE IN THE IMAGE!"
-
-    try:
-        logging.info(f"Sending decision request for bundle {bundle_id} to OpenAI (JSON mode)...")
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Replace with your specific model if different
-            messages=[
-                {"role": "system", "content": system_prompt.strip()},
-                {"role": "user", "content": user_prompt.strip()}
-            ],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
-
-        choice = response.choices[0]
-
-        # Handle model refusal
-        if hasattr(choice.message, "refusal") and choice.message.refusal:
-            logging.warning("Model refused the request. Interpreting all coins as 'no'.")
-            return [{"id": f"{i+1:02d}", "decision": "no"} for i in range(8)]
-
-        # Handle incomplete generation due to length or content filtering
-        if choice.finish_reason in ["length", "content_filter"]:
-            logging.warning(f"finish_reason={choice.finish_reason}, interpreting all coins as 'no'.")
-            return [{"id": f"{i+1:02d}", "decision": "no"} for i in range(8)]
-
-        # Extract and parse JSON content
-        raw_json = choice.message.content
-        if not raw_json:
-            logging.warning("No content returned. Interpreting all coins as 'no'.")
-            return [{"id": f"{i+1:02d}", "decision": "no"} for i in range(8)]
-
-        parsed = json.loads(raw_json)
-        decisions_list = parsed.get("decisions", [])
-
-        # Initialize final decisions with "no" for all coins
-        final_decisions = {f"{i+1:02d}": "no" for i in range(8)}
-
-        for coin_dec in decisions_list:
-            coin_id_raw = coin_dec.get("id")
-            decision = coin_dec.get("decision")
-
-            # Convert '1'..'8' to '01'..'08'
-            try:
-                i = int(coin_id_raw)  # e.g., "1" or "01" -> 1
-                if 1 <= i <= 8:
-                    coin_id = f"{i:02d}"  # Ensure zero-padding
-                else:
-                    logging.warning(f"coin_id={coin_id_raw} out of range (1-8). Ignoring.")
-                    continue
-            except (TypeError, ValueError):
-                # Non-integer ID; ignore and leave as "no"
-                logging.warning(f"coin_id={coin_id_raw} is not a valid integer. Ignoring.")
+def parse_decisions(raw_json: str, coin_count: int = TOTAL_COINS, ids: Optional[List[str]] = None) -> List[dict]:
+    """
+    Validates the model's JSON answer. Unknown, out-of-range or invalid entries stay "no".
+    Raises json.JSONDecodeError on malformed JSON.
+    """
+    parsed = json.loads(raw_json)
+    decisions_list = parsed.get("decisions", [])
+
+    # Initialize final decisions with "no" for all coins
+    final_decisions = {cid: "no" for cid in (ids or coin_ids(coin_count))}
+    if ids:
+        coin_count = max(int(cid) for cid in ids)
+
+    for coin_dec in decisions_list:
+        coin_id_raw = coin_dec.get("id")
+        decision = coin_dec.get("decision")
+
+        # Convert '1'..'N' to '01'..'N'
+        try:
+            i = int(coin_id_raw)  # e.g., "1" or "01" -> 1
+            if 1 <= i <= coin_count:
+                coin_id = f"{i:02d}"  # Ensure zero-padding
+            else:
+                logging.warning(f"coin_id={coin_id_raw} out of range (1-{coin_count}). Ignoring.")
                 continue
+        except (TypeError, ValueError):
+            # Non-integer ID; ignore and leave as "no"
+            logging.warning(f"coin_id={coin_id_raw} is not a valid integer. Ignoring.")
+            continue
+
+        if coin_id not in final_decisions:
+            logging.warning(f"coin_id={coin_id_raw} was not asked for. Ignoring.")
+            continue
+
+        # Validate decision
+        if decision in ["yes", "no"]:
+            final_decisions[coin_id] = decision
+            logging.info(f"Set decision for coin_id={coin_id}: {decision}")
+        else:
+            logging.warning(f"Invalid decision '{decision}' for coin_id={coin_id_raw}. Keeping as 'no'.")
+
+    # Prepare the final sorted list of decisions
+    return [
+        {"id": cid, "decision": final_decisions[cid]}
+        for cid in sorted(final_decisions.keys())
+    ]
+
+def get_decision(bundle_id: str, image_url: str, coin_count: int = TOTAL_COINS) -> List[dict]:
+    """
+    Requests OpenAI to provide "yes" or "no" decisions for the coins in a bundle based on the provided image URL.
+    
+    Args:
+        bundle_id (str): Unique identifier for the bundle.
+        image_url (str): URL of the bundle grid image.
+        coin_count (int): Number of coins in the grid (defaults to the grid spec's TOTAL_COINS).
+    
+    Returns:
+        List[dict]: A list of `coin_count` dictionaries each containing 'id' and 'decision'.
+                    Example:
+                    [
+                        {"id": "01", "decision": "yes"},
+                        {"id": "02", "decision": "no"},
+                        ...
+                        {"id": "08", "decision": "yes"}
+                    ]
+    """
+    decisions, _ = request_decisions(bundle_id, image_url, coin_ids(coin_count))
+    return decisions
 
-            # Validate decision
-            if decision in ["yes", "no"]:
-                final_decisions[coin_id] = decision
-                logging.info(f"Set decision for coin_id={coin_id}: {decision}")
-            else:
-                logging.warning(f"Invalid decision '{decision}' for coin_id={coin_id_raw}. Keeping as 'no'.")
+def build_decision_request(image_url: str, ids: List[str], model: str = DECISION_MODEL) -> dict:
+    """
+    chat.completions.create() arguments for a grid showing the coins `ids`.
+    Also used as the request body of Batch API lines (rescore_bundles.py).
+    """
+    coin_count = len(ids)
+    system_prompt = build_system_prompt(coin_count, ids)
+
+    user_prompt = f"Here is the grid image URL: {image_url}.\nPlease output {coin_count} decisions in valid JSON.THIS IS A TESTRUN, PLEASE CHOOSE AT LEAST ONE AS YES AS YOUR DECISION, REGARDLES OF WHAT YOU SEE IN THE IMAGE!"
+
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt.strip()},
+            {"role": "user", "content": user_prompt.strip()}
+        ],
+        "temperature": 0.3,
+        "response_format": {"type": "json_object"}
+    }
+
+def decisions_from_choice(content: Optional[str], refusal: Optional[str], finish_reason: Optional[str],
+                          ids: List[str]) -> Tuple[List[dict], bool]:
+    """
+    Turns one completion choice into (decisions, answered). Refusals, truncated or
+    filtered answers, malformed JSON and JSON that is not {"decisions": [{...}, ...]}
+    give the all-"no" fallback with answered=False.
+    """
+    # Handle model refusal
+    if refusal:
+        logging.warning("Model refused the request. Interpreting all coins as 'no'.")
+        return all_no(ids=ids), False
 
-        # Prepare the final sorted list of decisions
-        results = [
-            {"id": cid, "decision": final_decisions[cid]}
-            for cid in sorted(final_decisions.keys())
-        ]
+    # Handle incomplete generation due to length or content filtering
+    if finish_reason in ["length", "content_filter"]:
+        logging.warning(f"finish_reason={finish_reason}, interpreting all coins as 'no'.")
+        return all_no(ids=ids), False
 
-        logging.info(f"Final decisions for bundle {bundle_id}: {results}")
-        return results
+    if not content:
+        logging.warning("No content returned. Interpreting all coins as 'no'.")
+        return all_no(ids=ids), False
 
+    try:
+        return parse_decisions(content, len(ids), ids), True
     except json.JSONDecodeError as jde:
         logging.error(f"JSON decoding error: {jde}. Interpreting all coins as 'no'.")
-        return [{"id": f"{i+1:02d}", "decision": "no"} for i in range(8)]
+        return all_no(ids=ids), False
+    except (AttributeError, TypeError, ValueError) as e:
+        logging.error(f"Unexpected decisions JSON shape ({e}): {content[:200]!r}. Interpreting all coins as 'no'.")
+        return all_no(ids=ids), False
+
+def request_decisions(bundle_id: str, image_url: str, ids: List[str]) -> Tuple[List[dict], bool]:
+    """
+    Like get_decision() for a grid showing the coins `ids`. Returns (decisions, answered):
+    `answered` is False when the decisions are the all-"no" fallback for a refusal,
+    truncated or malformed answer or an API error, so callers know not to cache them.
+    """
+    try:
+        logging.info(f"Sending decision request for bundle {bundle_id} to OpenAI (JSON mode)...")
+        response = llm.chat(
+            deadline=time.time() + DECISION_DEADLINE_SECONDS,
+            **build_decision_request(image_url, ids)
+        )
+
+        choice = response.choices[0]
+        results, answered = decisions_from_choice(choice.message.content,
+                                                  getattr(choice.message, "refusal", None),
+                                                  choice.finish_reason, ids)
+        if answered:
+            logging.info(f"Final decisions for bundle {bundle_id}: {results}")
+        return results, answered
+
     except Exception as e:
         logging.error(f"Error while communicating with OpenAI or parsing JSON: {e}", exc_info=True)
-        return [{"id": f"{i+1:02d}", "decision": "no"} for i in range(8)]
-
+        return all_no(ids=ids), False
@@ -0,0 +1,412 @@
+# File: /pompv1/openai_standin.py
+
+"""
+Local stand-in for the parts of the OpenAI API the pipeline uses, so the
+decider, the Lens / final decision checks and the batch re-scoring can be
+exercised and load-tested without an account, network access or cost:
+
+    POST /v1/chat/completions       JSON-mode answers for the three prompts we send
+    GET  /stats                     request outcomes and injected latency percentiles
+    POST /v1/files                  multipart upload (purpose=batch)
+    GET  /v1/files/<id>             file object
+    GET  /v1/files/<id>/content     file bytes
+    POST /v1/batches                create a batch from an uploaded JSONL file
+    GET  /v1/batches/<id>           status; completes --batch-seconds after creation
+    POST /v1/batches/<id>/cancel
+
+The answer is picked from the system prompt: the bundle decider gets a
+decision for every coin id it names ("yes" with probability --yes-rate), the
+Lens check gets --lens-answer, the final decision --final-answer and the
+combined Lens + Twitter check both.
+
+Chat completions can be made to misbehave like the real API:
+    --latency SPEC          fixed:0.8 | uniform:0.5,2 | normal:1,0.3 | lognormal:1.2,0.5 (median, sigma)
+    --tail P:SECONDS        extra delay for a share P of requests (e.g. 0.02:8)
+    --error-rate P          500 server errors
+    --rate-limit-rate P     429s with a Retry-After header
+    --refusal-rate P        message.refusal set, no content
+    --length-rate P         finish_reason=length with truncated JSON
+    --script FILE           JSON list (or JSONL) of responses served in order before
+                            the random behaviour applies; each entry may set
+                            latency, status, refusal, finish_reason, decisions
+                            ({"01": "yes"}, unlisted ids are "no"), answer, lens/final
+                            (combined check) or raw content
+
+Batch lines get the same answers without latency; --error-rate sends that share
+of lines to the error file instead (seeded by custom_id so reruns agree).
+
+Usage:
+    python openai_standin.py --port 8095 --latency lognormal:1.5,0.6 --tail 0.02:10 --rate-limit-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8095/v1 python image_processor.py
+    OPENAI_BASE_URL=http://127.0.0.1:8095/v1 python rescore_bundles.py --limit 50 --poll-interval 1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import re
+import time
+import uuid
+from collections import deque
+
+from aiohttp import web
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+
+def prompt_coin_ids(messages):
+    """
+    Coin ids the decision prompt asks for ('IDs "01" through "08"' or an explicit list).
+    """
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    match = re.search(r'included with IDs (.*)\.', system)
+    if not match:
+        return []
+    ids = re.findall(r'"(\d+)"', match.group(1))
+    if " through " in match.group(1) and len(ids) == 2:
+        return [f"{i:02d}" for i in range(int(ids[0]), int(ids[1]) + 1)]
+    return ids
+
+
+def prompt_kind(messages):
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "").lower()
+    if "memecoin prefilter" in system:
+        return "decider"
+    if "google lens" in system and "twitter" in system:
+        return "combined"
+    if "google lens" in system:
+        return "lens"
+    if "twitter" in system:
+        return "final"
+    return "other"
+
+
+def parse_latency(spec):
+    """
+    Latency spec -> function(rng) returning seconds (never negative).
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        # median, sigma of the underlying normal
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def parse_tail(spec):
+    share, _, seconds = spec.partition(":")
+    return float(share), float(seconds or 0)
+
+
+def load_script(path):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class StandinServer:
+    def __init__(self, host="127.0.0.1", port=8095, batch_seconds=3.0, yes_rate=0.1, error_rate=0.0,
+                 latency="fixed:0", tail=None, rate_limit_rate=0.0, refusal_rate=0.0, length_rate=0.0,
+                 lens_answer="unique", final_answer="buy", script=None, seed=None):
+        """
+        Args:
+            latency (str): Latency spec for chat completions (see parse_latency).
+            tail (str): "P:SECONDS" extra delay for a share P of chat completions.
+            script (list): Responses served in order before the random behaviour applies.
+        """
+        self.host = host
+        self.port = port
+        self.batch_seconds = batch_seconds
+        self.yes_rate = yes_rate
+        self.error_rate = error_rate
+        self.latency = parse_latency(latency)
+        self.tail = parse_tail(tail) if tail else (0.0, 0.0)
+        self.rate_limit_rate = rate_limit_rate
+        self.refusal_rate = refusal_rate
+        self.length_rate = length_rate
+        self.lens_answer = lens_answer
+        self.final_answer = final_answer
+        self.script = list(script or [])
+        self.rng = random.Random(seed)
+        self.files = {}      # id -> {"meta": {...}, "content": bytes}
+        self.batches = {}    # id -> batch object
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "refusals": 0,
+                      "truncated": 0, "scripted": 0}
+        self.latencies = deque(maxlen=10000)
+
+    def answer_content(self, body, rng, step=None):
+        """
+        JSON answer for a chat completion request body, from the script step if it has one.
+        """
+        step = step or {}
+        if "content" in step:
+            return step["content"]
+        messages = body.get("messages") or []
+        kind = prompt_kind(messages)
+        if kind == "decider":
+            scripted = step.get("decisions")
+            decisions = [{"id": cid, "decision": (scripted.get(cid, "no") if scripted is not None
+                                                  else "yes" if rng.random() < self.yes_rate else "no")}
+                         for cid in prompt_coin_ids(messages)]
+            return json.dumps({"decisions": decisions})
+        if kind == "combined":
+            return json.dumps({"lens": step.get("lens", self.lens_answer),
+                               "final": step.get("final", self.final_answer)})
+        if kind in ("lens", "final"):
+            default = self.lens_answer if kind == "lens" else self.final_answer
+            return json.dumps({"answer": step.get("answer", default)})
+        return json.dumps(step.get("json", {}))
+
+    # --- chat completions ------------------------------------------------
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        step = self.script.pop(0) if self.script else None
+        self.stats["requests"] += 1
+        if step is not None:
+            self.stats["scripted"] += 1
+        rng = self.rng
+
+        if step is not None and "latency" in step:
+            delay = float(step["latency"])
+        else:
+            delay = self.latency(rng)
+            if rng.random() < self.tail[0]:
+                delay += self.tail[1]
+        self.latencies.append(delay)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        status = (step or {}).get("status")
+        if status is None and step is None:
+            roll = rng.random()
+            if roll < self.rate_limit_rate:
+                status = 429
+            elif roll < self.rate_limit_rate + self.error_rate:
+                status = 500
+        if status == 429:
+            self.stats["rate_limited"] += 1
+            return web.json_response({"error": {"message": "Rate limit reached for requests (stand-in).",
+                                                "type": "requests", "code": "rate_limit_exceeded"}},
+                                     status=429, headers={"retry-after": "1"})
+        if status and status >= 400:
+            self.stats["errors"] += 1
+            return web.json_response({"error": {"message": "The server had an error while processing "
+                                                           "your request (stand-in).",
+                                                "type": "server_error"}}, status=status)
+
+        model = body.get("model")
+        if (step or {}).get("refusal") or (step is None and rng.random() < self.refusal_rate):
+            self.stats["refusals"] += 1
+            refusal = step["refusal"] if step and isinstance(step.get("refusal"), str) \
+                else "I'm sorry, I can't help with that."
+            return web.json_response(chat_completion(model, None, refusal=refusal))
+
+        content = self.answer_content(body, rng, step)
+        finish_reason = (step or {}).get("finish_reason")
+        if finish_reason is None and step is None and rng.random() < self.length_rate:
+            finish_reason = "length"
+        if finish_reason == "length":
+            self.stats["truncated"] += 1
+            content = content[:max(1, len(content) // 2)]
+        else:
+            self.stats["ok"] += 1
+        return web.json_response(chat_completion(model, content, finish_reason=finish_reason or "stop"))
+
+    async def get_stats(self, request):
+        latencies = list(self.latencies)
+        return web.json_response(dict(self.stats, script_remaining=len(self.script), latency={
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0,
+        }))
+
+    # --- files -----------------------------------------------------------
+
+    def _store_file(self, filename, content, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        self.files[file_id] = {
+            "meta": {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                     "filename": filename, "purpose": purpose, "status": "processed"},
+            "content": content,
+        }
+        return self.files[file_id]["meta"]
+
+    async def create_file(self, request):
+        reader = await request.multipart()
+        content, filename, purpose = b"", "upload.jsonl", "batch"
+        async for part in reader:
+            if part.name == "file":
+                filename = part.filename or filename
+                content = await part.read()
+            elif part.name == "purpose":
+                purpose = (await part.text()).strip()
+        return web.json_response(self._store_file(filename, content, purpose))
+
+    async def get_file(self, request):
+        entry = self.files.get(request.match_info["file_id"])
+        if entry is None:
+            return web.json_response({"error": {"message": "No such file", "type": "invalid_request_error"}},
+                                     status=404)
+        return web.json_response(entry["meta"])
+
+    async def file_content(self, request):
+        entry = self.files.get(request.match_info["file_id"])
+        if entry is None:
+            return web.json_response({"error": {"message": "No such file", "type": "invalid_request_error"}},
+                                     status=404)
+        return web.Response(body=entry["content"], content_type="application/octet-stream")
+
+    # --- batches ---------------------------------------------------------
+
+    async def create_batch(self, request):
+        params = await request.json()
+        entry = self.files.get(params.get("input_file_id"))
+        if entry is None:
+            return web.json_response({"error": {"message": "input_file_id not found",
+                                                "type": "invalid_request_error"}}, status=400)
+        lines = [line for line in entry["content"].decode("utf-8").splitlines() if line.strip()]
+        now = int(time.time())
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        self.batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": params.get("endpoint"), "errors": None,
+            "input_file_id": params["input_file_id"], "completion_window": params.get("completion_window", "24h"),
+            "status": "in_progress", "output_file_id": None, "error_file_id": None,
+            "created_at": now, "in_progress_at": now, "expires_at": now + 86400,
+            "finalizing_at": None, "completed_at": None, "failed_at": None, "expired_at": None,
+            "cancelling_at": None, "cancelled_at": None,
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+            "metadata": params.get("metadata"),
+            "_lines": lines,
+        }
+        logging.info(f"Batch {batch_id} created with {len(lines)} requests.")
+        return web.json_response(self._public(self.batches[batch_id]))
+
+    def _public(self, batch):
+        return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+    def _complete(self, batch):
+        outputs, errors = [], []
+        for raw in batch["_lines"]:
+            line = json.loads(raw)
+            rng = random.Random(line["custom_id"])
+            request_id = f"req_{uuid.uuid4().hex[:16]}"
+            if rng.random() < self.error_rate:
+                errors.append({"id": f"batch_req_{uuid.uuid4().hex[:16]}", "custom_id": line["custom_id"],
+                               "response": {"status_code": 500, "request_id": request_id,
+                                            "body": {"error": {"message": "The server had an error.",
+                                                               "type": "server_error"}}},
+                               "error": None})
+                continue
+            body = line.get("body") or {}
+            outputs.append({"id": f"batch_req_{uuid.uuid4().hex[:16]}", "custom_id": line["custom_id"],
+                            "response": {"status_code": 200, "request_id": request_id,
+                                         "body": chat_completion(body.get("model"),
+                                                                 self.answer_content(body, rng))},
+                            "error": None})
+        now = int(time.time())
+        if outputs:
+            batch["output_file_id"] = self._store_file(f"{batch['id']}_output.jsonl", to_jsonl(outputs),
+                                                       "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = self._store_file(f"{batch['id']}_error.jsonl", to_jsonl(errors),
+                                                      "batch_output")["id"]
+        batch.update(status="completed", finalizing_at=now, completed_at=now,
+                     request_counts={"total": len(batch["_lines"]), "completed": len(outputs),
+                                     "failed": len(errors)})
+        logging.info(f"Batch {batch['id']} completed: {len(outputs)} ok, {len(errors)} failed.")
+
+    async def get_batch(self, request):
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"error": {"message": "No such batch", "type": "invalid_request_error"}},
+                                     status=404)
+        if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= self.batch_seconds:
+            self._complete(batch)
+        return web.json_response(self._public(batch))
+
+    async def cancel_batch(self, request):
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"error": {"message": "No such batch", "type": "invalid_request_error"}},
+                                     status=404)
+        if batch["status"] == "in_progress":
+            now = int(time.time())
+            batch.update(status="cancelled", cancelling_at=now, cancelled_at=now)
+        return web.json_response(self._public(batch))
+
+    def run(self):
+        app = web.Application(client_max_size=200 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_get("/stats", self.get_stats)
+        app.router.add_post("/v1/files", self.create_file)
+        app.router.add_get("/v1/files/{file_id}", self.get_file)
+        app.router.add_get("/v1/files/{file_id}/content", self.file_content)
+        app.router.add_post("/v1/batches", self.create_batch)
+        app.router.add_get("/v1/batches/{batch_id}", self.get_batch)
+        app.router.add_post("/v1/batches/{batch_id}/cancel", self.cancel_batch)
+        logging.info(f"OpenAI stand-in on http://{self.host}:{self.port}/v1")
+        web.run_app(app, host=self.host, port=self.port, print=None)
+
+
+def chat_completion(model, content, finish_reason="stop", refusal=None):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "object": "chat.completion", "created": int(time.time()),
+        "model": model or "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": finish_reason, "logprobs": None,
+                     "message": {"role": "assistant", "content": content, "refusal": refusal}}],
+        "usage": {"prompt_tokens": 500, "completion_tokens": 120, "total_tokens": 620},
+    }
+
+
+def to_jsonl(rows):
+    return ("\n".join(json.dumps(row) for row in rows) + "\n").encode("utf-8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat completions and batch API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8095)
+    parser.add_argument("--batch-seconds", type=float, default=3.0, help="Time until a batch completes")
+    parser.add_argument("--yes-rate", type=float, default=0.1, help="Share of coins answered 'yes'")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument("--refusal-rate", type=float, default=0.0, help="Share of answers that are refusals")
+    parser.add_argument("--length-rate", type=float, default=0.0, help="Share of answers cut off (finish_reason=length)")
+    parser.add_argument("--latency", default="fixed:0", help="fixed:S | uniform:A,B | normal:MEAN,SD | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--tail", help="P:SECONDS extra delay for a share P of requests")
+    parser.add_argument("--lens-answer", default="unique", choices=["copy", "unique"])
+    parser.add_argument("--final-answer", default="buy", choices=["pass", "buy"])
+    parser.add_argument("--script", help="JSON list / JSONL of scripted responses served first")
+    parser.add_argument("--seed", type=int, help="Seed for the random behaviour")
+    args = parser.parse_args()
+
+    StandinServer(host=args.host, port=args.port, batch_seconds=args.batch_seconds,
+                  yes_rate=args.yes_rate, error_rate=args.error_rate,
+                  latency=args.latency, tail=args.tail, rate_limit_rate=args.rate_limit_rate,
+                  refusal_rate=args.refusal_rate, length_rate=args.length_rate,
+                  lens_answer=args.lens_answer, final_answer=args.final_answer,
+                  script=load_script(args.script) if args.script else None, seed=args.seed).run()
@@ -0,0 +1,325 @@
+# File: /pompv1/prefilter.py
+
+"""
+Cheap CPU pre-filter that rejects obviously uninteresting coins before they
+take a tile in a bundle (and LLM tokens).
+
+A logistic regression over features the listener already has: name and
+description text (lengths, shape, hashed words), twitter/website presence and
+simple icon statistics (brightness, contrast, saturation, colour count, edge
+density). Scoring is a dot product over ~90 numbers, well under a millisecond.
+
+The model is a small JSON file (feature names, standardisation, weights and the
+rejection threshold) trained from historical goodcoins.quality labels:
+
+    python prefilter.py train --out prefilter_model.json --positive buy --target-recall 0.95
+    python prefilter.py train --out prefilter_model.json --icons      # also learn from icon stats
+
+Coins that reached goodcoins with a positive quality are positives; goodcoins
+with any other quality and coins that never became goodcoins are negatives.
+The threshold is picked on a held-out split so that `target_recall` of the
+positives still pass.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import time
+import zlib
+
+TEXT_FEATURES = [
+    "name_len", "name_words", "name_caps", "name_digits", "name_non_ascii",
+    "symbol_len", "symbol_upper", "symbol_in_name",
+    "has_description", "desc_len", "desc_words", "desc_has_url", "desc_exclaims",
+    "has_twitter", "twitter_is_post", "has_website",
+]
+ICON_FEATURES = [
+    "has_icon", "icon_brightness", "icon_contrast", "icon_saturation", "icon_colors", "icon_edges",
+]
+HASH_BUCKETS = 64
+WORD_FEATURES = [f"word_{i}" for i in range(HASH_BUCKETS)]
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_URL_RE = re.compile(r"https?://|www\.|\.com\b|t\.me/", re.IGNORECASE)
+
+
+def _ratio(count, total):
+    return count / total if total else 0.0
+
+
+def text_features(coin):
+    name = (coin.get("metadata_name") or "").strip()
+    symbol = (coin.get("metadata_symbol") or "").strip()
+    description = (coin.get("metadata_description") or "").strip()
+    twitter = (coin.get("twitter") or "").strip()
+    letters = [ch for ch in name if ch.isalpha()]
+    features = {
+        "name_len": min(len(name), 40) / 40.0,
+        "name_words": min(len(name.split()), 8) / 8.0,
+        "name_caps": _ratio(sum(1 for ch in letters if ch.isupper()), len(letters)),
+        "name_digits": 1.0 if any(ch.isdigit() for ch in name) else 0.0,
+        "name_non_ascii": _ratio(sum(1 for ch in name if ord(ch) > 127), len(name)),
+        "symbol_len": min(len(symbol), 12) / 12.0,
+        "symbol_upper": 1.0 if symbol and symbol == symbol.upper() else 0.0,
+        "symbol_in_name": 1.0 if symbol and symbol.casefold() in name.casefold().replace(" ", "") else 0.0,
+        "has_description": 1.0 if description else 0.0,
+        "desc_len": math.log1p(len(description)) / math.log1p(1000),
+        "desc_words": math.log1p(len(description.split())) / math.log1p(200),
+        "desc_has_url": 1.0 if _URL_RE.search(description) else 0.0,
+        "desc_exclaims": min(description.count("!"), 5) / 5.0,
+        "has_twitter": 1.0 if twitter else 0.0,
+        "twitter_is_post": 1.0 if "/status/" in twitter else 0.0,
+        "has_website": 1.0 if (coin.get("website") or "").strip() else 0.0,
+    }
+    for word in set(_WORD_RE.findall(f"{name} {symbol} {description}".casefold())):
+        features[f"word_{zlib.crc32(word.encode('utf-8')) % HASH_BUCKETS}"] = 1.0
+    return features
+
+
+def icon_features(icon):
+    """
+    Statistics of a PIL icon (None = no icon): brightness, contrast, saturation,
+    distinct colour share and edge density, all in 0..1.
+    """
+    if icon is None:
+        return {"has_icon": 0.0}
+    from PIL import ImageFilter, ImageStat
+    from PIL.Image import Resampling
+
+    small = icon.convert("RGB").resize((32, 32), Resampling.BILINEAR)
+    gray = small.convert("L")
+    stat = ImageStat.Stat(gray)
+    quantized = small.quantize(colors=64)
+    return {
+        "has_icon": 1.0,
+        "icon_brightness": stat.mean[0] / 255.0,
+        "icon_contrast": stat.stddev[0] / 128.0,
+        "icon_saturation": ImageStat.Stat(small.convert("HSV")).mean[1] / 255.0,
+        "icon_colors": len(quantized.getcolors(64) or []) / 64.0,
+        "icon_edges": ImageStat.Stat(gray.filter(ImageFilter.FIND_EDGES)).mean[0] / 255.0,
+    }
+
+
+def coin_features(coin, icon=None, with_icon=True):
+    features = text_features(coin)
+    if with_icon:
+        features.update(icon_features(icon))
+    return features
+
+
+def _sigmoid(z):
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+class PrefilterModel:
+    def __init__(self, features, mean, std, weights, bias, threshold, info=None):
+        self.features = features
+        self.mean = mean
+        self.std = std
+        self.weights = weights
+        self.bias = bias
+        self.threshold = threshold
+        self.info = info or {}
+        self.uses_icon = any(f in ICON_FEATURES for f in features)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["features"], data["mean"], data["std"], data["weights"], data["bias"],
+                   data["threshold"], data.get("info"))
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"features": self.features, "mean": self.mean, "std": self.std,
+                       "weights": self.weights, "bias": self.bias, "threshold": self.threshold,
+                       "info": self.info}, f, indent=1)
+
+    def _vector(self, features):
+        return [(features.get(name, 0.0) - m) / s for name, m, s in zip(self.features, self.mean, self.std)]
+
+    def score_features(self, features):
+        x = self._vector(features)
+        return _sigmoid(self.bias + sum(w * v for w, v in zip(self.weights, x)))
+
+    def score(self, coin, icon=None):
+        """
+        Probability-like score in 0..1 that the coin is worth an LLM look.
+        """
+        return self.score_features(coin_features(coin, icon, with_icon=self.uses_icon))
+
+    def passes(self, coin, icon=None):
+        return self.score(coin, icon) >= self.threshold
+
+
+def train_model(samples, labels, epochs=300, learning_rate=0.5, l2=1e-3, target_recall=0.95,
+                holdout=0.2, seed=0):
+    """
+    Fits a class-weighted logistic regression on feature dicts with full-batch
+    gradient descent. Returns a PrefilterModel whose threshold keeps
+    `target_recall` of the held-out positives.
+    """
+    names = sorted({name for sample in samples for name in sample})
+    rows = [[sample.get(name, 0.0) for name in names] for sample in samples]
+    order = list(range(len(rows)))
+    random.Random(seed).shuffle(order)
+    n_holdout = int(len(order) * holdout)
+    test_idx, train_idx = order[:n_holdout], order[n_holdout:]
+
+    mean = [sum(rows[i][j] for i in train_idx) / len(train_idx) for j in range(len(names))]
+    std = []
+    for j in range(len(names)):
+        var = sum((rows[i][j] - mean[j]) ** 2 for i in train_idx) / len(train_idx)
+        std.append(math.sqrt(var) or 1.0)
+    x = [[(v - m) / s for v, m, s in zip(row, mean, std)] for row in rows]
+
+    positives = sum(labels[i] for i in train_idx)
+    negatives = len(train_idx) - positives
+    if not positives or not negatives:
+        raise ValueError(f"Need both classes to train ({positives} positives, {negatives} negatives)")
+    # Balance the classes so the rare positives are not drowned out
+    class_weight = {1: len(train_idx) / (2.0 * positives), 0: len(train_idx) / (2.0 * negatives)}
+
+    weights = [0.0] * len(names)
+    bias = 0.0
+    for epoch in range(epochs):
+        grad = [0.0] * len(names)
+        grad_bias = 0.0
+        for i in train_idx:
+            row = x[i]
+            error = (_sigmoid(bias + sum(w * v for w, v in zip(weights, row))) - labels[i]) * class_weight[labels[i]]
+            grad_bias += error
+            for j, v in enumerate(row):
+                if v:
+                    grad[j] += error * v
+        n = len(train_idx)
+        weights = [w - learning_rate * (g / n + l2 * w) for w, g in zip(weights, grad)]
+        bias -= learning_rate * grad_bias / n
+
+    model = PrefilterModel(names, mean, std, weights, bias, 0.0)
+    # Threshold from held-out positives when there are enough of them
+    eval_idx = test_idx if sum(labels[i] for i in test_idx) >= 5 else train_idx
+    scores = [(model.score_features(samples[i]), labels[i]) for i in eval_idx]
+    pos_scores = sorted(s for s, label in scores if label)
+    neg_scores = [s for s, label in scores if not label]
+    model.threshold = pos_scores[int((1.0 - target_recall) * len(pos_scores))]
+    recall = sum(1 for s in pos_scores if s >= model.threshold) / len(pos_scores)
+    rejected = sum(1 for s in neg_scores if s < model.threshold) / len(neg_scores) if neg_scores else 0.0
+    model.info = {
+        "trained_at": int(time.time()),
+        "samples": len(samples),
+        "positives": sum(labels),
+        "evaluated_on": "holdout" if eval_idx is test_idx else "train",
+        "recall": round(recall, 4),
+        "negatives_rejected": round(rejected, 4),
+    }
+    return model
+
+
+# --- training data from Supabase -----------------------------------------
+
+COIN_COLUMNS = ("id, metadata_name, metadata_symbol, metadata_description, twitter, website, "
+                "metadata_image_official")
+PAGE_SIZE = 1000
+
+
+def fetch_labelled_coins(supabase, positive_qualities, limit, negatives_per_positive):
+    """
+    Returns [(coin_row, label)]: goodcoins rows labelled by quality, plus coins
+    that never became goodcoins (the LLM said no) as extra negatives.
+    """
+    labelled = {}
+    start = 0
+    while len(labelled) < limit:
+        page = supabase.table('goodcoins') \
+            .select(f"quality, coins!inner({COIN_COLUMNS})") \
+            .not_.is_("quality", "null") \
+            .order("id", desc=True) \
+            .range(start, start + PAGE_SIZE - 1).execute().data or []
+        for row in page:
+            coin = row.get("coins")
+            if coin:
+                labelled[coin["id"]] = (coin, 1 if row["quality"] in positive_qualities else 0)
+        if len(page) < PAGE_SIZE:
+            break
+        start += PAGE_SIZE
+
+    positives = sum(label for _, label in labelled.values())
+    wanted = max(positives * negatives_per_positive, 100)
+    start = 0
+    extra = 0
+    while extra < wanted:
+        page = supabase.table('coins').select(COIN_COLUMNS) \
+            .order("created_at", desc=True) \
+            .range(start, start + PAGE_SIZE - 1).execute().data or []
+        for coin in page:
+            if coin["id"] not in labelled and extra < wanted:
+                labelled[coin["id"]] = (coin, 0)
+                extra += 1
+        if len(page) < PAGE_SIZE:
+            break
+        start += PAGE_SIZE
+    return list(labelled.values())
+
+
+def load_icons(coins, timeout=10.0):
+    from icon_cache import IconCache
+
+    cache = IconCache(tile_size=100, max_items=len(coins) + 1, disk_dir=os.getenv("PREFILTER_ICON_DIR"),
+                      workers=16)
+    for coin in coins:
+        cache.prefetch(coin.get("metadata_image_official"))
+    return [cache.get(coin.get("metadata_image_official"), wait=timeout) for coin in coins]
+
+
+def train_command(args):
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    positive = {q.strip() for q in args.positive.split(",") if q.strip()}
+    rows = fetch_labelled_coins(supabase, positive, args.limit, args.negatives_per_positive)
+    coins = [coin for coin, _ in rows]
+    labels = [label for _, label in rows]
+    logging.info(f"Training on {len(rows)} coins ({sum(labels)} positive: quality in {sorted(positive)}).")
+    icons = load_icons(coins) if args.icons else [None] * len(coins)
+    samples = [coin_features(coin, icon, with_icon=args.icons) for coin, icon in zip(coins, icons)]
+    model = train_model(samples, labels, epochs=args.epochs, learning_rate=args.learning_rate,
+                        l2=args.l2, target_recall=args.target_recall)
+    model.info["positive_qualities"] = sorted(positive)
+    model.save(args.out)
+    logging.info(f"Saved {args.out}: threshold={model.threshold:.4f}, info={model.info}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+    parser = argparse.ArgumentParser(description="Train the pre-LLM coin pre-filter.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="Train from goodcoins.quality labels")
+    train.add_argument("--out", default="prefilter_model.json")
+    train.add_argument("--positive", default="buy", help="Comma-separated goodcoins.quality values counted as good")
+    train.add_argument("--limit", type=int, default=20000, help="Max labelled goodcoins rows")
+    train.add_argument("--negatives-per-positive", type=int, default=20,
+                       help="Extra never-promoted coins sampled per positive")
+    train.add_argument("--icons", action="store_true", help="Download icons and use icon statistics")
+    train.add_argument("--epochs", type=int, default=300)
+    train.add_argument("--learning-rate", type=float, default=0.5)
+    train.add_argument("--l2", type=float, default=1e-3)
+    train.add_argument("--target-recall", type=float, default=0.95)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train_command(args)
@@ -1,4 +1,8 @@
 # File: /sweriko-pompv1/pruner.py
+#
+# The listener uploads bundle grids straight from memory, so bundleimagesmain/
+# is only written when SAVE_BUNDLE_IMAGES=1 (debugging). Production setups
+# don't need to run this script.
 
 import os
 import time
@@ -5,6 +5,7 @@ import redis
 import time
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from grid_spec import TOTAL_COINS
 
 load_dotenv()
 
@@ -42,7 +43,10 @@ def enqueue_new_bundles():
             if image_url:
                 item = {
                     "bundle_id": b['id'],
-                    "image_url": image_url
+                    "image_url": image_url,
+                    "coin_count": b.get('coin_count') or TOTAL_COINS,
+                    # image_processor reports enqueue -> dequeue as queue_wait (see metrics.py)
+                    "enqueued_at": time.time()
                 }
                 r.rpush("bundle_queue", json.dumps(item))
                 supabase.table('bundles').update({"processed": True}).eq("id", b['id']).execute()
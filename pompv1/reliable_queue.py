@@ -0,0 +1,164 @@
+# File: /pompv1/reliable_queue.py
+
+"""
+At-least-once consumption of a Redis list (the 'bundle_queue' that queue_manager.py fills).
+
+Workers block on BLMOVE, which atomically moves the next item from the queue onto
+<name>:processing, and take a lease on it (<name>:leases, item -> deadline). ack()
+removes the item once it is fully processed. A reaper returns items whose lease
+ran out (worker crashed or hung) to the front of the queue; after max_deliveries
+attempts an item goes to <name>:dead instead of looping forever.
+
+Producers keep using RPUSH on the plain list, so queue_manager.py is unchanged.
+Needs Redis >= 6.2 for BLMOVE.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Atomically moves an expired item from processing back to the queue (or the dead list)
+_REQUEUE_SCRIPT = """
+if redis.call('LREM', KEYS[2], 1, ARGV[1]) == 0 then
+  redis.call('HDEL', KEYS[3], ARGV[1])
+  return 0
+end
+redis.call('HDEL', KEYS[3], ARGV[1])
+local deliveries = tonumber(redis.call('HGET', KEYS[4], ARGV[1]) or '0')
+if deliveries >= tonumber(ARGV[2]) then
+  redis.call('HDEL', KEYS[4], ARGV[1])
+  redis.call('RPUSH', KEYS[5], ARGV[1])
+  return 2
+end
+redis.call('LPUSH', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class ReliableQueue:
+    def __init__(self, redis_client, name="bundle_queue", visibility_timeout=300, max_deliveries=3):
+        """
+        Args:
+            visibility_timeout (float): Seconds a worker may hold an item before it is redelivered.
+            max_deliveries (int): Deliveries before an item is moved to the dead list.
+        """
+        self.redis = redis_client
+        self.name = name
+        self.processing = f"{name}:processing"
+        self.leases = f"{name}:leases"
+        self.deliveries = f"{name}:deliveries"
+        self.dead = f"{name}:dead"
+        self.visibility_timeout = visibility_timeout
+        self.max_deliveries = max_deliveries
+        self._requeue = redis_client.register_script(_REQUEUE_SCRIPT)
+
+    def get(self, timeout=5):
+        """
+        Blocks up to `timeout` seconds for the next item. Returns the raw item (bytes)
+        or None. The item stays on the processing list until ack().
+        """
+        item = self.redis.blmove(self.name, self.processing, timeout, "LEFT", "RIGHT")
+        if item is None:
+            return None
+        pipe = self.redis.pipeline()
+        pipe.hset(self.leases, item, time.time() + self.visibility_timeout)
+        pipe.hincrby(self.deliveries, item, 1)
+        pipe.execute()
+        return item
+
+    def extend(self, item, seconds=None):
+        """
+        Pushes the item's lease out again, for steps that may outlast the visibility timeout.
+        """
+        self.redis.hset(self.leases, item, time.time() + (seconds or self.visibility_timeout))
+
+    @contextmanager
+    def holding(self, item, interval=None, max_seconds=None):
+        """
+        Keeps extending the item's lease (every `interval` seconds, default a third of
+        the visibility timeout) while the block runs, so slow items are not handed to a
+        second worker. Stops after `max_seconds` (default 4x the visibility timeout) so
+        a hung worker still loses the item eventually.
+        """
+        interval = interval or max(1.0, self.visibility_timeout / 3.0)
+        max_seconds = max_seconds or 4 * self.visibility_timeout
+        stop = threading.Event()
+
+        def beat():
+            started = time.time()
+            while not stop.wait(interval):
+                if time.time() - started > max_seconds:
+                    logging.warning(f"Stopped extending lease after {max_seconds:.0f}s: {item}")
+                    return
+                try:
+                    self.extend(item)
+                except Exception as e:
+                    logging.warning(f"Failed to extend lease of {self.name} item: {e}")
+
+        thread = threading.Thread(target=beat, name=f"{self.name}-lease", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+
+    def ack(self, item):
+        pipe = self.redis.pipeline()
+        pipe.lrem(self.processing, 1, item)
+        pipe.hdel(self.leases, item)
+        pipe.hdel(self.deliveries, item)
+        pipe.execute()
+
+    def requeue(self, item):
+        """
+        Returns an item to the front of the queue now (or to the dead list once it
+        has used up its deliveries). Returns 1 = requeued, 2 = dead-lettered, 0 = not held.
+        """
+        return self._requeue(keys=[self.name, self.processing, self.leases, self.deliveries, self.dead],
+                             args=[item, self.max_deliveries])
+
+    def reap(self):
+        """
+        Redelivers processing items whose lease expired. Items with no lease (a worker
+        died between BLMOVE and taking the lease) get one now and are reaped next time.
+        Returns the number of items requeued or dead-lettered.
+        """
+        now = time.time()
+        reaped = 0
+        for item in self.redis.lrange(self.processing, 0, -1):
+            deadline = self.redis.hget(self.leases, item)
+            if deadline is None:
+                self.redis.hsetnx(self.leases, item, now + self.visibility_timeout)
+                continue
+            if float(deadline) > now:
+                continue
+            result = self.requeue(item)
+            if result == 1:
+                logging.warning(f"Lease expired, redelivering {self.name} item: {item}")
+                reaped += 1
+            elif result == 2:
+                logging.error(f"{self.name} item failed {self.max_deliveries} deliveries, moved to {self.dead}: {item}")
+                reaped += 1
+        return reaped
+
+    def start_reaper(self, interval=15):
+        def loop():
+            while True:
+                try:
+                    self.reap()
+                except Exception as e:
+                    logging.error(f"Error reaping {self.processing}: {e}", exc_info=True)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=loop, name=f"{self.name}-reaper", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        pipe = self.redis.pipeline()
+        pipe.llen(self.name)
+        pipe.llen(self.processing)
+        pipe.llen(self.dead)
+        queued, processing, dead = pipe.execute()
+        return {"queued": queued, "processing": processing, "dead": dead}
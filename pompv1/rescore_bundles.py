@@ -0,0 +1,246 @@
+# File: /pompv1/rescore_bundles.py
+
+"""
+Offline re-scoring of stored bundles through the OpenAI Batch API.
+
+Pulls bundles with an image_url from Supabase, writes one Batch API line per
+bundle (the same request body as the live decision, see
+openai_decider.build_decision_request), submits it, polls until the batch is
+done and validates every answer exactly like the live path
+(openai_decider.decisions_from_choice). Results go to the bundle_rescores table
+(sql/bundle_rescores.sql), tagged so prompt variants can be compared.
+
+Batch requests are billed at half price and don't count against the live
+RPM/TPM limits, but may take up to 24h.
+
+Usage:
+    python rescore_bundles.py --limit 5000 --tag prompt-v2
+    python rescore_bundles.py --since 2025-01-01 --model gpt-4o --dry-run   # only write the JSONL
+    python rescore_bundles.py --resume batch_abc123 --tag prompt-v2          # collect a submitted batch
+
+Against the local stand-in (openai_standin.py):
+    OPENAI_BASE_URL=http://127.0.0.1:8095/v1 python rescore_bundles.py --limit 50 --poll-interval 1
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from openai import OpenAI
+from supabase import create_client
+
+from bundle_store import column_missing
+from grid_spec import TOTAL_COINS, coin_ids
+from openai_decider import DECISION_MODEL, all_no, build_decision_request, decisions_from_choice
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+# The Batch API takes at most 50,000 requests (and 200 MB) per input file
+MAX_REQUESTS_PER_BATCH = 50000
+PAGE_SIZE = 1000
+INSERT_CHUNK = 500
+DONE_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def fetch_bundles(supabase, limit, since=None):
+    """
+    Returns up to `limit` bundle rows (id, image_url, coin_count), newest first.
+    Without a bundles.coin_count column every bundle counts as a full grid.
+    """
+    columns = "id, image_url, coin_count, created_at"
+    rows = []
+    while len(rows) < limit:
+        query = supabase.table('bundles') \
+            .select(columns) \
+            .not_.is_("image_url", "null")
+        if since:
+            query = query.gte("created_at", since)
+        page_end = len(rows) + min(PAGE_SIZE, limit - len(rows)) - 1
+        try:
+            page = query.order("created_at", desc=True).range(len(rows), page_end).execute().data or []
+        except Exception as e:
+            if "coin_count" not in columns or not column_missing(e, "coin_count"):
+                raise
+            logging.warning(f"bundles.coin_count column missing, assuming {TOTAL_COINS} coins per bundle.")
+            columns = "id, image_url, created_at"
+            continue
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            break
+    return rows[:limit]
+
+
+def custom_id(bundle):
+    # Carries the coin count so results can be parsed without re-reading the bundle
+    return f"{bundle['id']}:{bundle.get('coin_count') or TOTAL_COINS}"
+
+
+def split_custom_id(value):
+    bundle_id, _, count = value.rpartition(":")
+    return bundle_id, int(count)
+
+
+def build_batch_lines(bundles, model):
+    lines = []
+    for bundle in bundles:
+        ids = coin_ids(bundle.get("coin_count") or TOTAL_COINS)
+        lines.append(json.dumps({
+            "custom_id": custom_id(bundle),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": build_decision_request(bundle["image_url"], ids, model),
+        }))
+    return lines
+
+
+def submit_batch(client, lines, tag, out_dir):
+    """
+    Uploads one JSONL input file and creates the batch. Returns the batch id.
+    """
+    payload = ("\n".join(lines) + "\n").encode("utf-8")
+    name = f"rescore_{tag or 'untagged'}_{int(time.time())}.jsonl"
+    if out_dir:
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+        (Path(out_dir) / name).write_bytes(payload)
+    input_file = client.files.create(file=(name, io.BytesIO(payload)), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        metadata={"job": "rescore_bundles", "tag": tag or ""},
+    )
+    logging.info(f"Submitted batch {batch.id} with {len(lines)} requests (input file {input_file.id}).")
+    return batch.id
+
+
+def wait_for_batch(client, batch_id, poll_interval):
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts is not None:
+            logging.info(f"Batch {batch_id}: {batch.status} ({counts.completed}/{counts.total} done, "
+                         f"{counts.failed} failed)")
+        else:
+            logging.info(f"Batch {batch_id}: {batch.status}")
+        if batch.status in DONE_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def read_jsonl(client, file_id):
+    if not file_id:
+        return []
+    text = client.files.content(file_id).text
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def parse_result_line(line):
+    """
+    One output/error file line -> (bundle_id, decisions, answered, error).
+    """
+    bundle_id, coin_count = split_custom_id(line["custom_id"])
+    ids = coin_ids(coin_count)
+    response = line.get("response") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        error = line.get("error") or (response.get("body") or {}).get("error") or {}
+        message = error.get("message") if isinstance(error, dict) else str(error)
+        return bundle_id, all_no(ids=ids), False, message or f"status {response.get('status_code')}"
+    try:
+        choice = response["body"]["choices"][0]
+        message = choice.get("message") or {}
+    except (KeyError, IndexError, TypeError):
+        return bundle_id, all_no(ids=ids), False, "malformed response body"
+    decisions, answered = decisions_from_choice(message.get("content"), message.get("refusal"),
+                                                choice.get("finish_reason"), ids)
+    return bundle_id, decisions, answered, None
+
+
+def collect_results(client, batch, model, tag):
+    """
+    Parses the batch's output and error files into bundle_rescores rows.
+    """
+    rows = []
+    for line in read_jsonl(client, batch.output_file_id) + read_jsonl(client, batch.error_file_id):
+        try:
+            bundle_id, decisions, answered, error = parse_result_line(line)
+        except Exception as e:
+            # One unreadable line must not lose the rest of the batch
+            logging.error(f"Skipping unreadable result line {str(line)[:200]}: {e}")
+            continue
+        rows.append({
+            "bundle_id": bundle_id,
+            "batch_id": batch.id,
+            "model": model,
+            "tag": tag,
+            "decisions": decisions,
+            "yes_count": sum(1 for d in decisions if d["decision"] == "yes"),
+            "answered": answered,
+            "error": error,
+        })
+    return rows
+
+
+def save_rescores(supabase, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        supabase.table('bundle_rescores') \
+            .upsert(rows[start:start + INSERT_CHUNK], on_conflict="bundle_id,batch_id") \
+            .execute()
+    logging.info(f"Saved {len(rows)} rescores.")
+
+
+def rescore(supabase, client, batch_ids, model, tag, poll_interval):
+    for batch_id in batch_ids:
+        batch = wait_for_batch(client, batch_id, poll_interval)
+        if batch.status != "completed":
+            logging.error(f"Batch {batch_id} ended as {batch.status}; collecting whatever it produced.")
+        rows = collect_results(client, batch, model, tag)
+        answered = sum(1 for row in rows if row["answered"])
+        yes = sum(row["yes_count"] for row in rows)
+        logging.info(f"Batch {batch_id}: {len(rows)} results, {answered} answered, {yes} yes decisions.")
+        save_rescores(supabase, rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score stored bundles with the OpenAI Batch API.")
+    parser.add_argument("--limit", type=int, default=1000, help="Bundles to re-score (newest first)")
+    parser.add_argument("--since", help="Only bundles created at or after this ISO date")
+    parser.add_argument("--model", default=DECISION_MODEL)
+    parser.add_argument("--tag", default="", help="Run label stored with every result")
+    parser.add_argument("--out-dir", default="rescore_batches", help="Where to keep the submitted JSONL")
+    parser.add_argument("--poll-interval", type=float, default=60.0)
+    parser.add_argument("--resume", action="append", default=[], metavar="BATCH_ID",
+                        help="Collect an already submitted batch instead of submitting a new one")
+    parser.add_argument("--dry-run", action="store_true", help="Write the JSONL files but don't submit")
+    args = parser.parse_args()
+
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL") or None)
+
+    batch_ids = list(args.resume)
+    if not batch_ids:
+        bundles = fetch_bundles(supabase, args.limit, args.since)
+        logging.info(f"Re-scoring {len(bundles)} bundles with {args.model}.")
+        lines = build_batch_lines(bundles, args.model)
+        for start in range(0, len(lines), MAX_REQUESTS_PER_BATCH):
+            chunk = lines[start:start + MAX_REQUESTS_PER_BATCH]
+            if args.dry_run:
+                Path(args.out_dir).mkdir(parents=True, exist_ok=True)
+                path = Path(args.out_dir) / f"rescore_{args.tag or 'untagged'}_{start // MAX_REQUESTS_PER_BATCH}.jsonl"
+                path.write_text("\n".join(chunk) + "\n", encoding="utf-8")
+                logging.info(f"Wrote {len(chunk)} requests to {path}")
+            else:
+                batch_ids.append(submit_batch(client, chunk, args.tag, args.out_dir))
+
+    if batch_ids:
+        rescore(supabase, client, batch_ids, args.model, args.tag, args.poll_interval)
@@ -0,0 +1,23 @@
+-- File: /pompv1/sql/bundle_rescores.sql
+--
+-- Offline re-scoring results written by rescore_bundles.py (OpenAI Batch API).
+-- One row per bundle per batch; the live decisions in goodcoins are untouched.
+
+create table if not exists public.bundle_rescores (
+  id uuid primary key default gen_random_uuid(),
+  created_at timestamptz not null default now(),
+  bundle_id uuid not null references public.bundles (id) on delete cascade,
+  batch_id text not null,
+  model text,
+  tag text,                   -- free-form run label, e.g. the prompt variant being tried
+  decisions jsonb,            -- [{"id": "01", "decision": "yes"}, ...]
+  yes_count integer,
+  answered boolean not null,  -- false = all-"no" fallback (refusal, truncation, bad JSON, request error)
+  error text
+);
+
+create unique index if not exists bundle_rescores_bundle_id_batch_id_key
+  on public.bundle_rescores (bundle_id, batch_id);
+
+create index if not exists bundle_rescores_tag_idx
+  on public.bundle_rescores (tag);
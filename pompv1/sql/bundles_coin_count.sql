@@ -0,0 +1,11 @@
+-- File: /pompv1/sql/bundles_coin_count.sql
+--
+-- Bundles can be partial (time-bounded flush, BUNDLE_MAX_AGE_SECONDS), so each row
+-- records its coin count. Written by bundle_store.py in every DB_WRITE_MODE and read
+-- by queue_manager.py and rescore_bundles.py.
+--
+-- sql/create_bundle_with_coins.sql adds the column too; run this one when the RPC
+-- function is not installed ("bulk" / "writebehind"). Until then bundles are saved
+-- without a count and treated as full grids.
+
+alter table public.bundles add column if not exists coin_count integer;
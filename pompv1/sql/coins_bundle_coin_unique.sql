@@ -0,0 +1,8 @@
+-- File: /pompv1/sql/coins_bundle_coin_unique.sql
+--
+-- bundle_store.py (DB_WRITE_MODE=writebehind) writes coin rows with
+--   supabase.table('coins').upsert([...], on_conflict="bundle_id,coin_id")
+-- which needs a unique index on (bundle_id, coin_id) as the conflict target.
+
+create unique index if not exists coins_bundle_id_coin_id_key
+  on public.coins (bundle_id, coin_id);
@@ -0,0 +1,47 @@
+-- File: /pompv1/sql/create_bundle_with_coins.sql
+--
+-- Inserts a bundle and all of its coins in one transaction.
+-- Called by bundle_store.py (DB_WRITE_MODE=rpc) as
+--   supabase.rpc('create_bundle_with_coins', {"coins": [...]})
+-- Returns {"bundle_id": ..., "coins": [{"coin_id": "01", "id": ...}, ...]}
+
+-- Bundles can be partial (time-bounded flush), so each row records its coin count
+-- (same as sql/bundles_coin_count.sql; repeated here because the function needs it).
+alter table public.bundles add column if not exists coin_count integer;
+
+create or replace function public.create_bundle_with_coins(coins jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+  new_bundle_id public.bundles.id%type;
+  result jsonb;
+begin
+  insert into public.bundles (coin_count) values (jsonb_array_length(coins))
+  returning id into new_bundle_id;
+
+  with inserted as (
+    insert into public.coins (
+      bundle_id, coin_id, mint, pumpfun_url, metadata_image_official,
+      metadata_name, metadata_symbol, metadata_description, twitter, website
+    )
+    select
+      new_bundle_id, c.coin_id, c.mint, c.pumpfun_url, c.metadata_image_official,
+      c.metadata_name, c.metadata_symbol, c.metadata_description, c.twitter, c.website
+    from jsonb_to_recordset(coins) as c(
+      coin_id text, mint text, pumpfun_url text, metadata_image_official text,
+      metadata_name text, metadata_symbol text, metadata_description text,
+      twitter text, website text
+    )
+    returning coin_id, id
+  )
+  select jsonb_build_object(
+    'bundle_id', new_bundle_id,
+    'coins', coalesce(jsonb_agg(jsonb_build_object('coin_id', coin_id, 'id', id)), '[]'::jsonb)
+  )
+  into result
+  from inserted;
+
+  return result;
+end;
+$$;
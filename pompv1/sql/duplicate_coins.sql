@@ -0,0 +1,16 @@
+-- File: /pompv1/sql/duplicate_coins.sql
+--
+-- Coins the listener's duplicate filter (dedup.py) kept out of bundles.
+
+create table if not exists public.duplicate_coins (
+  id uuid primary key default gen_random_uuid(),
+  created_at timestamptz not null default now(),
+  mint text not null,
+  pumpfun_url text,
+  metadata_name text,
+  metadata_symbol text,
+  metadata_image_official text,
+  duplicate_of text,          -- mint of the coin it duplicates
+  reason text,                -- 'name' or 'icon'
+  distance integer            -- dHash hamming distance for icon matches
+);
@@ -0,0 +1,12 @@
+-- File: /pompv1/sql/goodcoins_coin_uuid_unique.sql
+--
+-- image_processor.py creates goodcoins rows with
+--   supabase.table('goodcoins').upsert([...], on_conflict="coin_uuid", ignore_duplicates=True)
+-- so a bundle redelivered by the queue never creates a second row for the same coin.
+-- That needs a unique index on coin_uuid as the conflict target.
+--
+-- Existing duplicates must be removed first, e.g. to list them:
+--   select coin_uuid, count(*) from public.goodcoins group by coin_uuid having count(*) > 1;
+
+create unique index if not exists goodcoins_coin_uuid_key
+  on public.goodcoins (coin_uuid);
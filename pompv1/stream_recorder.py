@@ -0,0 +1,169 @@
+# File: /pompv1/stream_recorder.py
+
+"""
+Records the PumpPortal token stream for offline replay (see stream_replay.py).
+
+Captures raw 'subscribeNewToken' frames with their arrival offsets, plus the
+metadata JSON and icon bytes each token points to, into one gzip'd JSONL file:
+
+    {"type": "header", "version": 1, "source": ..., "recorded_at": ...}
+    {"type": "frame", "t": 0.512, "data": "<raw frame>"}
+    {"type": "meta", "uri": "...", "status": 200, "body": {...}}
+    {"type": "icon", "key": "<ipfs hash>", "content_type": "image/png", "data": "<base64>"}
+
+Usage:
+    python stream_recorder.py --out recording.jsonl.gz --count 200
+"""
+
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import os
+import time
+
+import aiohttp
+import websockets
+from dotenv import load_dotenv
+
+from icon_cache import icon_key
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+API_URL = os.getenv("API_URL", "wss://pumpportal.fun/api/data")
+IPFS_GATEWAY_URL = os.getenv("IPFS_GATEWAY_URL", "https://pump.mypinata.cloud/ipfs").rstrip("/")
+
+
+class StreamRecorder:
+    def __init__(self, out_path, with_icons=True, concurrency=16):
+        self.out_path = out_path
+        self.with_icons = with_icons
+        self.concurrency = concurrency
+        self._out = None
+        self._seen_uris = set()
+        self._seen_icons = set()
+        self._frames = 0
+
+    def _write(self, record):
+        self._out.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    async def record(self, api_url, count=None, duration=None):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        with gzip.open(self.out_path, "wt", encoding="utf-8") as out:
+            self._out = out
+            self._write({"type": "header", "version": 1, "source": api_url, "recorded_at": time.time()})
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15)) as session:
+                async with websockets.connect(api_url) as ws:
+                    await ws.send(json.dumps({"method": "subscribeNewToken"}))
+                    started = time.monotonic()
+                    logging.info(f"Recording {api_url} => {self.out_path}")
+                    while True:
+                        remaining = None
+                        if duration:
+                            remaining = duration - (time.monotonic() - started)
+                            if remaining <= 0:
+                                break
+                        try:
+                            message = await asyncio.wait_for(ws.recv(), timeout=remaining)
+                        except asyncio.TimeoutError:
+                            break
+                        self._write({"type": "frame", "t": round(time.monotonic() - started, 4), "data": message})
+                        self._frames += 1
+                        task = asyncio.create_task(self._capture_assets(session, semaphore, message))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                        if count and self._frames >= count:
+                            break
+                if tasks:
+                    await asyncio.gather(*tasks, return_exceptions=True)
+        logging.info(f"Recorded {self._frames} frames, {len(self._seen_uris)} metadata docs, "
+                     f"{len(self._seen_icons)} icons.")
+
+    async def _capture_assets(self, session, semaphore, message):
+        try:
+            data = json.loads(message)
+        except json.JSONDecodeError:
+            return
+        uri = data.get("uri")
+        if not uri or uri in self._seen_uris:
+            return
+        self._seen_uris.add(uri)
+
+        async with semaphore:
+            try:
+                async with session.get(uri) as resp:
+                    body = await resp.json(content_type=None) if resp.status == 200 else None
+                    self._write({"type": "meta", "uri": uri, "status": resp.status, "body": body})
+            except Exception as e:
+                logging.warning(f"Metadata fetch failed for {uri}: {e}")
+                self._write({"type": "meta", "uri": uri, "status": 599, "body": None})
+                return
+
+        image = (body or {}).get("image") if isinstance(body, dict) else None
+        if not self.with_icons or not image:
+            return
+        key = icon_key(image)
+        if key in self._seen_icons:
+            return
+        self._seen_icons.add(key)
+        parts = image.split("/ipfs/")
+        icon_url = f"{IPFS_GATEWAY_URL}/{parts[1]}?img-width=256&img-dpr=2&img-onerror=redirect" \
+            if len(parts) == 2 else image
+        async with semaphore:
+            try:
+                async with session.get(icon_url) as resp:
+                    if resp.status != 200:
+                        return
+                    content = await resp.read()
+                    self._write({
+                        "type": "icon",
+                        "key": key,
+                        "content_type": resp.headers.get("Content-Type", "application/octet-stream"),
+                        "data": base64.b64encode(content).decode("ascii")
+                    })
+            except Exception as e:
+                logging.warning(f"Icon fetch failed for {icon_url}: {e}")
+
+
+def load_recording(path):
+    """
+    Reads a recording. Returns (frames, metadata_by_uri, icons_by_key) where
+    frames is a list of (offset_seconds, raw_frame) and icons map to (content_type, bytes).
+    """
+    frames, metadata, icons = [], {}, {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            kind = record.get("type")
+            if kind == "frame":
+                frames.append((record["t"], record["data"]))
+            elif kind == "meta":
+                metadata[record["uri"]] = (record["status"], record["body"])
+            elif kind == "icon":
+                icons[record["key"]] = (record["content_type"], base64.b64decode(record["data"]))
+    frames.sort(key=lambda fr: fr[0])
+    return frames, metadata, icons
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record the PumpPortal token stream.")
+    parser.add_argument("--out", default="recording.jsonl.gz")
+    parser.add_argument("--url", default=API_URL)
+    parser.add_argument("--count", type=int, default=None, help="Stop after N frames")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after N seconds")
+    parser.add_argument("--no-icons", action="store_true", help="Do not capture icon bytes")
+    args = parser.parse_args()
+    if not args.count and not args.duration:
+        parser.error("pass --count and/or --duration")
+
+    recorder = StreamRecorder(args.out, with_icons=not args.no_icons)
+    asyncio.run(recorder.record(args.url, count=args.count, duration=args.duration))
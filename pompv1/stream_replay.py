@@ -0,0 +1,147 @@
+# File: /pompv1/stream_replay.py
+
+"""
+Local replay server for recordings made with stream_recorder.py.
+
+Serves the recorded frames over a websocket (ws://HOST:PORT/api/data) at the
+recorded pace, N times faster, or as fast as possible, and stands in for the
+metadata host and the IPFS gateway:
+
+    GET /meta/<n>      recorded metadata JSON (image pointed at /ipfs/<key>)
+    GET /ipfs/<key>    recorded icon bytes
+
+Point the listener at it with:
+    API_URL=ws://127.0.0.1:8090/api/data IPFS_GATEWAY_URL=http://127.0.0.1:8090/ipfs
+
+Usage:
+    python stream_replay.py recording.jsonl.gz --speed 10
+    python stream_replay.py recording.jsonl.gz --speed max --loop 5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from aiohttp import web
+
+from icon_cache import icon_key
+from stream_recorder import load_recording
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+
+class ReplayServer:
+    def __init__(self, recording_path, host="127.0.0.1", port=8090, speed=1.0, loops=1):
+        """
+        Args:
+            speed (float): 1.0 = recorded pace, N = N times faster, 0 = no delays (max speed).
+            loops (int): How many times the recording is replayed per connection.
+        """
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.loops = loops
+        self.base_url = f"http://{host}:{port}"
+        frames, metadata, icons = load_recording(recording_path)
+        self.icons = icons
+        self.metadata = []
+        self.frames = [(t, self._rewrite_frame(raw, metadata)) for t, raw in frames]
+        logging.info(f"Loaded {len(self.frames)} frames, {len(self.metadata)} metadata docs, {len(icons)} icons.")
+
+    def _rewrite_frame(self, raw, metadata):
+        """
+        Points the frame's uri at the local /meta route and the metadata's image at /ipfs.
+        """
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            return raw
+        uri = data.get("uri")
+        if not uri:
+            return raw
+        status, body = metadata.get(uri, (404, None))
+        if isinstance(body, dict) and body.get("image"):
+            body = dict(body, image=f"{self.base_url}/ipfs/{icon_key(body['image'])}")
+        self.metadata.append((status, body))
+        data["uri"] = f"{self.base_url}/meta/{len(self.metadata) - 1}"
+        return json.dumps(data)
+
+    async def handle_stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        # Wait for the subscribe call like PumpPortal does
+        msg = await ws.receive()
+        logging.info(f"Client subscribed: {msg.data}")
+        await ws.send_str(json.dumps({"message": "Successfully subscribed to token creation events."}))
+
+        sent = 0
+        started = time.monotonic()
+        try:
+            for _ in range(self.loops):
+                loop_started = time.monotonic()
+                for t, frame in self.frames:
+                    if self.speed > 0:
+                        delay = t / self.speed - (time.monotonic() - loop_started)
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    await ws.send_str(frame)
+                    sent += 1
+        except ConnectionResetError:
+            logging.warning("Client disconnected during replay.")
+        elapsed = time.monotonic() - started
+        rate = sent / elapsed if elapsed > 0 else float("inf")
+        logging.info(f"Replayed {sent} frames in {elapsed:.2f}s ({rate:.1f} frames/s).")
+        await ws.close()
+        return ws
+
+    async def handle_meta(self, request):
+        try:
+            status, body = self.metadata[int(request.match_info["n"])]
+        except (ValueError, IndexError):
+            return web.Response(status=404)
+        if status != 200 or body is None:
+            return web.Response(status=status if status < 599 else 502)
+        return web.json_response(body)
+
+    async def handle_ipfs(self, request):
+        icon = self.icons.get(request.match_info["key"])
+        if icon is None:
+            return web.Response(status=404)
+        content_type, content = icon
+        return web.Response(body=content, content_type=content_type.split(";")[0])
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get("/api/data", self.handle_stream)
+        app.router.add_get("/meta/{n}", self.handle_meta)
+        app.router.add_get("/ipfs/{key}", self.handle_ipfs)
+        return app
+
+    def run(self):
+        logging.info(f"Replay server on ws://{self.host}:{self.port}/api/data "
+                     f"(IPFS_GATEWAY_URL={self.base_url}/ipfs, speed={self.speed or 'max'})")
+        web.run_app(self.make_app(), host=self.host, port=self.port, print=None)
+
+
+def parse_speed(value):
+    if value.lower() in ("max", "0"):
+        return 0.0
+    return float(value.lower().rstrip("x"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded PumpPortal token stream.")
+    parser.add_argument("recording")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1, 10, 10x or max")
+    parser.add_argument("--loop", type=int, default=1, help="Replay the recording N times per connection")
+    args = parser.parse_args()
+
+    ReplayServer(args.recording, host=args.host, port=args.port, speed=args.speed, loops=args.loop).run()
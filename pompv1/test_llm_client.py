@@ -0,0 +1,54 @@
+# File: /pompv1/test_llm_client.py
+
+"""
+Run from pompv1/:  python -m unittest test_llm_client
+"""
+
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from llm_client import LLMClient, RateLimiter
+
+
+class FakeOpenAI:
+    """
+    Stands in for OpenAI(): every chat.completions.create() takes `latency` seconds.
+    """
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _create(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return SimpleNamespace(usage=None, choices=[])
+
+
+class SubmitTest(unittest.TestCase):
+    def test_full_pool_with_hedging_does_not_deadlock(self):
+        workers = 4
+        fake = FakeOpenAI(latency=0.2)
+        llm = LLMClient(fake, RateLimiter(rpm=100000, tpm=10 ** 9), workers=workers,
+                        hedge=True, hedge_min_samples=1)
+        # Known p95 well below the call latency, so attempts go through the call pool and hedge
+        llm._latencies.extend([0.01] * 10)
+
+        futures = [llm.submit(model="m", messages=[{"role": "user", "content": "hi"}])
+                   for _ in range(2 * workers)]
+        for future in futures:
+            future.result(timeout=10)
+
+        self.assertGreater(llm.stats["hedges"], 0)
+        self.assertEqual(fake.calls, 2 * workers + llm.stats["hedges"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,22 @@
 import websocket
 import json
 import time
+import threading
 import requests
-from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
-from PIL.Image import Resampling
 import logging
 import os
+from collections import deque
 from supabase import create_client, Client
 from dotenv import load_dotenv
-from cloudflare_uploader import upload_to_cloudflare
+from cloudflare_uploader import upload_bytes_to_cloudflare
+from bundle_store import BundleStore
+from bundle_handoff import BundleHandoff
+from dedup import DuplicateIndex, dhash
+from prefilter import PrefilterModel
+from icon_cache import icon_key
+from grid_spec import TOTAL_COINS
+from bundle_renderer import FONT_PATH, icon_cache, render_bundle_image, encode_png
+from metrics import metrics
 
 load_dotenv()
 
@@ -28,346 +35,371 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-API_URL = os.getenv("API_URL", "wss://pumpportal.fun/api/data")
+# "rpc" (default, falls back to "bulk"), "bulk" or "writebehind" - see bundle_store.py
+DB_WRITE_MODE = os.getenv("DB_WRITE_MODE", "rpc").lower()
+bundle_store = BundleStore(
+    supabase,
+    mode=DB_WRITE_MODE,
+    flush_interval=float(os.getenv("DB_FLUSH_INTERVAL", "2")),
+    flush_batch=int(os.getenv("DB_FLUSH_BATCH", "10")),
+    max_pending=int(os.getenv("DB_MAX_PENDING", "1000")),
+    max_attempts=int(os.getenv("DB_FLUSH_MAX_ATTEMPTS", "5"))
+)
 
-TOTAL_COINS = 8
-GRID_COLS = 2
-GRID_ROWS = 4
-IMG_WIDTH = 512
-IMG_HEIGHT = 512
-BOX_WIDTH = IMG_WIDTH // GRID_COLS
-BOX_HEIGHT = IMG_HEIGHT // GRID_ROWS
-
-FONT_PATH = os.getenv("FONT_PATH", "notosans.ttf")
-DEFAULT_FONT_SIZE = 14
-MIN_FONT_SIZE = 6
-NAME_START_FONT_SIZE = 16
-NAME_MIN_FONT_SIZE = 6
-DESC_START_FONT_SIZE = 14
-DESC_MIN_FONT_SIZE = 6
-LABEL_BOX_SIZE = 22
-LINE_SPACING = 2
-LABEL_FONT_SIZE = 14
+API_URL = os.getenv("API_URL", "wss://pumpportal.fun/api/data")
+IPFS_GATEWAY_URL = os.getenv("IPFS_GATEWAY_URL", "https://pump.mypinata.cloud/ipfs").rstrip("/")
+
+# "sync" = websocket-client callback with blocking metadata fetches,
+# "async" = asyncio pipeline with concurrent metadata fetches (see async_ingest.py)
+INGEST_MODE = os.getenv("INGEST_MODE", "sync").lower()
+METADATA_CONCURRENCY = int(os.getenv("METADATA_CONCURRENCY", "16"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "256"))
+METADATA_TIMEOUT = float(os.getenv("METADATA_TIMEOUT", "5"))
+
+# Bundle grids are rendered and uploaded in memory; set to 1 to also keep a copy
+# in bundleimagesmain/ for debugging (pruner.py cleans those up)
+SAVE_BUNDLE_IMAGES = os.getenv("SAVE_BUNDLE_IMAGES", "0") == "1"
+
+# Rendered grids are also handed to image_processor through Redis (see bundle_handoff.py)
+# so it can crop without downloading the image back from R2; 0 disables
+HANDOFF_ENABLED = os.getenv("HANDOFF_ENABLED", "1") == "1"
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6380/0")
+HANDOFF_TTL_SECONDS = int(os.getenv("HANDOFF_TTL_SECONDS", "600"))
+
+# Pre-bundle duplicate filter (see dedup.py); DEDUP_REDIS_URL shares the window across listeners.
+# Off by default: it waits up to DEDUP_ICON_WAIT per coin for the icon on the ingest
+# thread and needs the duplicate_coins table (sql/duplicate_coins.sql).
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "0") == "1"
+DEDUP_WINDOW_SECONDS = float(os.getenv("DEDUP_WINDOW_SECONDS", "1800"))
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "6"))
+DEDUP_ICON_WAIT = float(os.getenv("DEDUP_ICON_WAIT", "1"))
+DEDUP_REDIS_URL = os.getenv("DEDUP_REDIS_URL")
+DUPLICATE_TABLE = os.getenv("DUPLICATE_TABLE", "duplicate_coins")
+
+# Pre-LLM coin scorer (see prefilter.py); coins scoring below the model's threshold
+# (or PREFILTER_THRESHOLD) never take a tile. PREFILTER_SHADOW=1 only logs the verdicts.
+PREFILTER_MODEL = os.getenv("PREFILTER_MODEL", "")
+PREFILTER_THRESHOLD = os.getenv("PREFILTER_THRESHOLD")
+PREFILTER_SHADOW = os.getenv("PREFILTER_SHADOW", "0") == "1"
+PREFILTER_ICON_WAIT = float(os.getenv("PREFILTER_ICON_WAIT", "1"))
+
+# A bundle is flushed when it is full or when its oldest coin has waited this long
+# (partial grids are rendered with the remaining tiles left blank); 0 disables the age limit
+BUNDLE_MAX_AGE_SECONDS = float(os.getenv("BUNDLE_MAX_AGE_SECONDS", "30"))
+BUNDLE_AGE_CHECK_INTERVAL = float(os.getenv("BUNDLE_AGE_CHECK_INTERVAL", "1"))
 
 coins_buffer = []
+buffer_lock = threading.Lock()
+# Serializes bundle flushes so bundles are saved and uploaded in arrival order
+flush_lock = threading.Lock()
 
-def load_font(font_path, size):
-    if os.path.isfile(font_path):
+# Age of the oldest coin when its bundle was flushed, for the last N bundles
+bundle_ages = deque(maxlen=int(os.getenv("BUNDLE_AGE_WINDOW", "200")))
+bundle_counts = {"full": 0, "partial": 0}
+
+def create_duplicate_index():
+    redis_client = None
+    if DEDUP_REDIS_URL:
         try:
-            return ImageFont.truetype(font_path, size)
+            import redis
+            redis_client = redis.from_url(DEDUP_REDIS_URL)
         except Exception as e:
-            logging.error(f"Failed to load font '{font_path}' with size {size}: {e}")
-    else:
-        logging.warning(f"Font file '{font_path}' not found. Using default font.")
-    return ImageFont.load_default()
-
-NAME_FONT_DEFAULT = load_font(FONT_PATH, NAME_START_FONT_SIZE)
-DESC_FONT_DEFAULT = load_font(FONT_PATH, DESC_START_FONT_SIZE)
-LABEL_FONT = load_font(FONT_PATH, LABEL_FONT_SIZE)
-
-def text_size(draw, text, font):
-    if not text:
-        return 0, 0
-    bbox = draw.textbbox((0,0), text, font=font)
-    width = bbox[2]-bbox[0]
-    height = bbox[3]-bbox[1]
-    return width, height
-
-def fit_single_line(draw, text, max_width, max_height, start_font_size=16, min_font_size=6):
-    ellipsis = "…"
-    for fs in range(start_font_size, min_font_size - 1, -1):
-        font = load_font(FONT_PATH, fs)
-        tw, th = text_size(draw, text, font)
-        if th <= max_height:
-            if tw <= max_width:
-                return text, font
-            else:
-                # Truncate
-                line = text
-                while line and text_size(draw, line + ellipsis, font)[0] > max_width:
-                    line = line[:-1]
-                if line:
-                    return line + ellipsis, font
-    font = load_font(FONT_PATH, min_font_size)
-    return ellipsis, font
-
-def force_wrap_text(draw, text, font, max_width):
-    if not text:
-        return []
-    lines = []
-    words = text.split()
-    current_line = ""
-
-    def line_width(txt):
-        return text_size(draw, txt, font)[0]
-
-    def break_long_word(word):
-        chunks = []
-        current = ""
-        for ch in word:
-            test = current + ch
-            if line_width(test) > max_width and current:
-                chunks.append(current)
-                current = ch
-            else:
-                current = test
-        if current:
-            chunks.append(current)
-        return chunks
-
-    for w in words:
-        if line_width(w) > max_width:
-            parts = break_long_word(w)
-            for part in parts:
-                test_line = (current_line + " " + part).strip() if current_line else part
-                if line_width(test_line) > max_width and current_line:
-                    lines.append(current_line)
-                    current_line = part
-                else:
-                    current_line = test_line
-        else:
-            test_line = (current_line + " " + w).strip() if current_line else w
-            if line_width(test_line) > max_width and current_line:
-                lines.append(current_line)
-                current_line = w
-            else:
-                current_line = test_line
-    if current_line:
-        lines.append(current_line)
-    return lines
-
-def fit_description(draw, text, max_width, max_height, start_font_size=14, min_font_size=6):
-    for fs in range(start_font_size, min_font_size - 1, -1):
-        font = load_font(FONT_PATH, fs)
-        wrapped_lines = force_wrap_text(draw, text, font, max_width)
-        total_h = sum(text_size(draw, line, font)[1] for line in wrapped_lines) + LINE_SPACING*(len(wrapped_lines)-1)
-        if total_h <= max_height:
-            return wrapped_lines, font
-    return None, None
+            logging.error(f"Failed to connect to dedup Redis, using in-memory index: {e}", exc_info=True)
+    return DuplicateIndex(window_seconds=DEDUP_WINDOW_SECONDS,
+                          max_distance=DEDUP_MAX_DISTANCE,
+                          redis_client=redis_client)
 
-def save_bundle_to_db(coins):
+duplicate_index = create_duplicate_index() if DEDUP_ENABLED else None
+
+def create_bundle_handoff():
     try:
-        bundle_response = supabase.table('bundles').insert({}).execute()
-        if not bundle_response.data:
-            logging.error(f"Failed to insert bundle: {bundle_response}")
-            return None
-        bundle_id = bundle_response.data[0]['id']
-        logging.info(f"Inserted bundle with ID: {bundle_id}")
-
-        for idx, coin in enumerate(coins):
-            coin_id = f"{idx+1:02d}"
-            coin_data = {
-                "bundle_id": bundle_id,
-                "coin_id": coin_id,
-                "mint": coin.get("mint", ""),
-                "pumpfun_url": coin.get("pumpfun_url", ""),
-                "metadata_image_official": coin.get("metadata_image_official", ""),
-                "metadata_name": coin.get("metadata_name", ""),
-                "metadata_symbol": coin.get("metadata_symbol", ""),
-                "metadata_description": coin.get("metadata_description", ""),
-                "twitter": coin.get("twitter", None),       # New field
-                "website": coin.get("website", None)        # New field
-            }
-            coin_response = supabase.table('coins').insert(coin_data).execute()
-            if not coin_response.data:
-                logging.error(f"Failed to insert coin {coin_id}: {coin_response}")
-            else:
-                logging.info(f"Inserted coin {coin_id} into bundle {bundle_id}")
-        return bundle_id
+        import redis
+        return BundleHandoff(redis.from_url(REDIS_URL), ttl_seconds=HANDOFF_TTL_SECONDS)
     except Exception as e:
-        logging.error(f"Error saving bundle to database: {e}", exc_info=True)
+        logging.error(f"Failed to connect to handoff Redis, processor will download grids: {e}", exc_info=True)
         return None
 
-def scale_image_keep_aspect(img, max_size):
-    w, h = img.size
-    scale = min(max_size/w, max_size/h)
-    return img.resize((int(w*scale), int(h*scale)), Resampling.LANCZOS)
-
-def draw_coin_box(draw, main_image, x, y, coin_data, index):
-    draw.rectangle([x, y, x+BOX_WIDTH-1, y+BOX_HEIGHT-1], fill="white", outline="white", width=1)
-    draw.rectangle([x+2, y+2, x+BOX_WIDTH-3, y+BOX_HEIGHT-3], outline="red", width=1)
-
-    margin = 5
-    safe_x = x + margin
-    safe_y = y + margin
-    safe_w = BOX_WIDTH - 2*margin
-    safe_h = BOX_HEIGHT - 2*margin
-
-    image_size = 100
-    coin_img = None
-    coin_img_url = coin_data.get("metadata_image_official", "")
-    if coin_img_url:
-        try:
-            resp = requests.get(coin_img_url, timeout=5)
-            if resp.status_code == 200:
-                cimg = Image.open(BytesIO(resp.content)).convert("RGBA")
-                max_img_size = min(image_size, safe_h)
-                coin_img = scale_image_keep_aspect(cimg, max_img_size)
-            else:
-                logging.warning(f"Failed to fetch image for coin {index+1}: Status {resp.status_code}")
-        except Exception as e:
-            logging.error(f"Error fetching coin image for coin {index+1}: {e}", exc_info=True)
-    else:
-        logging.warning(f"No image available for coin {index+1}")
-
-    img_w, img_h = 0, 0
-    if coin_img:
-        img_w, img_h = coin_img.size
-        img_y = safe_y + (safe_h - img_h) // 2
-        main_image.paste(coin_img, (safe_x, img_y), coin_img)
-
-    draw_obj = draw
-    vertical_offset = 10
-    text_start_x = safe_x + img_w + 8
-    right_margin = 5
-
-    label_id_text = f"{index+1:02d}"
-    label_x = text_start_x
-    label_y = safe_y + vertical_offset
-
-    draw_obj.rectangle([label_x, label_y, label_x+LABEL_BOX_SIZE-1, label_y+LABEL_BOX_SIZE-1],
-                       fill="white", outline="red", width=1)
-    lw, lh = text_size(draw_obj, label_id_text, LABEL_FONT)
-    ltx = label_x + (LABEL_BOX_SIZE - lw) // 2
-    lty = label_y + (LABEL_BOX_SIZE - lh) // 2 - 4
-    draw_obj.text((ltx, lty), label_id_text, fill="red", font=LABEL_FONT)
-
-    name_area_x = label_x + LABEL_BOX_SIZE + 5
-    name_area_w = (safe_x + safe_w - right_margin) - name_area_x
-    name_area_h = LABEL_BOX_SIZE
-
-    raw_name = (coin_data.get("metadata_name") or "").strip() or "(No Name)"
-    symbol = (coin_data.get("metadata_symbol") or "").strip()
-    name_line_text = raw_name
-    ticker_line_text = f"({symbol})" if symbol else ""
-
-    name_line, name_font = fit_single_line(draw_obj, name_line_text, name_area_w, name_area_h,
-                                           start_font_size=NAME_START_FONT_SIZE,
-                                           min_font_size=NAME_MIN_FONT_SIZE)
-    nw, nh = text_size(draw_obj, name_line, name_font)
-    name_line_y = label_y + (LABEL_BOX_SIZE - nh) // 2 - 13
-    draw_obj.text((name_area_x, name_line_y), name_line, fill="black", font=name_font)
-
-    if ticker_line_text:
-        ticker_line, ticker_font = fit_single_line(draw_obj, ticker_line_text, name_area_w, name_area_h,
-                                                   start_font_size=NAME_START_FONT_SIZE,
-                                                   min_font_size=NAME_MIN_FONT_SIZE)
-        tw, th = text_size(draw_obj, ticker_line, ticker_font)
-        ticker_line_y = name_line_y + nh + 3
-        draw_obj.text((name_area_x, ticker_line_y), ticker_line, fill="black", font=ticker_font)
-    else:
-        ticker_line_y = name_line_y
-        th = 0
-
-    desc_y = ticker_line_y + (th if ticker_line_text else 0) + 5
-    desc_x = text_start_x
-    desc_w = (safe_x + safe_w - right_margin) - desc_x
-    desc_h = (safe_y + safe_h) - desc_y
-
-    desc = (coin_data.get("metadata_description") or "").strip()
-    if len(desc) > 60:
-        desc = desc[:60] + "..."
-
-    if desc:
-        desc_lines, desc_font = fit_description(draw_obj, desc, desc_w, desc_h,
-                                                start_font_size=DESC_START_FONT_SIZE,
-                                                min_font_size=DESC_MIN_FONT_SIZE)
-        if desc_lines is None:
-            small_font = load_font(FONT_PATH, MIN_FONT_SIZE)
-            draw_obj.text((desc_x, desc_y), "[Desc too long]", fill="black", font=small_font)
-        else:
-            for dl in desc_lines:
-                tw, th = text_size(draw_obj, dl, desc_font)
-                draw_obj.text((desc_x, desc_y), dl, fill="black", font=desc_font)
-                desc_y += th + LINE_SPACING
+bundle_handoff = create_bundle_handoff() if HANDOFF_ENABLED else None
+
+def load_prefilter():
+    if not PREFILTER_MODEL:
+        return None
+    try:
+        model = PrefilterModel.load(PREFILTER_MODEL)
+    except Exception as e:
+        logging.error(f"Failed to load prefilter model {PREFILTER_MODEL}, every coin goes to the LLM: {e}")
+        return None
+    if PREFILTER_THRESHOLD:
+        model.threshold = float(PREFILTER_THRESHOLD)
+    logging.info(f"Prefilter {PREFILTER_MODEL} loaded (threshold {model.threshold:.4f}"
+                 f"{', shadow mode' if PREFILTER_SHADOW else ''}).")
+    return model
+
+prefilter = load_prefilter()
+prefilter_counts = {"passed": 0, "rejected": 0}
+
+def save_bundle_to_db(coins):
+    return bundle_store.save_bundle(coins)
 
 def create_image_for_coins(coins, bundle_id):
+    """
+    Renders the grid and writes it to bundleimagesmain/ (debug / SAVE_BUNDLE_IMAGES=1 only).
+    """
     os.makedirs("bundleimagesmain", exist_ok=True)
-    from PIL import ImageDraw
-    main_image = Image.new('RGBA', (IMG_WIDTH, IMG_HEIGHT), (255, 255, 255, 255))
-    draw = ImageDraw.Draw(main_image)
-    for i, coin in enumerate(coins):
-        row = i // GRID_COLS
-        col = i % GRID_COLS
-        x = col * BOX_WIDTH
-        y = row * BOX_HEIGHT
-        draw_coin_box(draw, main_image, x, y, coin, i)
+    main_image = render_bundle_image(coins)
     filename = os.path.join("bundleimagesmain", f"{bundle_id}.png")
     main_image.save(filename, "PNG")
     logging.info(f"Saved image: {filename}")
     return filename
 
-def on_message(ws, message):
-    global coins_buffer
+def parse_token_event(message):
+    data = json.loads(message)
+    data["received_at"] = time.time()
+    if "mint" in data:
+        mint_address = data["mint"]
+        pumpfun_url = f"https://pump.fun/coin/{mint_address}"
+        data["pumpfun_url"] = pumpfun_url
+    return data
+
+def apply_metadata(data, metadata):
+    data["metadata_name"] = metadata.get("name", "")
+    data["metadata_symbol"] = metadata.get("symbol", "")
+    data["metadata_description"] = metadata.get("description", "")
+    data["metadata_image"] = metadata.get("image", "")
+    data["twitter"] = metadata.get("twitter", None)     # Extract twitter
+    data["website"] = metadata.get("website", None)     # Extract website
+    if data["metadata_image"]:
+        parts = data["metadata_image"].split("/ipfs/")
+        if len(parts) == 2:
+            image_hash = parts[1]
+            official_image_url = f"{IPFS_GATEWAY_URL}/{image_hash}?img-width=256&img-dpr=2&img-onerror=redirect"
+            data["metadata_image_official"] = official_image_url
+        else:
+            data["metadata_image_official"] = data["metadata_image"]
+    else:
+        data["metadata_image_official"] = ""
+    # Start downloading the icon now so the grid render does not wait on it
+    icon_cache.prefetch(data["metadata_image_official"])
+
+def clear_metadata(data):
+    data["metadata_name"] = ""
+    data["metadata_symbol"] = ""
+    data["metadata_description"] = ""
+    data["metadata_image_official"] = ""
+    data["twitter"] = None
+    data["website"] = None
+
+def fetch_metadata(data):
+    metadata_url = data["uri"]
     try:
-        data = json.loads(message)
-        if "mint" in data:
-            mint_address = data["mint"]
-            pumpfun_url = f"https://pump.fun/coin/{mint_address}"
-            data["pumpfun_url"] = pumpfun_url
-
-        if "uri" in data and data["uri"]:
-            metadata_url = data["uri"]
+        with metrics.timer("metadata_fetch"):
+            response = requests.get(metadata_url, timeout=METADATA_TIMEOUT)
+        if response.status_code == 200:
+            apply_metadata(data, response.json())
+        else:
+            logging.warning(f"Failed to fetch metadata from {metadata_url}: Status {response.status_code}")
+            clear_metadata(data)
+    except Exception as e:
+        logging.error(f"Error fetching metadata from {metadata_url}: {e}", exc_info=True)
+        clear_metadata(data)
+
+def flush_bundle(coins):
+    started = time.time()
+    bundle_id = save_bundle_to_db(coins)
+    metrics.observe("db_save", time.time() - started, bundle_id)
+    if bundle_id:
+        with metrics.timer("render", bundle_id):
+            grid = render_bundle_image(coins)
+        with metrics.timer("encode", bundle_id):
+            png_bytes = encode_png(grid)
+        if bundle_handoff is not None:
+            # Before the upload, so the grid is waiting by the time the bundle is queued
+            bundle_handoff.put(bundle_id, png_bytes, coins)
+        if SAVE_BUNDLE_IMAGES:
+            os.makedirs("bundleimagesmain", exist_ok=True)
+            filename = os.path.join("bundleimagesmain", f"{bundle_id}.png")
+            with open(filename, "wb") as f:
+                f.write(png_bytes)
+            logging.info(f"Saved image: {filename}")
+        with metrics.timer("upload_grid", bundle_id):
+            uploaded_url = upload_bytes_to_cloudflare(png_bytes, f"{bundle_id}.png")
+        if uploaded_url:
+            # Use public URL from CLOUDFLARE_PUBLIC_URL for the final image_url
+            public_url = f"{os.getenv('CLOUDFLARE_PUBLIC_URL')}/{bundle_id}.png"
             try:
-                response = requests.get(metadata_url, timeout=5)
-                if response.status_code == 200:
-                    metadata = response.json()
-                    data["metadata_name"] = metadata.get("name", "")
-                    data["metadata_symbol"] = metadata.get("symbol", "")
-                    data["metadata_description"] = metadata.get("description", "")
-                    data["metadata_image"] = metadata.get("image", "")
-                    data["twitter"] = metadata.get("twitter", None)     # Extract twitter
-                    data["website"] = metadata.get("website", None)     # Extract website
-                    if data["metadata_image"]:
-                        parts = data["metadata_image"].split("/ipfs/")
-                        if len(parts) == 2:
-                            image_hash = parts[1]
-                            official_image_url = f"https://pump.mypinata.cloud/ipfs/{image_hash}?img-width=256&img-dpr=2&img-onerror=redirect"
-                            data["metadata_image_official"] = official_image_url
-                        else:
-                            data["metadata_image_official"] = data["metadata_image"]
-                    else:
-                        data["metadata_image_official"] = ""
-                else:
-                    logging.warning(f"Failed to fetch metadata from {metadata_url}: Status {response.status_code}")
-                    data["metadata_name"] = ""
-                    data["metadata_symbol"] = ""
-                    data["metadata_description"] = ""
-                    data["metadata_image_official"] = ""
-                    data["twitter"] = None
-                    data["website"] = None
+                bundle_store.update_bundle(bundle_id, {"image_url": public_url})
+                logging.info(f"Updated bundle with public image_url: {public_url}")
             except Exception as e:
-                logging.error(f"Error fetching metadata from {metadata_url}: {e}", exc_info=True)
-                data["metadata_name"] = ""
-                data["metadata_symbol"] = ""
-                data["metadata_description"] = ""
-                data["metadata_image_official"] = ""
-                data["twitter"] = None
-                data["website"] = None
-
-        logging.info("New Token Event Received:")
-        logging.info(json.dumps(data, indent=4))
+                logging.error(f"Failed updating bundle image_url: {e}", exc_info=True)
+        else:
+            logging.error("Failed to upload image to Cloudflare.")
+    else:
+        logging.error("No bundle_id retrieved; image not saved.")
+        return
+
+    first_received = min((c.get("received_at") or started) for c in coins)
+    finished = time.time()
+    metrics.observe("bundle_flush", finished - started, bundle_id)
+    metrics.observe("coin_to_grid", finished - first_received, bundle_id)
+    logging.info(f"Bundle {bundle_id} ready in {finished - started:.2f}s "
+                 f"(oldest coin waited {finished - first_received:.2f}s)")
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+def take_bundle(force=False):
+    """
+    Removes and returns the buffered coins if the bundle is full, or if `force` is set
+    and the buffer is not empty. Caller must hold buffer_lock.
+    """
+    if len(coins_buffer) >= TOTAL_COINS or (force and coins_buffer):
+        batch = coins_buffer[:TOTAL_COINS]
+        del coins_buffer[:TOTAL_COINS]
+        return batch
+    return None
+
+def emit_bundle(batch, reason):
+    """
+    Flushes a bundle taken from the buffer and records its age.
+    """
+    with flush_lock:
+        age = time.time() - min((c.get("received_at") or time.time()) for c in batch)
+        bundle_ages.append(age)
+        kind = "full" if len(batch) == TOTAL_COINS else "partial"
+        bundle_counts[kind] += 1
+        metrics.observe("bundle_age", age)
+        metrics.inc(f"bundles_{kind}")
+        logging.info(f"Flushing {kind} bundle of {len(batch)}/{TOTAL_COINS} coins ({reason}), "
+                     f"oldest coin {age:.2f}s old. Bundle age p50={percentile(bundle_ages, 50):.2f}s "
+                     f"p95={percentile(bundle_ages, 95):.2f}s over last {len(bundle_ages)} "
+                     f"[{bundle_counts['full']} full, {bundle_counts['partial']} partial]")
+        try:
+            flush_bundle(batch)
+        except Exception as e:
+            logging.error(f"Error flushing bundle: {e}", exc_info=True)
+
+def bundle_age_watchdog():
+    """
+    Flushes a partial bundle once its oldest coin is older than BUNDLE_MAX_AGE_SECONDS.
+    """
+    while True:
+        time.sleep(BUNDLE_AGE_CHECK_INTERVAL)
+        batch = None
+        with buffer_lock:
+            if coins_buffer:
+                oldest = coins_buffer[0].get("received_at") or time.time()
+                if time.time() - oldest >= BUNDLE_MAX_AGE_SECONDS:
+                    batch = take_bundle(force=True)
+                    metrics.set_gauge("listener_buffer", len(coins_buffer))
+        if batch:
+            emit_bundle(batch, "max age")
+
+def start_bundle_age_watchdog():
+    if BUNDLE_MAX_AGE_SECONDS <= 0:
+        logging.info("Bundle max age disabled; bundles flush only when full.")
+        return None
+    thread = threading.Thread(target=bundle_age_watchdog, name="bundle-age-watchdog", daemon=True)
+    thread.start()
+    logging.info(f"Partial bundles flush after {BUNDLE_MAX_AGE_SECONDS:.0f}s.")
+    return thread
+
+def find_duplicate(data):
+    """
+    Checks a coin against the recent-coins window by name/symbol, icon hash and
+    perceptual icon hash. Returns the match or None (and records novel coins).
+    """
+    image_url = data.get("metadata_image_official") or ""
+    ikey = icon_key(image_url) if image_url else None
+    phash = None
+    if image_url:
+        icon = icon_cache.get(image_url, wait=DEDUP_ICON_WAIT)
+        if icon is not None:
+            phash = dhash(icon)
+    return duplicate_index.check_and_add(
+        data.get("mint", ""),
+        data.get("metadata_name", ""),
+        data.get("metadata_symbol", ""),
+        icon_key=ikey,
+        phash=phash
+    )
 
+def record_duplicate(data, match):
+    logging.info(f"Duplicate coin {data.get('mint')} ({match['reason']}, distance={match['distance']}) "
+                 f"of {match['mint']}; skipping bundle. "
+                 f"[{duplicate_index.duplicates}/{duplicate_index.checked} duplicates so far]")
+    try:
+        supabase.table(DUPLICATE_TABLE).insert({
+            "mint": data.get("mint", ""),
+            "pumpfun_url": data.get("pumpfun_url", ""),
+            "metadata_name": data.get("metadata_name", ""),
+            "metadata_symbol": data.get("metadata_symbol", ""),
+            "metadata_image_official": data.get("metadata_image_official", ""),
+            "duplicate_of": match["mint"],
+            "reason": match["reason"],
+            "distance": match["distance"]
+        }).execute()
+    except Exception as e:
+        logging.error(f"Failed to record duplicate coin {data.get('mint')}: {e}")
+
+def prefilter_rejects(data):
+    """
+    Scores a coin with the prefilter model. Returns True if it should be kept out of bundles.
+    """
+    icon = None
+    if prefilter.uses_icon and data.get("metadata_image_official"):
+        icon = icon_cache.get(data["metadata_image_official"], wait=PREFILTER_ICON_WAIT)
+    try:
+        score = prefilter.score(data, icon)
+    except Exception as e:
+        logging.error(f"Prefilter failed for {data.get('mint')}, keeping the coin: {e}", exc_info=True)
+        return False
+    data["prefilter_score"] = score
+    rejected = score < prefilter.threshold
+    prefilter_counts["rejected" if rejected else "passed"] += 1
+    metrics.inc("prefilter_rejected" if rejected else "prefilter_passed")
+    if rejected:
+        logging.info(f"Prefilter {'would reject' if PREFILTER_SHADOW else 'rejected'} {data.get('mint')} "
+                     f"({data.get('metadata_name')!r}, score {score:.3f} < {prefilter.threshold:.3f}) "
+                     f"[{prefilter_counts['rejected']} rejected / {prefilter_counts['passed']} passed]")
+    return rejected and not PREFILTER_SHADOW
+
+def handle_coin(data):
+    """
+    Appends an enriched token event to the buffer (unless it is a duplicate or the
+    prefilter rejects it) and flushes a bundle once it is full
+    (bundle_age_watchdog flushes partial bundles that get too old).
+    Shared by the websocket-client callback and the async ingest pipeline.
+    """
+    logging.info("New Token Event Received:")
+    logging.info(json.dumps(data, indent=4))
+
+    metrics.inc("coins_received")
+    if duplicate_index is not None and data.get("mint"):
+        match = find_duplicate(data)
+        if match:
+            metrics.inc("duplicates")
+            record_duplicate(data, match)
+            return
+
+    if prefilter is not None and prefilter_rejects(data):
+        return
+
+    with buffer_lock:
         coins_buffer.append(data)
+        batch = take_bundle()
+        metrics.set_gauge("listener_buffer", len(coins_buffer))
+    if batch:
+        emit_bundle(batch, "full")
 
-        if len(coins_buffer) == TOTAL_COINS:
-            bundle_id = save_bundle_to_db(coins_buffer)
-            if bundle_id:
-                filename = create_image_for_coins(coins_buffer, bundle_id)
-                uploaded_url = upload_to_cloudflare(filename, f"{bundle_id}.png")
-                if uploaded_url:
-                    # Use public URL from CLOUDFLARE_PUBLIC_URL for the final image_url
-                    public_url = f"{os.getenv('CLOUDFLARE_PUBLIC_URL')}/{bundle_id}.png"
-                    try:
-                        supabase.table('bundles').update({"image_url": public_url}).eq("id", bundle_id).execute()
-                        logging.info(f"Updated bundle with public image_url: {public_url}")
-                    except Exception as e:
-                        logging.error(f"Failed updating bundle image_url: {e}", exc_info=True)
-                else:
-                    logging.error("Failed to upload image to Cloudflare.")
-            else:
-                logging.error("No bundle_id retrieved; image not saved.")
-            coins_buffer.clear()
+def on_message(ws, message):
+    try:
+        data = parse_token_event(message)
+        if "uri" in data and data["uri"]:
+            fetch_metadata(data)
+        handle_coin(data)
 
     except json.JSONDecodeError:
         logging.error(f"Invalid JSON received: {message}")
@@ -402,7 +434,26 @@ def connect_websocket():
     )
     ws.run_forever()
 
+def run_async_ingest():
+    from async_ingest import AsyncIngestPipeline
+    pipeline = AsyncIngestPipeline(
+        API_URL,
+        parse_event=parse_token_event,
+        apply_metadata=apply_metadata,
+        clear_metadata=clear_metadata,
+        on_coin=handle_coin,
+        concurrency=METADATA_CONCURRENCY,
+        queue_size=INGEST_QUEUE_SIZE,
+        request_timeout=METADATA_TIMEOUT
+    )
+    pipeline.run()
+
 if __name__ == "__main__":
     if not os.path.isfile(FONT_PATH):
         logging.warning(f"Font file '{FONT_PATH}' not found. Using default font.")
-    connect_websocket()
+    start_bundle_age_watchdog()
+    if INGEST_MODE == "async":
+        logging.info(f"Starting async ingest (concurrency={METADATA_CONCURRENCY}, queue_size={INGEST_QUEUE_SIZE})")
+        run_async_ingest()
+    else:
+        connect_websocket()
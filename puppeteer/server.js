@@ -59,16 +59,16 @@ app.post("/api/process", async (req, res) => {
 
 async function uploadScreenshotLens(localFilePath, remoteFileName) {
   try {
-    const fileBuffer = fs.readFileSync(localFilePath);
-    const base64Data = fileBuffer.toString("base64");
-
+    // Stream the PNG as the raw request body (no base64, no full read into memory)
+    const { size } = fs.statSync(localFilePath);
     const response = await axios.post(
-      `${WATERMILL_FLASK_URL}/upload_screenshot_lens`,
+      `${WATERMILL_FLASK_URL}/upload_screenshot_lens/${encodeURIComponent(remoteFileName)}`,
+      fs.createReadStream(localFilePath),
       {
-        base64: base64Data,
-        filename: remoteFileName,
-      },
-      { timeout: 60000 }
+        headers: { "Content-Type": "image/png", "Content-Length": size },
+        maxBodyLength: Infinity,
+        timeout: 60000
+      }
     );
     if (response.data && response.data.success) {
       return response.data.cloudflareUrl;
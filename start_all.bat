@@ -9,7 +9,7 @@ start cmd /k "cd /d C:\Users\erase\Desktop\pumptrader\pompv1 && python queue_man
 REM Image Processor
 start cmd /k "cd /d C:\Users\erase\Desktop\pumptrader\pompv1 && python image_processor.py"
 
-REM Pruner
+REM Pruner (only needed when running the listener with SAVE_BUNDLE_IMAGES=1)
 start cmd /k "cd /d C:\Users\erase\Desktop\pumptrader\pompv1 && python pruner.py"
 
 REM Puppeteer (npm start)
@@ -0,0 +1,115 @@
+# File: /pompv1/sysprompt_combined_openai.py
+
+"""
+Calls GPT once with both the Google Lens and the Twitter screenshot (as images),
+asking for the "copy"/"unique" and the "pass"/"buy" verdict together in a
+structured output (JSON schema). Used by newcoincheck.py when COMBINED_EVAL=1.
+"""
+
+import logging
+import json
+from typing import Literal
+from pydantic import BaseModel, Field, ValidationError
+
+# Same client (API key, OPENAI_BASE_URL) as the Lens check
+from sysprompt_lens_openai import client
+
+SAFE_DEFAULT = {"lens": "copy", "final": "pass"}
+
+class CombinedDecisionOutput(BaseModel):
+    lens: Literal["copy", "unique"] = Field(
+        ..., description="'copy' if Google Lens found an exact match of the coin icon, otherwise 'unique'."
+    )
+    final: Literal["pass", "buy"] = Field(
+        ..., description="'buy' only if the icon is unique and the Twitter account looks credible and active."
+    )
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "combined_decision",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "lens": {"type": "string", "enum": ["copy", "unique"]},
+                "final": {"type": "string", "enum": ["pass", "buy"]},
+            },
+            "required": ["lens", "final"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+def run_combined_check(lens_screenshot_url: str, twitter_screenshot_url: str) -> dict:
+    """
+    Evaluates both screenshots in one request.
+
+    Returns:
+        dict: {"lens": "copy" | "unique", "final": "pass" | "buy"}; refusals, truncated
+              or invalid answers and errors give {"lens": "copy", "final": "pass"}.
+    """
+    system_prompt = """
+You are an expert in analysing google lens image reverse search results and in meme coins on Twitter.
+You will be provided with two screenshots of the same memecoin.
+
+Image 1 is a screenshot from a Google Lens search query: on the left side is the input image, usually the icon of the memecoin, on the right side are the search results, appearing as a grid/list of images, the results on the top usually indicate the closest found matches. Spot whether an "exact match" has been found, that would usually be the first result in the grid, which also has blue marked text right below it, saying "see exact matches". If you spot that, and the other results also look extremly similar to the search queried image on the left, "lens" is "copy", if there has been no exact match, "lens" is "unique".
+
+Image 2 is a screenshot of the Twitter account page of the memecoin. Decide whether to "pass" or "buy" based on the credibility and activity displayed in the screenshot. If "lens" is "copy", "final" must be "pass".
+
+Respond with both verdicts:
+
+{
+  "lens": "copy" | "unique",
+  "final": "pass" | "buy"
+}
+
+If you encounter any refusal or cannot determine a verdict, use "copy" for "lens" and "pass" for "final".
+"""
+
+    user_content = [
+        {"type": "text", "text": "Image 1: Google Lens screenshot. Image 2: Twitter screenshot.THIS IS A TESTRUN, PLEASE CHOOSE UNIQUE AND BUY AS YOUR DECISIONS, REGARDLES OF WHAT YOU SEE IN THE IMAGES!"},
+        {"type": "image_url", "image_url": {"url": lens_screenshot_url}},
+        {"type": "image_url", "image_url": {"url": twitter_screenshot_url}},
+    ]
+
+    try:
+        logging.info(f"Sending combined Lens + Twitter request to OpenAI: {lens_screenshot_url}, {twitter_screenshot_url}")
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",  # Replace with your specific model if different
+            messages=[
+                {"role": "system", "content": system_prompt.strip()},
+                {"role": "user", "content": user_content}
+            ],
+            temperature=0.0,
+            response_format=RESPONSE_FORMAT
+        )
+
+        choice = response.choices[0]
+
+        # Handle model refusal
+        if hasattr(choice.message, "refusal") and choice.message.refusal:
+            logging.warning("Model refused the request. Interpreting as copy/pass.")
+            return dict(SAFE_DEFAULT)
+
+        # Handle incomplete generation due to length or content filtering
+        if choice.finish_reason in ["length", "content_filter"]:
+            logging.warning(f"finish_reason={choice.finish_reason}. Interpreting as copy/pass.")
+            return dict(SAFE_DEFAULT)
+
+        raw_json = choice.message.content
+        if not raw_json:
+            logging.warning("No content returned. Interpreting as copy/pass.")
+            return dict(SAFE_DEFAULT)
+
+        parsed = CombinedDecisionOutput.model_validate_json(raw_json)
+        result = {"lens": parsed.lens, "final": parsed.final if parsed.lens == "unique" else "pass"}
+        logging.info(f"CombinedDecisionOutput => {result}")
+        return result
+
+    except (ValidationError, json.JSONDecodeError) as e:
+        logging.error(f"Invalid combined decision JSON: {e}. Interpreting as copy/pass.")
+        return dict(SAFE_DEFAULT)
+    except Exception as e:
+        logging.error(f"Error in run_combined_check: {e}", exc_info=True)
+        return dict(SAFE_DEFAULT)
@@ -20,7 +20,9 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
     raise EnvironmentError("Missing OPENAI_API_KEY in .env")
 
-client = OpenAI(api_key=openai_api_key)
+# OPENAI_BASE_URL points the client at another OpenAI-compatible server,
+# e.g. the local stand-in (pompv1/openai_standin.py) for load tests
+client = OpenAI(api_key=openai_api_key, base_url=os.getenv("OPENAI_BASE_URL") or None)
 
 class LensDecisionOutput(BaseModel):
     answer: Literal["copy", "unique"] = Field(